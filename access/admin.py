@@ -11,6 +11,6 @@ class DoorCommandAdmin(admin.ModelAdmin):
 
 @admin.register(AccessLog)
 class AccessLogAdmin(admin.ModelAdmin):
-    list_display = ("user", "household", "status", "timestamp")
+    list_display = ("user", "household", "status", "command", "timestamp")
     list_filter = ("status", "household")
     search_fields = ("user__username", "household__title")
@@ -0,0 +1,10 @@
+from django.conf import settings
+
+
+def live_status(request):
+    """How ``access/_live_status.html`` follows door status: stream or poll."""
+
+    return {
+        "status_stream_enabled": settings.STATUS_STREAM_ENABLED,
+        "status_poll_interval_ms": settings.STATUS_POLL_INTERVAL * 1000,
+    }
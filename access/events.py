@@ -0,0 +1,213 @@
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from devices.notifications import CommandNotifier
+
+
+class StatusEventBus:
+    """In-process fan-out of live door status events, keyed by building.
+
+    Every building keeps the last ``STATUS_STREAM_BUFFER_SIZE`` events with
+    increasing ids, so any number of browser streams read the same buffer and
+    resume after a reconnect with ``Last-Event-ID`` without touching the
+    database. Waiting reuses :class:`CommandNotifier` keyed by building id.
+
+    Command events follow ``queued -> fetched -> executed | expired`` and are
+    only published on a transition, so repeated polls of one command emit a
+    single ``fetched``. ``expired`` and device ``offline`` events are derived
+    from tracked deadlines by :meth:`sweep`, which the streams run as they
+    wake, after checking the database for commands executed elsewhere.
+    Events are process-local like the command notifier; streams send a
+    database snapshot when they connect so nothing queued elsewhere is missed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest_id = 0
+        self._events = {}
+        self._dropped = {}
+        self._commands = {}
+        self._devices = {}
+        self.notifier = CommandNotifier()
+
+    def _publish(self, building_id, event, data):
+        # Callers hold ``self._lock``; waiters are woken by ``_wake``.
+        buffer = self._events.get(building_id)
+        if buffer is None:
+            buffer = self._events[building_id] = deque(
+                maxlen=settings.STATUS_STREAM_BUFFER_SIZE
+            )
+        if len(buffer) == buffer.maxlen:
+            self._dropped[building_id] = buffer[0][0]
+        self._latest_id += 1
+        buffer.append((self._latest_id, event, data))
+
+    def _wake(self, building_id):
+        self.notifier.publish(building_id)
+
+    def _command_transition(self, command, status):
+        building_id = command.device.building_id
+        with self._lock:
+            commands = self._commands.setdefault(building_id, {})
+            current = commands.get(command.id)
+            if current is not None and current[0] == status:
+                return
+            if status in ("executed", "expired"):
+                commands.pop(command.id, None)
+            else:
+                commands[command.id] = (status, command.expires_at)
+            self._publish(
+                building_id,
+                "command",
+                {
+                    "id": command.id,
+                    "device": command.device_id,
+                    "status": status,
+                    "at": timezone.now().isoformat(),
+                },
+            )
+        self._wake(building_id)
+
+    def command_queued(self, command):
+        self._command_transition(command, "queued")
+
+    def command_fetched(self, command):
+        self._command_transition(command, "fetched")
+
+    def command_executed(self, command):
+        self._command_transition(command, "executed")
+
+    def device_seen(self, device, when):
+        """Record a device request; publishes ``online`` if it was offline."""
+
+        building_id = device.building_id
+        with self._lock:
+            devices = self._devices.setdefault(building_id, {})
+            previous = devices.get(device.pk)
+            devices[device.pk] = when
+            if previous is not None and not self._is_offline(previous, when):
+                return
+            self._publish(
+                building_id,
+                "device",
+                {"id": device.pk, "online": True, "last_seen": when.isoformat()},
+            )
+        self._wake(building_id)
+
+    def track(self, building_id, devices=(), commands=()):
+        """Seed state from a database snapshot without publishing events."""
+
+        with self._lock:
+            known = self._devices.setdefault(building_id, {})
+            for device_id, last_seen in devices:
+                if last_seen is not None and device_id not in known:
+                    known[device_id] = last_seen
+            tracked = self._commands.setdefault(building_id, {})
+            for command_id, expires_at in commands:
+                tracked.setdefault(command_id, ("queued", expires_at))
+
+    @staticmethod
+    def _is_offline(last_seen, now):
+        return now - last_seen > timedelta(seconds=settings.DEVICE_OFFLINE_AFTER)
+
+    def commands_due(self, building_id, now=None) -> bool:
+        """Whether a tracked command of the building is past its expiry."""
+
+        now = now or timezone.now()
+        with self._lock:
+            commands = self._commands.get(building_id, {})
+            return any(
+                expires_at is not None and expires_at <= now
+                for _, expires_at in commands.values()
+            )
+
+    def sweep(self, building_id, now=None, executed=None) -> int:
+        """Publish ``expired``/``offline`` events whose deadline has passed.
+
+        A command acked through another worker process never reaches this
+        bus, so ``executed`` is called with the ids of commands past their
+        expiry and returns those the database shows as executed; they are
+        published as ``executed`` instead of ``expired``.
+        """
+
+        now = now or timezone.now()
+        with self._lock:
+            commands = self._commands.get(building_id, {})
+            due = [
+                command_id
+                for command_id, (_, expires_at) in commands.items()
+                if expires_at is not None and expires_at <= now
+            ]
+        done = executed(due) if due and executed else set()
+        published = 0
+        with self._lock:
+            commands = self._commands.get(building_id, {})
+            for command_id in due:
+                entry = commands.pop(command_id, None)
+                if entry is None:
+                    continue
+                status = "executed" if command_id in done else "expired"
+                self._publish(
+                    building_id,
+                    "command",
+                    {
+                        "id": command_id,
+                        "status": status,
+                        "at": (now if status == "executed" else entry[1]).isoformat(),
+                    },
+                )
+                published += 1
+            devices = self._devices.get(building_id, {})
+            for device_id, last_seen in list(devices.items()):
+                if self._is_offline(last_seen, now):
+                    del devices[device_id]
+                    self._publish(
+                        building_id,
+                        "device",
+                        {
+                            "id": device_id,
+                            "online": False,
+                            "last_seen": last_seen.isoformat(),
+                        },
+                    )
+                    published += 1
+        if published:
+            self._wake(building_id)
+        return published
+
+    def events_since(self, building_id, last_id):
+        """Return ``(events, complete)`` for events newer than ``last_id``.
+
+        ``complete`` is false when events after ``last_id`` were already
+        dropped from the buffer or ``last_id`` was issued by another process
+        (or before a restart), in which case the stream resends a snapshot.
+        """
+
+        with self._lock:
+            buffer = list(self._events.get(building_id, ()))
+            dropped = self._dropped.get(building_id, 0)
+            complete = dropped <= last_id <= self._latest_id
+        events = [event for event in buffer if event[0] > last_id]
+        return events, complete
+
+    def latest_id(self) -> int:
+        with self._lock:
+            return self._latest_id
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "buildings": len(self._events),
+                "buffered_events": sum(len(b) for b in self._events.values()),
+                "tracked_commands": sum(len(c) for c in self._commands.values()),
+                "online_devices": sum(len(d) for d in self._devices.values()),
+            }
+        stats.update(self.notifier.stats())
+        return stats
+
+
+status_events = StatusEventBus()
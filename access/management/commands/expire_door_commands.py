@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from access.models import DoorCommand
+
+
+class Command(BaseCommand):
+    help = "Mark pending door commands past their expires_at as expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and sweep every N seconds instead of once.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            expired = DoorCommand.objects.expire_stale()
+            if expired or options["verbosity"] > 1:
+                self.stdout.write(f"Expired {expired} door command(s).")
+            if interval <= 0:
+                break
+            time.sleep(interval)
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:57
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    DoorCommand = apps.get_model("access", "DoorCommand")
+    DoorCommand.objects.filter(expires_at__isnull=True).update(
+        expires_at=models.F("created_at") + timedelta(seconds=15)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("access", "0004_alter_accesslog_household_alter_accesslog_reason_and_more"),
+        ("devices", "0008_device_command_ttl_seconds"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="doorcommand",
+            name="expires_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="زمان انقضا"
+            ),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="doorcommand",
+            index=models.Index(
+                condition=models.Q(("executed", False), ("expired", False)),
+                fields=["device", "expires_at"],
+                name="access_cmd_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("access", "0005_doorcommand_expires_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accesslog",
+            name="command",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="access_logs",
+                to="access.doorcommand",
+                verbose_name="فرمان",
+            ),
+        ),
+    ]
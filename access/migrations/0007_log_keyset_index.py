@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("access", "0006_accesslog_command"),
+        ("households", "0003_alter_building_address_alter_building_title_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="accesslog",
+            index=models.Index(
+                fields=["household", "-timestamp", "-id"],
+                name="access_log_household_time_idx",
+            ),
+        ),
+    ]
@@ -1,10 +1,29 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from devices.models import Device
 from households.models import Household
 
 
+class DoorCommandQuerySet(models.QuerySet):
+    def pending(self, now=None):
+        """Commands still waiting for the device; expiry is a plain filter."""
+
+        now = now or timezone.now()
+        return self.filter(executed=False, expired=False, expires_at__gt=now)
+
+    def expire_stale(self, now=None) -> int:
+        """Mark pending commands past their ``expires_at`` as expired in bulk."""
+
+        now = now or timezone.now()
+        return self.filter(
+            executed=False, expired=False, expires_at__lte=now
+        ).update(expired=True, executed_at=now)
+
+
 class DoorCommand(models.Model):
     device = models.ForeignKey(
         Device, on_delete=models.CASCADE, related_name="commands", verbose_name="دستگاه"
@@ -23,10 +42,31 @@ class DoorCommand(models.Model):
     executed_at = models.DateTimeField(
         null=True, blank=True, verbose_name="زمان اجرا"
     )
+    expires_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="زمان انقضا"
+    )
+
+    objects = DoorCommandQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["device", "expires_at"],
+                condition=models.Q(executed=False, expired=False),
+                name="access_cmd_pending_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Command {self.id} for {self.device}"
 
+    def save(self, *args, **kwargs):
+        if self.expires_at is None:
+            self.expires_at = timezone.now() + timedelta(
+                seconds=self.device.command_ttl_seconds
+            )
+        super().save(*args, **kwargs)
+
 
 class AccessLog(models.Model):
     class Status(models.TextChoices):
@@ -51,6 +91,23 @@ class AccessLog(models.Model):
         max_length=20, choices=Status.choices, verbose_name="وضعیت"
     )
     reason = models.TextField(blank=True, verbose_name="دلیل")
+    command = models.ForeignKey(
+        DoorCommand,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="access_logs",
+        verbose_name="فرمان",
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on /logs/ walks (timestamp, id).
+            models.Index(
+                fields=["household", "-timestamp", "-id"],
+                name="access_log_household_time_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         username = self.user.username if self.user else "Unknown"
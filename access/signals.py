@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .events import status_events
+from .models import DoorCommand
+
+
+@receiver(post_save, sender=DoorCommand)
+def publish_command_status(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        transaction.on_commit(lambda: status_events.command_queued(instance))
+    elif instance.executed and update_fields and "executed" in update_fields:
+        transaction.on_commit(lambda: status_events.command_executed(instance))
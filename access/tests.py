@@ -1,3 +1,321 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from devices.models import Device
+from households.models import Building, Household
+from .events import StatusEventBus, status_events
+from .models import AccessLog, DoorCommand
+from .views import _create_command, _executed_commands
+
+
+class DoorCommandExpiryTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="expiry-token", command_ttl_seconds=30
+        )
+
+    def test_expires_at_uses_device_ttl(self):
+        before = timezone.now()
+        command = DoorCommand.objects.create(device=self.device)
+
+        self.assertGreaterEqual(command.expires_at, before + timedelta(seconds=30))
+        self.assertLessEqual(command.expires_at, timezone.now() + timedelta(seconds=30))
+
+    def test_pending_excludes_commands_past_expiry(self):
+        now = timezone.now()
+        stale = DoorCommand.objects.create(device=self.device, expires_at=now)
+        fresh = DoorCommand.objects.create(device=self.device)
+
+        self.assertEqual(list(DoorCommand.objects.pending(now)), [fresh])
+        stale.refresh_from_db()
+        self.assertFalse(stale.expired)
+
+    def test_sweeper_marks_stale_commands(self):
+        now = timezone.now()
+        stale = DoorCommand.objects.create(
+            device=self.device, expires_at=now - timedelta(seconds=1)
+        )
+        fresh = DoorCommand.objects.create(device=self.device)
+        out = StringIO()
+
+        call_command("expire_door_commands", stdout=out)
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertTrue(stale.expired)
+        self.assertIsNotNone(stale.executed_at)
+        self.assertFalse(fresh.expired)
+        self.assertIn("Expired 1", out.getvalue())
+
+
+class StatusEventTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Live Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="live-token"
+        )
+        self.head = User.objects.create_user(
+            username="live-head", password="pass", role=User.Roles.HEAD
+        )
+        Household.objects.create(
+            title="Live Home", head=self.head, building=self.building
+        )
+
+    def _statuses(self, since):
+        events, _ = status_events.events_since(self.building.id, since)
+        return [data["status"] for _, event, data in events if event == "command"]
+
+    def test_command_lifecycle_is_published_once_per_transition(self):
+        since = status_events.latest_id()
+        with self.captureOnCommitCallbacks(execute=True):
+            command = DoorCommand.objects.create(device=self.device)
+        for _ in range(2):
+            self.client.get("/api/device/command/", HTTP_X_DEVICE_TOKEN="live-token")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/device/command/ack/",
+                data={"command_id": command.id},
+                content_type="application/json",
+                HTTP_X_DEVICE_TOKEN="live-token",
+            )
+
+        self.assertEqual(self._statuses(since), ["queued", "fetched", "executed"])
+
+    @override_settings(DEVICE_OFFLINE_AFTER=60)
+    def test_sweep_derives_expired_commands_and_offline_devices(self):
+        bus = StatusEventBus()
+        now = timezone.now()
+        command = DoorCommand.objects.create(
+            device=self.device, expires_at=now + timedelta(seconds=5)
+        )
+        bus.command_queued(command)
+        bus.device_seen(self.device, now)
+
+        self.assertEqual(bus.sweep(self.building.id, now), 0)
+        self.assertEqual(bus.sweep(self.building.id, now + timedelta(seconds=90)), 2)
+
+        events, _ = bus.events_since(self.building.id, 0)
+        self.assertEqual(
+            [data.get("status", data.get("online")) for _, _, data in events],
+            ["queued", True, "expired", False],
+        )
+
+    def test_sweep_reports_commands_executed_elsewhere(self):
+        bus = StatusEventBus()
+        now = timezone.now()
+        acked = DoorCommand.objects.create(
+            device=self.device, expires_at=now + timedelta(seconds=5)
+        )
+        missed = DoorCommand.objects.create(
+            device=self.device, expires_at=now + timedelta(seconds=5)
+        )
+        bus.command_queued(acked)
+        bus.command_queued(missed)
+        # Acked through another worker: this process never saw the ack.
+        DoorCommand.objects.filter(pk=acked.pk).update(executed=True)
+        later = now + timedelta(seconds=10)
+
+        self.assertTrue(bus.commands_due(self.building.id, later))
+        bus.sweep(self.building.id, later, executed=_executed_commands)
+
+        events, _ = bus.events_since(self.building.id, 0)
+        self.assertEqual(
+            [(data["id"], data["status"]) for _, _, data in events[2:]],
+            [(acked.id, "executed"), (missed.id, "expired")],
+        )
+        self.assertFalse(bus.commands_due(self.building.id, later))
+
+    @override_settings(STATUS_STREAM_ENABLED=True, STATUS_STREAM_MAX_AGE=0)
+    def test_stream_sends_snapshot_then_resumes_from_last_event_id(self):
+        self.client.force_login(self.head)
+        pending = DoorCommand.objects.create(device=self.device)
+
+        first = b"".join(self.client.get("/door/events/").streaming_content).decode()
+        since = status_events.latest_id()
+        status_events.command_fetched(pending)
+        resumed = b"".join(
+            self.client.get(
+                "/door/events/", HTTP_LAST_EVENT_ID=str(since)
+            ).streaming_content
+        ).decode()
+
+        self.assertIn("event: snapshot", first)
+        self.assertIn(f'"id": {pending.id}', first)
+        self.assertNotIn("event: snapshot", resumed)
+        self.assertIn('"status": "fetched"', resumed)
+
+    def test_stream_without_household_has_no_content(self):
+        member = User.objects.create_user(username="nobody", password="pass")
+        self.client.force_login(member)
+
+        self.assertEqual(self.client.get("/door/events/").status_code, 204)
+
+    @override_settings(STATUS_STREAM_ENABLED=False, STATUS_POLL_INTERVAL=7)
+    def test_panel_polls_snapshot_when_stream_is_disabled(self):
+        self.client.force_login(self.head)
+        pending = DoorCommand.objects.create(device=self.device)
+
+        panel = self.client.get("/door/").content.decode()
+        snapshot = self.client.get("/door/status/").json()
+
+        self.assertNotIn("data-stream-url", panel)
+        self.assertIn('data-poll-ms="7000"', panel)
+        self.assertEqual(self.client.get("/door/events/").status_code, 204)
+        self.assertEqual(
+            snapshot["commands"],
+            [{"id": pending.id, "device": self.device.id, "status": "queued"}],
+        )
+
+    @override_settings(STATUS_STREAM_ENABLED=True)
+    def test_panel_uses_stream_when_enabled(self):
+        self.client.force_login(self.head)
+
+        self.assertIn("data-stream-url", self.client.get("/door/").content.decode())
+
+
+class CommandCoalescingTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Busy Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="busy-token"
+        )
+        self.head = User.objects.create_user(
+            username="busy-head", password="pass", role=User.Roles.HEAD
+        )
+        self.household = Household.objects.create(
+            title="Busy Home", head=self.head, building=self.building
+        )
+        self.neighbour = User.objects.create_user(username="neighbour")
+
+    def test_presses_while_pending_share_one_command(self):
+        first, merged_first = _create_command(self.head, self.household, self.device)
+        second, merged_second = _create_command(
+            self.neighbour, self.household, self.device
+        )
+
+        self.assertEqual(first, second)
+        self.assertEqual((merged_first, merged_second), (False, True))
+        self.assertEqual(DoorCommand.objects.count(), 1)
+        self.assertEqual(
+            set(first.access_logs.values_list("user__username", flat=True)),
+            {"busy-head", "neighbour"},
+        )
+
+    def test_press_after_execution_queues_new_command(self):
+        first, _ = _create_command(self.head, self.household, self.device)
+        DoorCommand.objects.filter(pk=first.pk).update(executed=True)
+
+        second, merged = _create_command(self.neighbour, self.household, self.device)
+
+        self.assertFalse(merged)
+        self.assertNotEqual(first, second)
+
+    def test_member_panel_reports_merged_press(self):
+        self.client.force_login(self.head)
+        self.client.post("/door/")
+        response = self.client.post("/door/", follow=True)
+
+        self.assertContains(response, "Door is already opening.")
+        self.assertEqual(DoorCommand.objects.count(), 1)
+        self.assertEqual(AccessLog.objects.filter(command__isnull=False).count(), 2)
+
+
+class ConcurrentPressTests(TransactionTestCase):
+    def test_concurrent_presses_merge_without_errors(self):
+        building = Building.objects.create(title="Crowded Building")
+        device = Device.objects.create(building=building, api_token="crowded-token")
+        head = User.objects.create_user(username="crowded-head")
+        household = Household.objects.create(
+            title="Crowded Home", head=head, building=building
+        )
+        users = [User.objects.create_user(username=f"presser-{i}") for i in range(8)]
+        start = threading.Barrier(len(users))
+        errors = []
+
+        def press(user):
+            try:
+                start.wait()
+                _create_command(user, household, device)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=press, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(DoorCommand.objects.count(), 1)
+        self.assertEqual(
+            AccessLog.objects.filter(command=DoorCommand.objects.get()).count(), 8
+        )
+
+
+@override_settings(ACCESS_LOG_PAGE_SIZE=2)
+class AccessLogPaginationTests(TestCase):
+    def setUp(self):
+        self.head = User.objects.create_user(
+            username="log-head", password="pass", role=User.Roles.HEAD
+        )
+        self.building = Building.objects.create(title="Log Building")
+        self.household = Household.objects.create(
+            title="Log Home", head=self.head, building=self.building
+        )
+        self.member = User.objects.create_user(username="log-member")
+        for status in ("success", "denied", "success", "denied", "success"):
+            AccessLog.objects.create(
+                user=self.member, household=self.household, status=status
+            )
+        self.client.force_login(self.head)
+
+    def _page(self, **params):
+        return self.client.get("/logs/", {"format": "json", **params}).json()
+
+    def test_cursor_pages_are_disjoint_and_ordered(self):
+        first = self._page()
+        second = self._page(cursor=first["next_cursor"])
+        third = self._page(cursor=second["next_cursor"])
+
+        ids = [row["id"] for page in (first, second, third) for row in page["results"]]
+        self.assertEqual(
+            ids,
+            list(
+                AccessLog.objects.order_by("-timestamp", "-id").values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+        self.assertIsNone(third["next_cursor"])
+
+    def test_filters_by_status_and_user(self):
+        denied = self._page(status="denied")
+        self.assertEqual({row["status"] for row in denied["results"]}, {"denied"})
+        self.assertIsNone(denied["next_cursor"])
+
+        self.assertEqual(self._page(user=self.head.pk)["results"], [])
+
+    def test_html_page_links_to_older_entries(self):
+        response = self.client.get("/logs/", {"status": "success"})
+
+        self.assertEqual(len(response.context["logs"]), 2)
+        self.assertIn("status=success", response.context["next_url"])
+
+    def test_export_streams_filtered_csv(self):
+        response = self.client.get("/logs/export/", {"status": "denied"})
+
+        body = b"".join(response.streaming_content).decode()
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "id,user,status,reason,command,timestamp")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(",denied," in line for line in lines[1:]))
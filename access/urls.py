@@ -6,5 +6,8 @@ app_name = "access"
 
 urlpatterns = [
     path("door/", views.member_panel, name="member_panel"),
+    path("door/events/", views.status_stream, name="status_stream"),
+    path("door/status/", views.status_snapshot, name="status_snapshot"),
     path("logs/", views.access_logs, name="access_logs"),
+    path("logs/export/", views.export_access_logs, name="export_access_logs"),
 ]
@@ -1,15 +1,52 @@
+import asyncio
+import json
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from django.views.decorators.http import require_GET
 
 from accounts.decorators import head_required
+from accounts.models import User
+from devices.export import (
+    ACCESS_LOG_COLUMNS,
+    FORMATS as EXPORT_FORMATS,
+    access_log_row,
+    export_response,
+)
 from devices.models import Device
+from devices.pagination import keyset_page, next_page_url, parse_time_filter
+from devices.presence import last_seen_buffer
+from devices.ratelimit import rate_limit, user_client
 from households.models import Building, Household, MemberProfile
+from .events import status_events
 from .models import AccessLog, DoorCommand
 
 
+def _door_rate_limited(request, retry_after):
+    """Back to the panel with a message; keeps ``Retry-After`` for clients."""
+
+    messages.error(
+        request, f"Too many door requests. Try again in {retry_after} seconds."
+    )
+    response = redirect("access:member_panel")
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
 @login_required
+@rate_limit(
+    "door_open", client=user_client, methods={"POST"}, respond=_door_rate_limited
+)
 def member_panel(request):
     user = request.user
     if user.is_head:
@@ -35,16 +72,24 @@ def member_panel(request):
             return redirect("access:member_panel")
 
         if user.is_head:
-            _create_command(user, household, device)
-            messages.success(request, "Door command queued for your device.")
+            _, merged = _create_command(user, household, device)
+            messages.success(
+                request,
+                "Door is already opening."
+                if merged
+                else "Door command queued for your device.",
+            )
         else:
             if not member_profile:
                 messages.error(request, "No member profile configured.")
                 return redirect("access:member_panel")
             allowed, reason = _member_is_allowed(member_profile)
             if allowed:
-                _create_command(user, household, device)
-                messages.success(request, "Door command queued.")
+                _, merged = _create_command(user, household, device)
+                messages.success(
+                    request,
+                    "Door is already opening." if merged else "Door command queued.",
+                )
             else:
                 AccessLog.objects.create(
                     user=user, household=household, status=AccessLog.Status.DENIED, reason=reason
@@ -64,15 +109,335 @@ def _member_is_allowed(member_profile: MemberProfile):
     return True, ""
 
 
+# Attempts for a door press that loses a lock race with a concurrent press.
+# SQLite answers "database is locked" once its busy timeout runs out, and
+# shared-cache databases without waiting at all.
+COMMAND_LOCK_ATTEMPTS = 10
+
+
 def _create_command(user, household, device: Device):
-    DoorCommand.objects.create(device=device, requested_by=user)
-    AccessLog.objects.create(user=user, household=household, status=AccessLog.Status.SUCCESS, reason="Door open")
+    """Queue a door command, merging into one that is still pending.
+
+    Presses that arrive while the device has an unexecuted command ride along
+    with it instead of queueing another relay pulse and ack round trip. Every
+    requester still gets an ``AccessLog`` linked to the command. Returns
+    ``(command, merged)``.
+    """
+
+    for attempt in range(1, COMMAND_LOCK_ATTEMPTS + 1):
+        try:
+            return _merge_or_queue_command(user, household, device)
+        except OperationalError as exc:
+            # Inside an outer transaction the press cannot be replayed.
+            if (
+                "locked" not in str(exc)
+                or connection.in_atomic_block
+                or attempt == COMMAND_LOCK_ATTEMPTS
+            ):
+                raise
+            time.sleep(random.uniform(0.01, 0.05) * attempt)
+
+
+def _merge_or_queue_command(user, household, device):
+    with transaction.atomic():
+        # Take the device row's write lock before reading. A no-op UPDATE
+        # locks the row like select_for_update() and, on SQLite (which ignores
+        # select_for_update()), starts the write transaction up front instead
+        # of reading first and failing to upgrade the lock.
+        Device.objects.filter(pk=device.pk).update(building_id=F("building_id"))
+        command = (
+            DoorCommand.objects.pending()
+            .filter(device=device)
+            .order_by("created_at")
+            .first()
+        )
+        merged = command is not None
+        if not merged:
+            # Saving the command flags the device in the pending index and
+            # wakes any long poll held for it (see devices.signals).
+            command = DoorCommand.objects.create(device=device, requested_by=user)
+        AccessLog.objects.create(
+            user=user,
+            household=household,
+            status=AccessLog.Status.SUCCESS,
+            reason="Door open (merged)" if merged else "Door open",
+            command=command,
+        )
+    return command, merged
+
+
+def _user_household(user):
+    if user.is_head:
+        return Household.objects.filter(head=user).first()
+    member_profile = getattr(user, "member_profile", None)
+    return member_profile.household if member_profile else None
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _status_snapshot(building_id):
+    """Current device presence and pending commands for a new stream."""
+
+    now = timezone.now()
+    offline_after = settings.DEVICE_OFFLINE_AFTER
+    devices, online = [], []
+    rows = Device.objects.filter(building_id=building_id).values_list("id", "last_seen")
+    for device_id, stored in rows:
+        last_seen = last_seen_buffer.get(device_id, stored)
+        is_online = (
+            last_seen is not None
+            and (now - last_seen).total_seconds() <= offline_after
+        )
+        if is_online:
+            online.append((device_id, last_seen))
+        devices.append(
+            {
+                "id": device_id,
+                "online": is_online,
+                "last_seen": last_seen.isoformat() if last_seen else None,
+            }
+        )
+    commands = list(
+        DoorCommand.objects.pending(now)
+        .filter(device__building_id=building_id)
+        .order_by("created_at")
+        .values("id", "device_id", "expires_at")
+    )
+    status_events.track(
+        building_id,
+        devices=online,
+        commands=[(c["id"], c["expires_at"]) for c in commands],
+    )
+    return {
+        "devices": devices,
+        "commands": [
+            {"id": c["id"], "device": c["device_id"], "status": "queued"}
+            for c in commands
+        ],
+    }
+
+
+def _executed_commands(command_ids):
+    return set(
+        DoorCommand.objects.filter(id__in=command_ids, executed=True).values_list(
+            "id", flat=True
+        )
+    )
+
+
+class _StatusStream:
+    """Event source for one browser: snapshot, buffered events, keepalives.
+
+    Both iterators share the bookkeeping; the sync one holds a thread while
+    waiting (WSGI) and the async one waits on the event loop (ASGI).
+    """
+
+    def __init__(self, building_id, last_id):
+        self.building_id = building_id
+        self.last_id = last_id
+        self.deadline = time.monotonic() + settings.STATUS_STREAM_MAX_AGE
+        self.next_keepalive = time.monotonic() + settings.STATUS_STREAM_KEEPALIVE
+
+    def needs_snapshot(self):
+        _, complete = status_events.events_since(self.building_id, self.last_id)
+        if self.last_id and complete:
+            return False
+        # Read the id first so events published during the query are resent.
+        self.last_id = status_events.latest_id()
+        return True
+
+    def sweep(self, now=None):
+        status_events.sweep(self.building_id, now, executed=_executed_commands)
+
+    def pending_chunks(self):
+        events, _ = status_events.events_since(self.building_id, self.last_id)
+        chunks = []
+        for event_id, event, data in events:
+            chunks.append(_sse(event, data, event_id))
+            self.last_id = event_id
+        now = time.monotonic()
+        if now >= self.next_keepalive:
+            chunks.append(": keepalive\n\n")
+        if chunks:
+            self.next_keepalive = now + settings.STATUS_STREAM_KEEPALIVE
+        return chunks
+
+    def wait_timeout(self):
+        remaining = self.deadline - time.monotonic()
+        return min(remaining, settings.STATUS_STREAM_SWEEP_INTERVAL)
+
+    def __iter__(self):
+        yield f"retry: {settings.STATUS_STREAM_KEEPALIVE * 1000}\n\n"
+        if self.needs_snapshot():
+            yield _sse("snapshot", _status_snapshot(self.building_id), self.last_id)
+        while True:
+            sequence = status_events.notifier.sequence(self.building_id)
+            self.sweep()
+            yield from self.pending_chunks()
+            timeout = self.wait_timeout()
+            if timeout <= 0:
+                return
+            status_events.notifier.wait(self.building_id, sequence, timeout)
+
+    async def __aiter__(self):
+        yield f"retry: {settings.STATUS_STREAM_KEEPALIVE * 1000}\n\n"
+        if self.needs_snapshot():
+            snapshot = await sync_to_async(_status_snapshot)(self.building_id)
+            yield _sse("snapshot", snapshot, self.last_id)
+        while True:
+            sequence = status_events.notifier.sequence(self.building_id)
+            now = timezone.now()
+            if status_events.commands_due(self.building_id, now):
+                # Expired-looking commands are checked in the database.
+                await sync_to_async(self.sweep)(now)
+            else:
+                self.sweep(now)
+            for chunk in self.pending_chunks():
+                yield chunk
+            timeout = self.wait_timeout()
+            if timeout <= 0:
+                return
+            try:
+                await status_events.notifier.async_wait(
+                    self.building_id, sequence, timeout
+                )
+            except asyncio.CancelledError:
+                return
+
+
+@login_required
+@require_GET
+def status_stream(request):
+    """Server-Sent Events with the household's command and device status.
+
+    Streams start with a ``snapshot`` event, then send ``command`` (queued,
+    fetched, executed, expired) and ``device`` (online/offline) events as the
+    status bus publishes them. The stream closes after
+    ``STATUS_STREAM_MAX_AGE`` seconds; browsers reconnect with
+    ``Last-Event-ID`` and only receive what they missed.
+    """
+
+    household = _user_household(request.user)
+    if household is None or not settings.STATUS_STREAM_ENABLED:
+        # 204 tells EventSource to stop reconnecting.
+        return HttpResponse(status=204)
+
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_id = 0
+    stream = _StatusStream(household.building_id, last_id)
+    response = StreamingHttpResponse(
+        stream.__aiter__() if isinstance(request, ASGIRequest) else iter(stream),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+@require_GET
+def status_snapshot(request):
+    """The ``snapshot`` event of :func:`status_stream` as plain JSON.
+
+    Polled by the live status panel when the stream is disabled
+    (``STATUS_STREAM_ENABLED``, off under WSGI by default).
+    """
+
+    household = _user_household(request.user)
+    if household is None:
+        return HttpResponse(status=204)
+    return JsonResponse(_status_snapshot(household.building_id))
+
+
+def _head_household(user):
+    household, _ = Household.objects.get_or_create(
+        head=user, defaults={"title": f"{user.username}'s Home"}
+    )
+    return household
+
+
+def _filtered_access_logs(household, params):
+    """The household's access logs narrowed by the log page query filters."""
+
+    queryset = household.access_logs.select_related("user")
+    if params.get("user", "").isdigit():
+        queryset = queryset.filter(user_id=int(params["user"]))
+    if params.get("status"):
+        queryset = queryset.filter(status=params["status"])
+    since = parse_time_filter(params.get("since"))
+    if since:
+        queryset = queryset.filter(timestamp__gte=since)
+    until = parse_time_filter(params.get("until"), end=True)
+    if until:
+        queryset = queryset.filter(timestamp__lt=until)
+    return queryset
 
 
 @head_required
 def access_logs(request):
-    household, _ = Household.objects.get_or_create(
-        head=request.user, defaults={"title": f"{request.user.username}'s Home"}
+    """Household access attempts, newest first, one keyset page at a time.
+
+    Filters: ``user`` (id), ``status``, ``since`` and ``until`` (ISO date or
+    datetime); ``cursor`` continues from a previous page and ``format=json``
+    returns the page as JSON for infinite scrolling.
+    """
+
+    household = _head_household(request.user)
+    params = request.GET
+    queryset = _filtered_access_logs(household, params)
+
+    logs, next_cursor = keyset_page(
+        queryset, "timestamp", params.get("cursor"), settings.ACCESS_LOG_PAGE_SIZE
+    )
+    if params.get("format") == "json":
+        return JsonResponse(
+            {
+                "results": [access_log_row(log) for log in logs],
+                "next_cursor": next_cursor,
+                "next": next_page_url(request, next_cursor),
+            }
+        )
+
+    users = User.objects.filter(
+        Q(pk=household.head_id) | Q(member_profile__household=household)
+    ).order_by("username")
+    return render(
+        request,
+        "access/access_logs.html",
+        {
+            "logs": logs,
+            "household": household,
+            "users": users,
+            "statuses": AccessLog.Status.choices,
+            "filters": params,
+            "next_url": next_page_url(request, next_cursor),
+        },
+    )
+
+
+@head_required
+@require_GET
+def export_access_logs(request):
+    """Stream the filtered access logs as CSV or NDJSON (``?gzip=1``)."""
+
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": "Unknown export format"}, status=400)
+    household = _head_household(request.user)
+    queryset = _filtered_access_logs(household, request.GET).order_by(
+        "timestamp", "id"
+    )
+    return export_response(
+        queryset,
+        access_log_row,
+        ACCESS_LOG_COLUMNS,
+        "access-logs",
+        fmt,
+        request.GET.get("gzip") == "1",
     )
-    logs = household.access_logs.select_related("user").order_by("-timestamp")[:100]
-    return render(request, "access/access_logs.html", {"logs": logs, "household": household})
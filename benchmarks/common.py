@@ -0,0 +1,54 @@
+"""Shared setup for the standalone benchmark scripts in this directory."""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(db_path, async_api=False):
+    """Configure Django against a throwaway SQLite file and migrate it."""
+
+    sys.path.insert(0, ROOT)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "config.settings"
+    os.environ["DEVICE_API_ASYNC"] = "1" if async_api else "0"
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["*"]
+    # Benchmarks measure the endpoints, not overload protection: no rate
+    # limits, and admit every request so a burst of simulated devices is not
+    # answered with 429s or 503s.
+    settings.RATE_LIMITS = {}
+    settings.DEVICE_ADMISSION_MAX_IN_FLIGHT = 100000
+    settings.DEVICE_ADMISSION_MAX_LONG_POLLS = 100000
+    settings.DEVICE_ADMISSION_LATENCY_TARGET = 3600
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def create_devices(count, prefix="bench"):
+    """Create ``count`` devices in one building and return ``(id, token)`` pairs."""
+
+    from devices.models import Device
+    from households.models import Building
+
+    building = Building.objects.create(title="Benchmark")
+    Device.objects.bulk_create(
+        Device(building=building, api_token=f"{prefix}-{i}") for i in range(count)
+    )
+    return list(Device.objects.values_list("id", "api_token"))
+
+
+def flush_buffers():
+    """Write in-memory device state before the throwaway database is removed."""
+
+    from devices.presence import last_seen_buffer
+
+    last_seen_buffer.flush()
@@ -0,0 +1,220 @@
+"""Compare idle long-poll capacity of the WSGI and ASGI device endpoints.
+
+Opens ``--devices`` concurrent ``GET /api/device/command/?wait=N`` requests
+against Django's WSGI handler (one worker thread per held request, capped by
+``--wsgi-threads`` like a threaded server) and against the ASGI handler (one
+asyncio task per request). Once requests are parked, it reports how many are
+held at the same time and the resident memory per idle device, then publishes
+a command to every device to release them.
+
+Run from the repository root::
+
+    python benchmarks/device_connections.py --devices 500 --wsgi-threads 64
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from common import create_devices, flush_buffers, setup_django
+
+
+def _rss_kib():
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _setup(mode, db_path, devices):
+    setup_django(db_path, async_api=mode == "asgi")
+
+    from django.conf import settings
+
+    # Held requests should only wake on publish so the benchmark measures
+    # connection overhead, not database re-check traffic.
+    settings.DEVICE_LONG_POLL_RECHECK_INTERVAL = 3600
+    return create_devices(devices)
+
+
+def _wait_until_held(expected, key, timeout=30):
+    from devices.notifications import command_notifier
+
+    deadline = time.monotonic() + timeout
+    held = 0
+    while time.monotonic() < deadline:
+        held = command_notifier.stats()[key]
+        if held >= expected:
+            break
+        time.sleep(0.05)
+    # Give stragglers a moment so partial capacity is reported accurately.
+    time.sleep(0.2)
+    return command_notifier.stats()[key]
+
+
+def _release(device_ids):
+    from django.utils import timezone
+
+    from access.models import DoorCommand
+    from devices.notifications import notify_command_queued
+
+    expires_at = timezone.now() + timedelta(minutes=5)
+    DoorCommand.objects.bulk_create(
+        DoorCommand(device_id=pk, expires_at=expires_at) for pk, _ in device_ids
+    )
+    for pk, _ in device_ids:
+        notify_command_queued(pk)
+
+
+def run_wsgi(args, db_path):
+    devices = _setup("wsgi", db_path, args.devices)
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+
+    def request(token):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": "/api/device/command/",
+            "QUERY_STRING": f"wait={args.wait}",
+            "SERVER_NAME": "bench",
+            "SERVER_PORT": "80",
+            "HTTP_X_DEVICE_TOKEN": token,
+            "wsgi.input": open(os.devnull, "rb"),
+            "wsgi.url_scheme": "http",
+        }
+        status = []
+        body = b"".join(handler(environ, lambda s, h: status.append(s)))
+        return status[0], json.loads(body)
+
+    gc.collect()
+    baseline = _rss_kib()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.wsgi_threads) as pool:
+        futures = [pool.submit(request, token) for _, token in devices]
+        held = _wait_until_held(min(args.devices, args.wsgi_threads), "thread_waiters")
+        rss = _rss_kib()
+        threads = threading.active_count()
+        _release(devices)
+        results = [f.result() for f in futures]
+    elapsed = time.monotonic() - started
+    return _report("wsgi", args, held, baseline, rss, threads, results, elapsed)
+
+
+def run_asgi(args, db_path):
+    devices = _setup("asgi", db_path, args.devices)
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+
+    async def request(token):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/device/command/",
+            "raw_path": b"/api/device/command/",
+            "query_string": f"wait={args.wait}".encode(),
+            "headers": [(b"x-device-token", token.encode())],
+            "server": ("bench", 80),
+        }
+        sent_body = False
+        disconnect = asyncio.Event()
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await handler(scope, receive, send)
+        body = b"".join(
+            m.get("body", b"") for m in messages if m["type"] == "http.response.body"
+        )
+        return messages[0]["status"], json.loads(body)
+
+    async def main():
+        gc.collect()
+        baseline = _rss_kib()
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(request(token)) for _, token in devices]
+        held = await sync_to_async(_wait_until_held, thread_sensitive=False)(
+            args.devices, "async_waiters"
+        )
+        rss = _rss_kib()
+        threads = threading.active_count()
+        await sync_to_async(_release)(devices)
+        results = await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+        return _report("asgi", args, held, baseline, rss, threads, results, elapsed)
+
+    return asyncio.run(main())
+
+
+def _report(mode, args, held, baseline, rss, threads, results, elapsed):
+    opened = sum(1 for _, body in results if body.get("open"))
+    per_device = (rss - baseline) / held if held else 0.0
+    return {
+        "mode": mode,
+        "devices": args.devices,
+        "held_concurrently": held,
+        "threads": threads,
+        "rss_delta_kib": rss - baseline,
+        "kib_per_idle_device": round(per_device, 2),
+        "commands_delivered": opened,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--wait", type=float, default=25)
+    parser.add_argument("--wsgi-threads", type=int, default=64)
+    parser.add_argument("--mode", choices=("both", "wsgi", "asgi"), default="both")
+    args = parser.parse_args()
+
+    if args.mode == "both":
+        # Each mode runs in a fresh interpreter so URL routing and memory
+        # baselines do not leak between them.
+        for mode in ("wsgi", "asgi"):
+            argv = [sys.executable, __file__, "--mode", mode]
+            argv += ["--devices", str(args.devices), "--wait", str(args.wait)]
+            argv += ["--wsgi-threads", str(args.wsgi_threads)]
+            subprocess.run(argv, check=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        runner = run_wsgi if args.mode == "wsgi" else run_asgi
+        print(json.dumps(runner(args, db_path)))
+        flush_buffers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measure /api/device/logs/ ingestion throughput for different batch sizes.
+
+Each run posts ``--rows`` log records through the full Django request stack,
+grouped into requests of 1, 10 and 100 records, and reports rows/sec.
+
+Run from the repository root::
+
+    python benchmarks/log_ingest.py --rows 2000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import create_devices, flush_buffers, setup_django
+
+
+def run(batch_size, rows, token):
+    from django.test import Client
+
+    client = Client()
+    record = {
+        "message": "Running firmware 1.0.0 (config 1.0.0)",
+        "event_type": "heartbeat",
+        "metadata": {"uptime_seconds": 120, "wifi": {"rssi": -60, "connected": True}},
+    }
+    requests = max(1, rows // batch_size)
+    body = json.dumps(record if batch_size == 1 else [record] * batch_size)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.post(
+            "/api/device/logs/",
+            data=body,
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=token,
+        )
+        assert response.status_code == 200, response.content
+    elapsed = time.perf_counter() - started
+    inserted = requests * batch_size
+    return {
+        "records_per_request": batch_size,
+        "requests": requests,
+        "rows": inserted,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_sec": round(inserted / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, "bench.sqlite3"))
+        [(_, token)] = create_devices(1)
+        for batch_size in (1, 10, 100):
+            print(json.dumps(run(batch_size, args.rows, token)))
+        flush_buffers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compare DeviceLog full-text (FTS5) search with the old LIKE search.
+
+Fills a throwaway database with ``--rows`` heartbeat-style logs (a few rare
+messages mixed in), then times the admin's former ``LIKE '%term%'`` search on
+message and building title against the FTS5 index for several terms and
+reports the median milliseconds per query.
+
+Run from the repository root::
+
+    python benchmarks/log_search.py --rows 200000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from common import create_devices, setup_django
+
+TERMS = ("watchdog", "Lobby", "relay stuck", "heartbeat")
+
+
+def populate(rows, device_ids, batch_size=5000):
+    from devices.models import DeviceLog
+
+    rare = ["Relay stuck open", "Watchdog reset", "Door forced"]
+    for start in range(0, rows, batch_size):
+        DeviceLog.objects.bulk_create(
+            DeviceLog(
+                device_id=device_ids[index % len(device_ids)],
+                event_type="heartbeat",
+                message=(
+                    rare[index % len(rare)]
+                    if index % 997 == 0
+                    else f"Heartbeat {index}: uptime {index * 60}s"
+                ),
+                metadata={
+                    "wifi": {"ssid": "Lobby-AP" if index % 50 == 0 else "Home"},
+                    "uptime_seconds": index * 60,
+                },
+            )
+            for index in range(start, min(start + batch_size, rows))
+        )
+
+
+def time_query(build, repeat):
+    timings, count = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = build().count()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2), count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, "bench.sqlite3"))
+        from django.db.models import Q
+
+        from devices.models import DeviceLog
+        from devices.search import search_logs
+
+        device_ids = [pk for pk, _ in create_devices(10)]
+        started = time.perf_counter()
+        populate(args.rows, device_ids)
+        print(
+            json.dumps(
+                {
+                    "rows": args.rows,
+                    "insert_s": round(time.perf_counter() - started, 2),
+                }
+            )
+        )
+
+        logs = DeviceLog.objects.all()
+        for term in TERMS:
+            like_ms, like_count = time_query(
+                lambda: logs.filter(
+                    Q(message__icontains=term)
+                    | Q(device__building__title__icontains=term)
+                ),
+                args.repeat,
+            )
+            fts_ms, fts_count = time_query(lambda: search_logs(logs, term), args.repeat)
+            print(
+                json.dumps(
+                    {
+                        "term": term,
+                        "like_ms": like_ms,
+                        "like_matches": like_count,
+                        "fts_ms": fts_ms,
+                        "fts_matches": fts_count,
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
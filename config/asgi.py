@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Serve the device API through its async views (see DEVICE_API_ASYNC).
+os.environ.setdefault("DEVICE_API_ASYNC", "1")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from devices.websocket import device_websocket  # noqa: E402  (needs apps loaded)
+
+
+async def application(scope, receive, send):
+    # Django only speaks HTTP; WebSocket connections are the device push channel.
+    if scope["type"] == "websocket":
+        await device_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -66,6 +68,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "access.context_processors.live_status",
             ],
         },
     },
@@ -73,6 +76,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+TEST_RUNNER = "config.test_runner.TestRunner"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -131,3 +136,152 @@ LOGIN_REDIRECT_URL = "access:member_panel"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        # Room for per-device state (pending index, poll schedules, rate-limit
+        # counters, rollout slot leases) beyond LocMemCache's 300-entry default.
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    }
+}
+
+
+# Device API
+# Cache alias for device state shared between worker processes (pending-command
+# index). The local-memory default is only correct with a single process; point
+# it at Redis or Memcached when running several workers. With DEBUG off, a
+# process-local backend here is reported by the devices.W001 system check.
+DEVICE_STATE_CACHE = "default"
+# Seconds a device's "no pending commands" marker is trusted before the next
+# poll checks the database again, when DEVICE_STATE_CACHE is process-local.
+# Bounds how long a command queued through another worker can go unseen. On a
+# shared cache the marker is kept until a command is queued.
+DEVICE_PENDING_IDLE_TTL = 2
+# Route the device endpoints to their async views. Enabled by config/asgi.py so
+# that ASGI deployments hold idle long polls on the event loop.
+DEVICE_API_ASYNC = os.environ.get("DEVICE_API_ASYNC") == "1"
+# Threads shared by the async device views for database work.
+DEVICE_ASYNC_DB_THREADS = 4
+# Runtime hints returned to devices by /api/device/sync/.
+DEVICE_POLL_INTERVAL_MS = 2000
+# Adaptive poll schedule (devices/schedule.py): DEVICE_POLL_INTERVAL_MS after
+# door activity in the last DEVICE_ACTIVITY_WINDOW seconds or in an hour of the
+# day with at least DEVICE_ACTIVITY_BUSY_HOUR_COMMANDS commands over the last
+# DEVICE_ACTIVITY_HISTORY_DAYS; otherwise the window interval while a member's
+# allowed time window is open and the idle interval outside of them. Cached
+# per device for DEVICE_POLL_SCHEDULE_TTL seconds.
+DEVICE_WINDOW_POLL_INTERVAL_MS = 5000
+DEVICE_IDLE_POLL_INTERVAL_MS = 30000
+DEVICE_ACTIVITY_WINDOW = 900
+DEVICE_ACTIVITY_HISTORY_DAYS = 14
+DEVICE_ACTIVITY_BUSY_HOUR_COMMANDS = 3
+DEVICE_POLL_SCHEDULE_TTL = 60
+DEVICE_OTA_CHECK_INTERVAL_MS = 60000
+# How long (seconds) computed OTA delta patches stay in DEVICE_STATE_CACHE.
+DEVICE_OTA_DELTA_CACHE_TTL = 3600
+# Staged rollouts: devices wait a random 0..DEVICE_OTA_JITTER_MS before
+# fetching a new build, and a download slot is leased for at most
+# DEVICE_OTA_DOWNLOAD_SLOT_TTL seconds.
+DEVICE_OTA_JITTER_MS = 30000
+DEVICE_OTA_DOWNLOAD_SLOT_TTL = 300
+# Per-process memory budget (bytes) for encoded firmware release bodies.
+DEVICE_RELEASE_BODY_CACHE_BYTES = 8 * 1024 * 1024
+# Per-process memory budget (bytes) for coalesced firmware payload bodies.
+DEVICE_RESPONSE_CACHE_BYTES = 4 * 1024 * 1024
+# Upper bound (seconds) for ``?wait=`` long polling on /api/device/command/.
+# Keep it below the firmware watchdog timeout minus network overhead.
+DEVICE_LONG_POLL_MAX_WAIT = 25
+# How often a held long-poll request re-checks the database for commands
+# queued by other worker processes.
+DEVICE_LONG_POLL_RECHECK_INTERVAL = 1.0
+# WebSocket push channel (/api/device/ws/, ASGI only): devices send a heartbeat
+# every DEVICE_WS_HEARTBEAT_MS and sockets silent for DEVICE_WS_IDLE_TIMEOUT
+# seconds are closed.
+DEVICE_WS_HEARTBEAT_MS = 15000
+DEVICE_WS_IDLE_TIMEOUT = 60
+# Seconds between a socket's checks of the pending-command index for commands
+# queued by other worker processes (commands queued in the same process are
+# pushed at once). The database is only read when the index changed.
+DEVICE_WS_RECHECK_INTERVAL = 30
+# Devices are shown offline after this many seconds without a request.
+DEVICE_OFFLINE_AFTER = 60
+# Per-process cache of device API tokens: max entries, seconds a known token is
+# trusted, and seconds an unknown token is remembered as invalid.
+DEVICE_TOKEN_CACHE_SIZE = 1024
+DEVICE_TOKEN_CACHE_TTL = 300
+DEVICE_TOKEN_NEGATIVE_TTL = 30
+# Seconds between bulk writes of buffered Device.last_seen values (0 writes
+# through on every request). A background thread writes values left behind
+# once requests stop; the test runner (config/test_runner.py) keeps it off.
+DEVICE_LAST_SEEN_FLUSH_INTERVAL = 5
+# Overload shedding for /api/device/*: a request is answered with 503 and a
+# poll_after_ms hint (about DEVICE_SHED_POLL_AFTER_MS) when this many requests
+# are already working, or while their moving average latency (long-poll holds
+# excluded) is above DEVICE_ADMISSION_LATENCY_TARGET seconds. Normal poll
+# responses stretch their hint towards DEVICE_SHED_POLL_AFTER_MS as load rises.
+# Long polls (?wait=) are admitted in their own lane, up to
+# DEVICE_ADMISSION_MAX_LONG_POLLS per process, and never count as working.
+DEVICE_ADMISSION_MAX_IN_FLIGHT = 32
+DEVICE_ADMISSION_MAX_LONG_POLLS = 2000
+DEVICE_ADMISSION_LATENCY_TARGET = 0.5
+DEVICE_SHED_POLL_AFTER_MS = 15000
+# Rate limits per device token (device_*; unknown tokens per client address) or
+# user (door_open) as (requests per minute, burst): burst requests per window
+# of burst / requests-per-minute minutes. Counters live in DEVICE_STATE_CACHE;
+# requests over the limit get 429 with Retry-After. Remove a scope to disable it.
+RATE_LIMITS = {
+    "device_command": (120, 30),
+    "device_ack": (60, 20),
+    "device_logs": (60, 20),
+    "device_sync": (120, 30),
+    "device_firmware": (60, 20),
+    "door_open": (12, 5),
+}
+# Rows per page on /devices/logs/ and /logs/ (keyset pagination).
+DEVICE_LOG_PAGE_SIZE = 200
+ACCESS_LOG_PAGE_SIZE = 100
+# Rows fetched per database round trip by log exports (/logs/export/,
+# /devices/logs/export/ and manage.py export_logs).
+LOG_EXPORT_CHUNK_SIZE = 2000
+# Maximum log records accepted in one /api/device/logs/ or sync request.
+DEVICE_LOG_BATCH_MAX = 100
+# Write-behind log ingestion (devices/log_queue.py): when enabled, validated
+# logs are queued in memory (at most DEVICE_LOG_QUEUE_MAX_SIZE rows; fuller
+# requests get 503 and a retry hint of DEVICE_LOG_QUEUE_RETRY_AFTER_MS) and a
+# background thread inserts them in batches of DEVICE_LOG_QUEUE_BATCH_SIZE,
+# or after DEVICE_LOG_QUEUE_FLUSH_INTERVAL seconds. A batch that hits a
+# transient database error is requeued and retried after
+# DEVICE_LOG_QUEUE_RETRY_BACKOFF seconds (doubling), up to
+# DEVICE_LOG_QUEUE_MAX_RETRIES times in a row. Queued rows are drained at
+# shutdown but lost if the process is killed.
+DEVICE_LOG_QUEUE_ENABLED = False
+DEVICE_LOG_QUEUE_MAX_SIZE = 5000
+DEVICE_LOG_QUEUE_BATCH_SIZE = 200
+DEVICE_LOG_QUEUE_FLUSH_INTERVAL = 0.5
+DEVICE_LOG_QUEUE_RETRY_AFTER_MS = 5000
+DEVICE_LOG_QUEUE_RETRY_BACKOFF = 0.5
+DEVICE_LOG_QUEUE_MAX_RETRIES = 5
+# Device-side log timestamps older than this are treated as an unsynced clock
+# and replaced by the server time (the raw value is kept in metadata).
+DEVICE_LOG_MAX_CLOCK_SKEW = timedelta(days=7)
+
+
+# Live status stream (Server-Sent Events on /door/events/)
+# Events kept per building for Last-Event-ID resumption, seconds between
+# keepalive comments, seconds before a stream is closed for the browser to
+# reconnect (bounds threads held under WSGI), and how often streams check for
+# expired commands and offline devices.
+STATUS_STREAM_BUFFER_SIZE = 50
+STATUS_STREAM_KEEPALIVE = 15
+STATUS_STREAM_MAX_AGE = 300
+STATUS_STREAM_SWEEP_INTERVAL = 1.0
+# Each open stream holds a worker thread under WSGI, so the panels only use the
+# stream under ASGI by default; otherwise they poll the JSON snapshot at
+# /door/status/ every STATUS_POLL_INTERVAL seconds.
+STATUS_STREAM_ENABLED = DEVICE_API_ASYNC
+STATUS_POLL_INTERVAL = 10
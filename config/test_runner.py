@@ -0,0 +1,22 @@
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Keeps the device ``last_seen`` buffer in step with the test database.
+
+    Buffered values are only written from test code (no background flusher
+    racing test transactions) and are dropped before the test database is
+    destroyed, so the shutdown flush has nothing left to write.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        from devices.presence import last_seen_buffer
+
+        super().setup_test_environment(**kwargs)
+        last_seen_buffer.autostart = False
+
+    def teardown_databases(self, old_config, **kwargs):
+        from devices.presence import last_seen_buffer
+
+        last_seen_buffer.clear()
+        super().teardown_databases(old_config, **kwargs)
@@ -1,6 +1,17 @@
 from django.contrib import admin
+from django.db.models import Q
+from django.utils import timezone
 
-from .models import Device, DeviceFirmware, DeviceLog
+from .models import (
+    Device,
+    DeviceFirmware,
+    DeviceLog,
+    DeviceLogRollup,
+    FirmwareRelease,
+    FirmwareRollout,
+)
+from .rollouts import active_downloads
+from .search import search_logs
 
 
 class DeviceLogInline(admin.TabularInline):
@@ -12,22 +23,111 @@ class DeviceLogInline(admin.TabularInline):
 
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
-    list_display = ("id", "building", "api_token", "last_seen")
+    list_display = (
+        "id",
+        "building",
+        "api_token",
+        "firmware_version",
+        "config_version",
+        "current_last_seen",
+    )
+    list_filter = ("firmware_version", "config_version")
     search_fields = ("api_token", "building__title")
+    readonly_fields = ("firmware_version", "config_version", "versions_reported_at")
     inlines = (DeviceLogInline,)
 
+    @admin.display(description="آخرین مشاهده", ordering="last_seen")
+    def current_last_seen(self, obj):
+        return obj.current_last_seen
+
 
 @admin.register(DeviceFirmware)
 class DeviceFirmwareAdmin(admin.ModelAdmin):
-    list_display = ("device", "version", "config_version", "created_at")
+    list_display = ("device", "version", "config_version", "rollout", "created_at")
+    list_filter = ("rollout",)
     search_fields = ("device__building__title", "version", "config_version")
-    autocomplete_fields = ("device",)
+    autocomplete_fields = ("device", "release", "config_release")
     readonly_fields = ("checksum", "config_checksum", "created_at")
 
 
+@admin.register(FirmwareRelease)
+class FirmwareReleaseAdmin(admin.ModelAdmin):
+    list_display = ("version", "checksum", "created_at")
+    search_fields = ("version", "checksum")
+    readonly_fields = ("checksum", "version", "content", "created_at")
+
+    def has_add_permission(self, request):
+        # Releases are stored from DeviceFirmware content, keyed by checksum.
+        return False
+
+
+@admin.register(FirmwareRollout)
+class FirmwareRolloutAdmin(admin.ModelAdmin):
+    list_display = (
+        "release",
+        "percentage",
+        "max_concurrent_downloads",
+        "current_downloads",
+        "status",
+        "status_reason",
+        "updated_at",
+    )
+    list_filter = ("status",)
+    autocomplete_fields = ("release",)
+    filter_horizontal = ("buildings",)
+    readonly_fields = ("status_reason", "created_at", "updated_at")
+    actions = ("pause_rollouts", "resume_rollouts")
+
+    @admin.display(description="دانلودهای فعال")
+    def current_downloads(self, obj):
+        return active_downloads(obj)
+
+    @admin.action(description="توقف انتشار")
+    def pause_rollouts(self, request, queryset):
+        queryset.update(
+            status=FirmwareRollout.Status.PAUSED,
+            status_reason="Paused by admin",
+            updated_at=timezone.now(),
+        )
+
+    @admin.action(description="ادامه انتشار")
+    def resume_rollouts(self, request, queryset):
+        queryset.exclude(status=FirmwareRollout.Status.COMPLETED).update(
+            status=FirmwareRollout.Status.ACTIVE,
+            status_reason="",
+            updated_at=timezone.now(),
+        )
+
+
 @admin.register(DeviceLog)
 class DeviceLogAdmin(admin.ModelAdmin):
     list_display = ("device", "level", "message", "created_at")
     list_filter = ("level", "created_at")
-    search_fields = ("device__building__title", "message")
+    # Searched through the full-text index, see get_search_results.
+    search_fields = ("message",)
+    search_help_text = "Words in the message or metadata, or a building title."
     autocomplete_fields = ("device",)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        matches = search_logs(DeviceLog.objects.all(), search_term).values("id")
+        # Building titles are short rows; resolve them to device ids first so
+        # the log table is only probed through indexes.
+        devices = Device.objects.filter(
+            building__title__icontains=search_term.strip()
+        ).values("id")
+        return (
+            queryset.filter(Q(id__in=matches) | Q(device_id__in=devices)),
+            False,
+        )
+
+
+@admin.register(DeviceLogRollup)
+class DeviceLogRollupAdmin(admin.ModelAdmin):
+    list_display = ("device", "hour", "level", "event_type", "count")
+    list_filter = ("level", "hour")
+    readonly_fields = ("device", "hour", "level", "event_type", "count")
+
+    def has_add_permission(self, request):
+        return False
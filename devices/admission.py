@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import functools
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# ``[held_seconds, long_poll]`` for the current admitted request: time spent
+# held in a long poll (excluded from its latency sample) and its lane.
+_request_state = contextvars.ContextVar("device_admission_request", default=None)
+
+
+class AdmissionController:
+    """Per-process overload guard for the device API.
+
+    Tracks requests that are doing work and a moving average of their
+    latency (time held in a long poll excluded, see :meth:`holding`). A
+    request is shed when ``DEVICE_ADMISSION_MAX_IN_FLIGHT`` requests are
+    already working or the average exceeds ``DEVICE_ADMISSION_LATENCY_TARGET``
+    seconds. While shedding on latency one probe request is let through every
+    ``probe_interval`` seconds so the average can recover.
+
+    Long polls (``?wait=``) spend nearly all of their life parked, and a fleet
+    reconnecting at once would otherwise fill the working limit before any of
+    them reaches its wait. They are admitted in a separate lane capped by
+    ``DEVICE_ADMISSION_MAX_LONG_POLLS`` and never count towards
+    ``DEVICE_ADMISSION_MAX_IN_FLIGHT``.
+    """
+
+    smoothing = 0.2
+    probe_interval = 0.5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._long_polls = 0
+        self._held = 0
+        self._latency = 0.0
+        self._last_sample = 0.0
+        self._shedding = False
+        self._counters = dict.fromkeys(("admitted", "shed", "probes"), 0)
+
+    def _load(self):
+        return max(
+            self._in_flight / max(settings.DEVICE_ADMISSION_MAX_IN_FLIGHT, 1),
+            self._latency / settings.DEVICE_ADMISSION_LATENCY_TARGET,
+        )
+
+    def try_enter(self, long_poll=False) -> bool:
+        now = time.monotonic()
+        if long_poll:
+            count, limit = "_long_polls", settings.DEVICE_ADMISSION_MAX_LONG_POLLS
+        else:
+            count, limit = "_in_flight", settings.DEVICE_ADMISSION_MAX_IN_FLIGHT
+        with self._lock:
+            if getattr(self, count) >= limit:
+                self._shedding = True
+                self._counters["shed"] += 1
+                return False
+            if self._latency > settings.DEVICE_ADMISSION_LATENCY_TARGET:
+                self._shedding = True
+                if now - self._last_sample < self.probe_interval:
+                    self._counters["shed"] += 1
+                    return False
+                # Count the probe as a sample so only one goes through.
+                self._last_sample = now
+                self._counters["probes"] += 1
+            else:
+                self._shedding = False
+            setattr(self, count, getattr(self, count) + 1)
+            self._counters["admitted"] += 1
+            return True
+
+    def leave(self, elapsed, long_poll=False) -> None:
+        with self._lock:
+            if long_poll:
+                self._long_polls -= 1
+            else:
+                self._in_flight -= 1
+            self._latency += self.smoothing * (elapsed - self._latency)
+            self._last_sample = time.monotonic()
+
+    @contextmanager
+    def holding(self):
+        """Mark the current request as idle (e.g. a held long poll)."""
+
+        state = _request_state.get()
+        if state is None:
+            # Not inside an admitted request (websocket, management code).
+            yield
+            return
+        working = 0 if state[1] else 1
+        with self._lock:
+            self._in_flight -= working
+            self._held += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._in_flight += working
+                self._held -= 1
+            state[0] += elapsed
+
+    def poll_after_ms(self, shed=False) -> int:
+        """Poll interval hint: the normal interval, stretched as load rises."""
+
+        base = settings.DEVICE_POLL_INTERVAL_MS
+        ceiling = settings.DEVICE_SHED_POLL_AFTER_MS
+        if shed:
+            # Jitter so shed devices do not come back in lockstep.
+            return int(ceiling * random.uniform(1.0, 1.5))
+        with self._lock:
+            load = self._load()
+        if load <= 0.5:
+            return base
+        return int(base + (ceiling - base) * min(1.0, (load - 0.5) * 2))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(
+                in_flight=self._in_flight,
+                long_polls=self._long_polls,
+                held=self._held,
+                latency_ms=round(self._latency * 1000, 1),
+                load=round(self._load(), 3),
+                shedding=self._shedding,
+            )
+            return stats
+
+
+admission = AdmissionController()
+
+
+def _shed_response():
+    poll_after_ms = admission.poll_after_ms(shed=True)
+    response = JsonResponse(
+        {"error": "Server busy", "poll_after_ms": poll_after_ms}, status=503
+    )
+    response["Retry-After"] = str(math.ceil(poll_after_ms / 1000))
+    return response
+
+
+def _is_long_poll(request) -> bool:
+    try:
+        return float(request.GET.get("wait") or 0) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def shed_under_load(view_func):
+    """Answer ``503`` with a ``poll_after_ms`` hint when the API is overloaded."""
+
+    if asyncio.iscoroutinefunction(view_func):
+
+        @functools.wraps(view_func)
+        async def _async_wrapped(request, *args, **kwargs):
+            long_poll = _is_long_poll(request)
+            if not admission.try_enter(long_poll):
+                return _shed_response()
+            token = _request_state.set([0.0, long_poll])
+            started = time.monotonic()
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                held = _request_state.get()[0]
+                _request_state.reset(token)
+                admission.leave(time.monotonic() - started - held, long_poll)
+
+        return _async_wrapped
+
+    @functools.wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        long_poll = _is_long_poll(request)
+        if not admission.try_enter(long_poll):
+            return _shed_response()
+        token = _request_state.set([0.0, long_poll])
+        started = time.monotonic()
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            held = _request_state.get()[0]
+            _request_state.reset(token)
+            admission.leave(time.monotonic() - started - held, long_poll)
+
+    return _wrapped
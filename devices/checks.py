@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Cache backends whose contents are private to one process.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_device_state_cache(app_configs, **kwargs):
+    """Warn when ``DEVICE_STATE_CACHE`` is not shared between workers.
+
+    The pending-command index, rate-limit counters and rollout slot leases all
+    assume every worker process sees the same cache. Development servers run a
+    single process, so the check only applies with ``DEBUG`` off.
+    """
+
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES.get(settings.DEVICE_STATE_CACHE, {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"DEVICE_STATE_CACHE ({settings.DEVICE_STATE_CACHE!r}) uses {backend}, "
+            "which is private to each worker process.",
+            hint=(
+                "With more than one worker, commands queued through one worker "
+                "can be delayed on the others and rate limits are per worker. "
+                "Point DEVICE_STATE_CACHE at Redis or Memcached."
+            ),
+            id="devices.W001",
+        )
+    ]
@@ -0,0 +1,83 @@
+import difflib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .singleflight import response_flight
+
+
+def _split_lines(data: bytes):
+    """Split on ``\\n`` only, keeping line endings, like MicroPython ``readline``."""
+
+    parts = data.split(b"\n")
+    lines = [part + b"\n" for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def _op(payload) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode() + b"\n"
+
+
+def build_delta(base: str, target: str, base_checksum: str, target_checksum: str):
+    """Encode ``target`` as a line-level patch against ``base``.
+
+    The patch is newline-delimited JSON that a device can apply while reading
+    it from the socket: a header line, then ``copy`` ops (``count`` lines from
+    base line ``start``, always moving forward through the base file) and
+    ``insert`` ops followed by ``size`` raw bytes of new content.
+    """
+
+    base_lines = _split_lines(base.encode("utf-8"))
+    target_bytes = target.encode("utf-8")
+    target_lines = _split_lines(target_bytes)
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+
+    parts = [
+        _op(
+            {
+                "base": base_checksum,
+                "target": target_checksum,
+                "size": len(target_bytes),
+            }
+        )
+    ]
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            parts.append(_op({"op": "copy", "start": i1, "count": i2 - i1}))
+        elif j2 > j1:
+            data = b"".join(target_lines[j1:j2])
+            parts.append(_op({"op": "insert", "size": len(data)}))
+            parts.append(data)
+    return b"".join(parts)
+
+
+def cached_delta(base_release, firmware):
+    """Return the patch from ``base_release`` to ``firmware`` or ``None``.
+
+    Patches are cached per ``(base, target)`` pair and concurrent misses are
+    coalesced, so a rollout across many devices computes each diff once.
+    ``None`` means a full download is no larger than the patch.
+    """
+
+    cache = caches[settings.DEVICE_STATE_CACHE]
+    key = f"devices:delta:{base_release.checksum}:{firmware.checksum}"
+
+    def compute():
+        delta = cache.get(key)
+        if delta is None:
+            delta = build_delta(
+                base_release.content,
+                firmware.firmware_content,
+                base_release.checksum,
+                firmware.checksum,
+            )
+            if len(delta) >= len(firmware.firmware_content.encode("utf-8")):
+                delta = b""
+            cache.set(key, delta, timeout=settings.DEVICE_OTA_DELTA_CACHE_TTL)
+        return delta
+
+    # Coalesce only: the patch itself is already kept in the shared cache.
+    return response_flight.do(key, compute, store=False) or None
@@ -0,0 +1,125 @@
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+DEVICE_LOG_COLUMNS = (
+    "id",
+    "device",
+    "level",
+    "event_type",
+    "firmware_version",
+    "message",
+    "metadata",
+    "created_at",
+)
+ACCESS_LOG_COLUMNS = ("id", "user", "status", "reason", "command", "timestamp")
+
+# Rows are joined into chunks of about this many bytes before they are sent
+# (or compressed), instead of one write per row.
+CHUNK_BYTES = 64 * 1024
+
+
+def device_log_row(log):
+    return {
+        "id": log.id,
+        "device": log.device_id,
+        "level": log.level,
+        "event_type": log.event_type,
+        "firmware_version": log.firmware_version,
+        "message": log.message,
+        "metadata": log.metadata,
+        "created_at": log.created_at.isoformat(),
+    }
+
+
+def access_log_row(log):
+    return {
+        "id": log.id,
+        "user": log.user.username if log.user else None,
+        "status": log.status,
+        "reason": log.reason,
+        "command": log.command_id,
+        "timestamp": log.timestamp.isoformat(),
+    }
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the value back to ``csv``."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns).encode()
+    for row in rows:
+        yield writer.writerow(
+            [
+                json.dumps(row[column]) if column == "metadata" else row[column]
+                for column in columns
+            ]
+        ).encode()
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False).encode() + b"\n"
+
+
+def _chunked(lines):
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(queryset, serialize, columns, fmt="csv", compress=False):
+    """Return an iterator over the export of ``queryset`` as byte chunks.
+
+    Rows are read with ``iterator(chunk_size=LOG_EXPORT_CHUNK_SIZE)`` and
+    serialized one at a time, so memory stays flat however many rows match.
+    """
+
+    rows = map(serialize, queryset.iterator(chunk_size=settings.LOG_EXPORT_CHUNK_SIZE))
+    lines = _csv_lines(rows, columns) if fmt == "csv" else _ndjson_lines(rows)
+    chunks = _chunked(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+def export_response(queryset, serialize, columns, name, fmt, compress):
+    """Stream ``queryset`` as a CSV or NDJSON download, optionally gzipped."""
+
+    content_type, extension = FORMATS[fmt]
+    filename = f"{name}-{timezone.localdate().isoformat()}.{extension}"
+    if compress:
+        content_type, filename = "application/gzip", f"{filename}.gz"
+    response = StreamingHttpResponse(
+        export_chunks(queryset, serialize, columns, fmt, compress),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
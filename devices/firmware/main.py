@@ -8,9 +8,12 @@ Features:
 - Safe error handling for network and API issues.
 """
 
+import binascii
 import errno
 import json
 import os
+import select
+import socket
 import time
 import network
 import machine
@@ -21,6 +24,11 @@ try:
 except ImportError:  # pragma: no cover - desktop dev environment
     import hashlib
 
+try:
+    import ssl
+except ImportError:  # Older MicroPython ports
+    import ussl as ssl
+
 try:
     import urequests as requests
 except ImportError:  # Fallback for environments that alias urequests
@@ -50,9 +58,27 @@ POLL_INTERVAL_MS = 2000
 COMMAND_ENDPOINT = "/api/device/command/"
 ACK_ENDPOINT = "/api/device/command/ack/"
 LOG_ENDPOINT = "/api/device/logs/"
+# Combined endpoint: one request per loop delivers queued acks/logs and returns
+# the next command plus firmware/config version hints. Falls back to the
+# separate endpoints above if the backend answers 404.
+SYNC_ENABLED = True
+SYNC_ENDPOINT = "/api/device/sync/"
+MAX_QUEUED_LOGS = 20
 OTA_ENABLED = True
 OTA_ENDPOINT = "/api/device/firmware/"
 OTA_CHECK_INTERVAL_MS = 60000  # 1 minutes
+# Stream firmware from the raw endpoint in OTA_CHUNK_SIZE pieces straight to
+# flash instead of receiving it inline in the JSON payload, so peak heap does
+# not grow with firmware size. Interrupted downloads resume with HTTP Range.
+OTA_STREAM_ENABLED = True
+OTA_RAW_ENDPOINT = "/api/device/firmware/raw/"
+OTA_CHUNK_SIZE = 1024
+OTA_DOWNLOAD_ATTEMPTS = 3
+OTA_TEMP_FILE = "main.py.new"
+OTA_TEMP_CHECKSUM_FILE = "main.py.new.sha256"
+# Ask for a line-level patch against the installed build (identified by
+# FIRMWARE_CHECKSUM_FILE) and fall back to the full download if it fails.
+OTA_DELTA_ENABLED = True
 FIRMWARE_VERSION = "1.0.0"
 FIRMWARE_VERSION_FILE = "firmware_version.txt"
 FIRMWARE_CHECKSUM_FILE = "firmware_checksum.txt"
@@ -66,6 +92,27 @@ RESET_DELAY_MS = 2000
 # HTTP request timeout (in seconds). Must remain comfortably below WATCHDOG_TIMEOUT_MS
 # because network requests are blocking and the watchdog is only fed between calls.
 REQUEST_TIMEOUT_SEC = 8
+# Long polling: the backend holds the command request open for up to this many
+# seconds and answers as soon as a door command is queued. The request timeout
+# is LONG_POLL_WAIT_SEC + REQUEST_TIMEOUT_SEC, capped by _long_poll_timeout() so
+# it always stays under WATCHDOG_TIMEOUT_MS. A longer poll_interval_ms from the
+# server stretches the wait (see long_poll_wait_sec()) rather than adding a
+# sleep between polls. Set to 0 to disable long polling.
+LONG_POLL_WAIT_SEC = 20
+# Push channel: keep a WebSocket open so the backend can push door commands and
+# firmware/config notices immediately. While it is down the device polls over
+# HTTP and retries after a backoff growing from WS_RECONNECT_MIN_MS to
+# WS_RECONNECT_MAX_MS. A ping frame every WS_HEARTBEAT_MS (the server may
+# override it) keeps the socket alive; receives wait at most WS_RECV_SLICE_MS so
+# the watchdog keeps being fed.
+WS_ENABLED = True
+WS_ENDPOINT = "/api/device/ws/"
+WS_HEARTBEAT_MS = 15000
+WS_RECV_SLICE_MS = 1000
+WS_RECONNECT_MIN_MS = 2000
+WS_RECONNECT_MAX_MS = 300000
+# Sessions shorter than this count as failed attempts for the backoff.
+WS_STABLE_SESSION_MS = 60000
 # Enable the built-in WebREPL server to inspect logs/files over WiFi without USB.
 WEBREPL_ENABLED = True
 WEBREPL_PASSWORD = "smartdoor"
@@ -108,6 +155,28 @@ last_version_log_ms = 0
 boot_log_sent = False
 webrepl_started = False
 boot_time_ms = time.ticks_ms()
+sync_supported = SYNC_ENABLED
+pending_acks = []
+queued_logs = []
+# Runtime settings; the backend may override these in sync responses.
+poll_interval_ms = POLL_INTERVAL_MS
+ota_check_interval_ms = OTA_CHECK_INTERVAL_MS
+# ETag of the last OTA payload that was fully applied; sent as If-None-Match.
+ota_etag = None
+# Server-requested earliest time (ticks ms) for the next OTA check, used by
+# staged rollouts to spread downloads across the fleet.
+ota_next_check_ms = None
+# Push channel state: earliest reconnect time (ticks ms) and current backoff.
+ws_retry_at_ms = time.ticks_ms()
+ws_backoff_ms = WS_RECONNECT_MIN_MS
+ws_heartbeat_ms = WS_HEARTBEAT_MS
+# Recently executed command ids, so a command pushed again after a lost ack is
+# acknowledged instead of opening the door twice.
+executed_command_ids = []
+# Earliest time (ticks ms) for the next request after a 429/503 answer.
+backoff_until_ms = None
+# Server hint (ms) for the delay before the next poll, from poll_after_ms.
+poll_after_hint_ms = None
 
 
 def _decode_ssid(raw_ssid):
@@ -348,16 +417,20 @@ def _write_text_file(path, value):
         return False
 
 
+def _hexdigest(digest):
+    try:
+        return digest.hexdigest()
+    except AttributeError:
+        return "".join("{:02x}".format(b) for b in digest.digest())
+
+
 def calculate_checksum(content):
     if content is None:
         return ""
     try:
         digest = hashlib.sha256()
         digest.update(content.encode("utf-8"))
-        try:
-            return digest.hexdigest()
-        except AttributeError:
-            return "".join("{:02x}".format(b) for b in digest.digest())
+        return _hexdigest(digest)
     except Exception as exc:
         print("[OTA] Failed to hash content:", exc)
         return ""
@@ -436,20 +509,100 @@ def _build_url(endpoint):
     return "{}/{}".format(SERVER_BASE_URL.rstrip("/"), endpoint.lstrip("/"))
 
 
-def send_get_command():
+def _long_poll_timeout(wait_sec=LONG_POLL_WAIT_SEC):
+    """Return a request timeout for long polls that keeps the watchdog safe."""
+    watchdog_budget = WATCHDOG_TIMEOUT_MS // 1000 - 3
+    return max(
+        REQUEST_TIMEOUT_SEC,
+        min(wait_sec + REQUEST_TIMEOUT_SEC, watchdog_budget),
+    )
+
+
+def long_poll_wait_sec():
+    """Return the wait for the next long poll, stretched to the poll schedule.
+
+    When the server recommends a longer gap (a quiet door), the request is
+    held longer instead of sleeping between polls, so the device keeps
+    listening. The wait leaves a few seconds of the request timeout for the
+    answer to arrive; the server clamps it to its own maximum as well.
+    """
+    if not LONG_POLL_WAIT_SEC:
+        return 0
+    limit = WATCHDOG_TIMEOUT_MS // 1000 - 5
+    return min(max(LONG_POLL_WAIT_SEC, poll_interval_ms // 1000), limit)
+
+
+def _note_backoff(response):
+    """Honor a 429 (rate limited) or 503 (overloaded) answer.
+
+    Pauses requests for ``poll_after_ms`` from the body or ``Retry-After``,
+    whichever is given; returns True if the response asked to back off.
+    """
+    global backoff_until_ms
+    if response.status_code not in (429, 503):
+        return False
+    delay_ms = 0
+    if response.status_code == 503:
+        try:
+            delay_ms = int(response.json().get("poll_after_ms") or 0)
+        except Exception:
+            delay_ms = 0
+    if not delay_ms:
+        try:
+            delay_ms = int(_response_header(response, "Retry-After") or 0) * 1000
+        except ValueError:
+            delay_ms = 0
+    delay_ms = max(delay_ms, poll_interval_ms)
+    backoff_until_ms = time.ticks_add(time.ticks_ms(), delay_ms)
+    print(
+        "[API] Server asked to back off ({}), waiting {} ms".format(
+            response.status_code, delay_ms
+        )
+    )
+    return True
+
+
+def backoff_remaining_ms():
+    global backoff_until_ms
+    if backoff_until_ms is None:
+        return 0
+    remaining = time.ticks_diff(backoff_until_ms, time.ticks_ms())
+    if remaining <= 0:
+        backoff_until_ms = None
+        return 0
+    return remaining
+
+
+def _note_poll_hint(data):
+    """Remember ``poll_after_ms`` from a poll/sync response for the main loop."""
+    global poll_after_hint_ms
+    try:
+        hint = int(data.get("poll_after_ms") or 0)
+    except (AttributeError, TypeError, ValueError):
+        hint = 0
+    poll_after_hint_ms = hint or None
+
+
+def send_get_command(wait_sec=0):
     url = _build_url(COMMAND_ENDPOINT)
+    timeout = REQUEST_TIMEOUT_SEC
+    if wait_sec:
+        url = "{}?wait={}".format(url, wait_sec)
+        timeout = _long_poll_timeout(wait_sec)
     print("[API] Polling:", url)
     response = None
     try:
         feed_watchdog()
-        response = requests.get(
-            url, headers=_headers(), timeout=REQUEST_TIMEOUT_SEC
-        )
+        response = requests.get(url, headers=_headers(), timeout=timeout)
+        if _note_backoff(response):
+            return None
         if response.status_code != 200:
             print("[API] Unexpected status:", response.status_code)
             return None
         data = response.json()
         print("[API] Response:", data)
+        _note_poll_hint(data)
+        apply_runtime_settings(data)
         return data
     except Exception as exc:
         print("[API] GET failed:", exc)
@@ -473,12 +626,16 @@ def send_ack(command_id):
             data=json.dumps(payload),
             timeout=REQUEST_TIMEOUT_SEC,
         )
+        if _note_backoff(response):
+            return False
         if response.status_code != 200:
             print("[API] ACK failed, status:", response.status_code)
         else:
             print("[API] ACK success")
+        return True
     except Exception as exc:
         print("[API] ACK error:", exc)
+        return False
     finally:
         feed_watchdog()
         if response:
@@ -529,16 +686,20 @@ def _build_metadata(extra=None):
     return metadata
 
 
-def send_log(message, level="info", event_type="general", metadata=None):
-    """Send a device log message to the server."""
-    url = _build_url(LOG_ENDPOINT)
-    payload = {
+def _log_record(message, level, event_type, metadata):
+    return {
         "message": message,
         "level": level,
         "event_type": event_type,
         "firmware_version": installed_version,
         "metadata": _build_metadata(metadata),
     }
+
+
+def send_log(message, level="info", event_type="general", metadata=None):
+    """Send a device log message to the server."""
+    url = _build_url(LOG_ENDPOINT)
+    payload = _log_record(message, level, event_type, metadata)
     response = None
     print("[Log] Sending {}: {}".format(level.upper(), message))
     try:
@@ -549,7 +710,7 @@ def send_log(message, level="info", event_type="general", metadata=None):
             data=json.dumps(payload),
             timeout=REQUEST_TIMEOUT_SEC,
         )
-        if response.status_code != 200:
+        if _note_backoff(response) or response.status_code != 200:
             print("[Log] Failed, status:", response.status_code)
             return False
         print("[Log] Sent successfully")
@@ -563,37 +724,212 @@ def send_log(message, level="info", event_type="general", metadata=None):
             response.close()
 
 
+def queue_log(message, level="info", event_type="general", metadata=None):
+    """Queue a log for the next sync request, or send it now without sync."""
+    if not sync_supported:
+        return send_log(message, level, event_type, metadata)
+    print("[Log] Queued {}: {}".format(level.upper(), message))
+    queued_logs.append(_log_record(message, level, event_type, metadata))
+    if len(queued_logs) > MAX_QUEUED_LOGS:
+        del queued_logs[0]
+    return True
+
+
+def apply_runtime_settings(values):
+    global poll_interval_ms
+    global ota_check_interval_ms
+    global ws_heartbeat_ms
+    if not isinstance(values, dict):
+        return
+    try:
+        poll_interval_ms = int(values.get("poll_interval_ms", poll_interval_ms))
+        ota_check_interval_ms = int(
+            values.get("ota_check_interval_ms", ota_check_interval_ms)
+        )
+        ws_heartbeat_ms = int(values.get("heartbeat_ms", ws_heartbeat_ms))
+    except (TypeError, ValueError) as exc:
+        print("[API] Ignoring invalid settings:", exc)
+
+
+def send_logs(records):
+    """Send several log records to the log endpoint in one request."""
+    url = _build_url(LOG_ENDPOINT)
+    response = None
+    print("[Log] Sending batch of {} log(s)".format(len(records)))
+    try:
+        feed_watchdog()
+        response = requests.post(
+            url,
+            headers=_headers(),
+            data=json.dumps(records),
+            timeout=REQUEST_TIMEOUT_SEC,
+        )
+        if _note_backoff(response) or response.status_code != 200:
+            print("[Log] Batch failed, status:", response.status_code)
+            return False
+        return True
+    except Exception as exc:
+        print("[Log] Error sending log batch:", exc)
+        return False
+    finally:
+        feed_watchdog()
+        if response:
+            response.close()
+
+
+def _flush_queue_without_sync():
+    """Deliver queued acks/logs through the separate endpoints."""
+    while pending_acks:
+        # Keep the ack for later if the backend asked us to slow down.
+        if not send_ack(pending_acks[0]) and backoff_until_ms is not None:
+            return
+        del pending_acks[0]
+    if queued_logs and send_logs(queued_logs):
+        del queued_logs[:]
+
+
+def send_sync(wait_sec=0):
+    """Send queued acks and logs and fetch the next command in one request."""
+    global sync_supported
+    url = _build_url(SYNC_ENDPOINT)
+    timeout = REQUEST_TIMEOUT_SEC
+    if wait_sec:
+        url = "{}?wait={}".format(url, wait_sec)
+        timeout = _long_poll_timeout(wait_sec)
+    acks = list(pending_acks)
+    logs = list(queued_logs)
+    print("[API] Sync: {} ack(s), {} log(s)".format(len(acks), len(logs)))
+    response = None
+    try:
+        feed_watchdog()
+        response = requests.post(
+            url,
+            headers=_headers(),
+            data=json.dumps({"acks": acks, "logs": logs}),
+            timeout=timeout,
+        )
+        if response.status_code == 404:
+            print("[API] Sync endpoint unavailable, using separate requests")
+            sync_supported = False
+            return None
+        if _note_backoff(response):
+            return None
+        if response.status_code != 200:
+            print("[API] Sync failed, status:", response.status_code)
+            return None
+        data = response.json()
+        # Only drop what was actually delivered; new items may have been queued.
+        del pending_acks[: len(acks)]
+        # A full server-side log queue defers the logs; resend them next time.
+        if not (data.get("logs") or {}).get("retry_after_ms"):
+            del queued_logs[: len(logs)]
+        apply_runtime_settings(data.get("settings"))
+        _note_poll_hint(data)
+        print("[API] Sync response:", data.get("command"))
+        return data
+    except Exception as exc:
+        print("[API] Sync error:", exc)
+        return None
+    finally:
+        feed_watchdog()
+        if response:
+            response.close()
+
+
+def _response_header(response, name):
+    headers = getattr(response, "headers", None) or {}
+    for key in headers:
+        if key.lower() == name.lower():
+            return headers[key]
+    return None
+
+
 def fetch_ota_payload():
-    """Fetch OTA payload describing the new firmware."""
+    """Fetch OTA payload describing the new firmware.
+
+    Returns ``(payload, etag)``; ``payload`` is ``None`` when nothing changed.
+    """
     url = _build_url(OTA_ENDPOINT)
     print("[OTA] Checking for updates at:", url)
+    headers = _headers()
+    if OTA_STREAM_ENABLED:
+        headers["X-OTA-STREAM"] = "1"
+        installed_checksum = _read_text_file(FIRMWARE_CHECKSUM_FILE)
+        if OTA_DELTA_ENABLED and installed_checksum:
+            headers["X-FIRMWARE-CHECKSUM"] = installed_checksum
+    if ota_etag:
+        headers["If-None-Match"] = ota_etag
     response = None
     try:
         feed_watchdog()
-        response = requests.get(
-            url, headers=_headers(), timeout=REQUEST_TIMEOUT_SEC
-        )
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT_SEC)
+        if response.status_code == 304:
+            print("[OTA] Payload unchanged (304)")
+            return None, ota_etag
+        if _note_backoff(response):
+            # Handled like a staged-rollout deferral.
+            deferral = {"deferred": True, "retry_after_ms": backoff_remaining_ms()}
+            return deferral, None
         if response.status_code != 200:
             print("[OTA] Unexpected status:", response.status_code)
-            return None
+            return None, None
+        etag = _response_header(response, "ETag")
         data = response.json()
-        if not data or not data.get("content"):
+        if data and data.get("deferred"):
+            print("[OTA] Update deferred by staged rollout")
+            return data, None
+        if not data or data.get("unchanged") or not (
+            data.get("content") or data.get("content_url") or data.get("config")
+        ):
             print("[OTA] No update content available")
-            return None
-        return data
+            return None, etag
+        return data, etag
     except Exception as exc:
         print("[OTA] Check failed:", exc)
-        return None
+        return None, None
     finally:
         feed_watchdog()
         if response:
             response.close()
 
 
-def apply_ota_update(content, version, checksum=None):
-    """Write new firmware to disk atomically and reboot."""
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def _install_firmware(temp_path, version, checksum):
+    """Swap a verified ``temp_path`` in as ``main.py`` and reboot."""
     global installed_version
 
+    os.rename(temp_path, "main.py")
+    _remove_file(OTA_TEMP_CHECKSUM_FILE)
+    save_installed_version(version)
+    save_checksum(FIRMWARE_CHECKSUM_FILE, checksum)
+    installed_version = version
+    send_log(
+        "Firmware {} installed via OTA".format(version),
+        event_type="ota",
+        metadata={"version": version, "checksum": checksum},
+    )
+    print("[OTA] Update written, rebooting...")
+    safe_sleep_ms(RESET_DELAY_MS)
+    machine.reset()
+
+
+def _report_apply_failure(version, checksum):
+    send_log(
+        "OTA apply failed for version {}".format(version),
+        level="error",
+        event_type="ota",
+        metadata={"version": version, "checksum": checksum},
+    )
+
+
+def apply_ota_update(content, version, checksum=None):
+    """Write new firmware to disk atomically and reboot."""
     if not checksum_matches(content, checksum):
         send_log(
             "OTA firmware checksum mismatch for version {}".format(version),
@@ -603,36 +939,252 @@ def apply_ota_update(content, version, checksum=None):
         )
         return False
 
-    temp_path = "main.py.new"
-    final_path = "main.py"
     try:
-        with open(temp_path, "w") as fp:
+        with open(OTA_TEMP_FILE, "w") as fp:
             fp.write(content)
-        os.rename(temp_path, final_path)
-        save_installed_version(version)
-        save_checksum(FIRMWARE_CHECKSUM_FILE, checksum)
-        installed_version = version
-        send_log(
-            "Firmware {} installed via OTA".format(version),
-            event_type="ota",
-            metadata={"version": version, "checksum": checksum},
+        _install_firmware(OTA_TEMP_FILE, version, checksum)
+        return True
+    except Exception as exc:
+        print("[OTA] Failed to apply update:", exc)
+        _report_apply_failure(version, checksum)
+        _remove_file(OTA_TEMP_FILE)
+    return False
+
+
+def _file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+def _resume_state(checksum, buf):
+    """Return ``(offset, digest)`` for a partial download of ``checksum``.
+
+    The partial file is re-hashed chunk by chunk so resuming costs flash reads
+    but no extra heap. A partial file of another build is discarded.
+    """
+    digest = hashlib.sha256()
+    if _read_text_file(OTA_TEMP_CHECKSUM_FILE) != checksum:
+        _remove_file(OTA_TEMP_FILE)
+        _write_text_file(OTA_TEMP_CHECKSUM_FILE, checksum)
+        return 0, digest
+    offset = 0
+    try:
+        with open(OTA_TEMP_FILE, "rb") as fp:
+            while True:
+                count = fp.readinto(buf)
+                if not count:
+                    break
+                digest.update(memoryview(buf)[:count])
+                offset += count
+                feed_watchdog()
+    except OSError:
+        return 0, hashlib.sha256()
+    return offset, digest
+
+
+def _download_firmware_chunks(url, checksum, size, buf):
+    """Run one download attempt; return the bytes on disk afterwards."""
+    offset, digest = _resume_state(checksum, buf)
+    if size and offset >= size:
+        return offset, digest
+
+    headers = _headers()
+    mode = "wb"
+    if offset:
+        headers["Range"] = "bytes={}-".format(offset)
+        headers["If-Range"] = '"{}"'.format(checksum)
+    response = None
+    try:
+        feed_watchdog()
+        response = requests.get(
+            url, headers=headers, timeout=REQUEST_TIMEOUT_SEC, stream=True
+        )
+        if response.status_code == 206:
+            mode = "ab"
+        elif response.status_code == 200:
+            # Full body: the server ignored or rejected the resume.
+            offset, digest = 0, hashlib.sha256()
+        else:
+            _note_backoff(response)
+            print("[OTA] Unexpected download status:", response.status_code)
+            return offset, digest
+
+        view = memoryview(buf)
+        stream = response.raw
+        with open(OTA_TEMP_FILE, mode) as fp:
+            while not size or offset < size:
+                want = len(buf) if not size else min(len(buf), size - offset)
+                count = stream.readinto(view[:want])
+                if not count:
+                    break
+                chunk = view[:count]
+                fp.write(chunk)
+                digest.update(chunk)
+                offset += count
+                feed_watchdog()
+        return offset, digest
+    finally:
+        feed_watchdog()
+        if response:
+            response.close()
+
+
+def _read_exact_into(stream, fp, digest, size, buf):
+    view = memoryview(buf)
+    remaining = size
+    while remaining:
+        count = stream.readinto(view[: min(len(buf), remaining)])
+        if not count:
+            raise OSError("patch truncated")
+        chunk = view[:count]
+        fp.write(chunk)
+        digest.update(chunk)
+        remaining -= count
+        feed_watchdog()
+
+
+def _apply_delta_stream(stream, digest, buf):
+    """Rebuild the target into ``OTA_TEMP_FILE`` from ``main.py`` and patch ops.
+
+    ``copy`` ops only move forward through the base file, so both the patch
+    and ``main.py`` are read once, line by line.
+    """
+    written = 0
+    cursor = 0
+    with open("main.py", "rb") as base, open(OTA_TEMP_FILE, "wb") as out:
+        while True:
+            line = stream.readline()
+            if not line:
+                break
+            op = json.loads(line)
+            if op.get("op") == "copy":
+                start = op["start"]
+                if start < cursor:
+                    raise ValueError("copy op moves backwards")
+                while cursor < start:
+                    if not base.readline():
+                        raise ValueError("base shorter than patch")
+                    cursor += 1
+                for _ in range(op["count"]):
+                    base_line = base.readline()
+                    if not base_line:
+                        raise ValueError("base shorter than patch")
+                    out.write(base_line)
+                    digest.update(base_line)
+                    written += len(base_line)
+                    cursor += 1
+            elif op.get("op") == "insert":
+                _read_exact_into(stream, out, digest, op["size"], buf)
+                written += op["size"]
+            else:
+                raise ValueError("unknown patch op")
+            feed_watchdog()
+    return written
+
+
+def apply_delta_update(url, version, checksum):
+    """Patch the running ``main.py`` into the target build and install it.
+
+    Returns ``False`` (without logging an error) whenever the patch cannot be
+    used, so the caller can fall back to :func:`apply_streamed_update`.
+    """
+    buf = bytearray(OTA_CHUNK_SIZE)
+    digest = hashlib.sha256()
+    # The temp file is about to hold patch output, not a resumable download.
+    _remove_file(OTA_TEMP_CHECKSUM_FILE)
+    response = None
+    try:
+        feed_watchdog()
+        response = requests.get(
+            _build_url(url),
+            headers=_headers(),
+            timeout=REQUEST_TIMEOUT_SEC,
+            stream=True,
         )
-        print("[OTA] Update written, rebooting...")
-        safe_sleep_ms(RESET_DELAY_MS)
-        machine.reset()
+        if response.status_code != 200:
+            _note_backoff(response)
+            print("[OTA] Delta unavailable (status {})".format(response.status_code))
+            return False
+        stream = response.raw
+        header = json.loads(stream.readline())
+        if checksum and header.get("target") != checksum:
+            print("[OTA] Delta targets another build, ignoring")
+            return False
+        written = _apply_delta_stream(stream, digest, buf)
+    except Exception as exc:
+        print("[OTA] Delta apply failed:", exc)
+        _remove_file(OTA_TEMP_FILE)
+        return False
+    finally:
+        feed_watchdog()
+        if response:
+            response.close()
+
+    calculated = _hexdigest(digest)
+    if written != header.get("size") or (
+        checksum and calculated.lower() != checksum.lower()
+    ):
+        print("[OTA] Delta result does not match target checksum")
+        _remove_file(OTA_TEMP_FILE)
+        return False
+
+    print("[OTA] Delta applied ({} bytes rebuilt)".format(written))
+    try:
+        _install_firmware(OTA_TEMP_FILE, version, checksum)
         return True
     except Exception as exc:
         print("[OTA] Failed to apply update:", exc)
+        _report_apply_failure(version, checksum)
+    return False
+
+
+def apply_streamed_update(url, version, checksum, size):
+    """Download firmware to ``OTA_TEMP_FILE`` in fixed chunks, verify and install.
+
+    Only one ``OTA_CHUNK_SIZE`` buffer is allocated for the whole download, so
+    peak heap is independent of firmware size. A dropped connection resumes
+    from the bytes already on flash; the partial file survives reboots too.
+    """
+    buf = bytearray(OTA_CHUNK_SIZE)
+    url = _build_url(url or OTA_RAW_ENDPOINT)
+    offset, digest = 0, None
+    for attempt in range(OTA_DOWNLOAD_ATTEMPTS):
+        try:
+            offset, digest = _download_firmware_chunks(url, checksum, size, buf)
+        except Exception as exc:
+            print("[OTA] Download attempt {} interrupted: {}".format(attempt + 1, exc))
+            continue
+        if not size or offset >= size:
+            break
+
+    if not digest or (size and offset != size):
+        print("[OTA] Download incomplete ({} of {} bytes)".format(offset, size))
+        _report_apply_failure(version, checksum)
+        return False
+
+    calculated = _hexdigest(digest)
+    if checksum and calculated.lower() != checksum.lower():
+        print(
+            "[OTA] Checksum mismatch. Expected {}, got {}".format(checksum, calculated)
+        )
         send_log(
-            "OTA apply failed for version {}".format(version),
+            "OTA firmware checksum mismatch for version {}".format(version),
             level="error",
             event_type="ota",
             metadata={"version": version, "checksum": checksum},
         )
-        try:
-            os.remove(temp_path)
-        except Exception:
-            pass
+        _remove_file(OTA_TEMP_FILE)
+        _remove_file(OTA_TEMP_CHECKSUM_FILE)
+        return False
+
+    try:
+        _install_firmware(OTA_TEMP_FILE, version, checksum)
+        return True
+    except Exception as exc:
+        print("[OTA] Failed to apply update:", exc)
+        _report_apply_failure(version, checksum)
     return False
 
 
@@ -679,29 +1231,68 @@ def apply_config_update(content, version, checksum=None):
     return False
 
 
-def maybe_check_ota(last_check_ms):
-    """Poll OTA endpoint periodically for wireless updates."""
+def _hints_need_update(hints):
+    """Compare sync version hints with what is installed on the device."""
+    if not hints:
+        return False
+    version = hints.get("version")
+    if version and version != installed_version:
+        return True
+    config_version = hints.get("config_version")
+    if config_version:
+        return config_version != installed_config_version
+    config_checksum = hints.get("config_checksum")
+    return bool(config_checksum) and config_checksum != _read_text_file(
+        CONFIG_CHECKSUM_FILE, ""
+    )
+
+
+def maybe_check_ota(last_check_ms, hints=None):
+    """Poll OTA endpoint periodically for wireless updates.
+
+    When sync version hints are available the payload is only fetched if they
+    differ from the installed firmware/config.
+    """
     global installed_version
     global installed_config_version
+    global ota_etag
+    global ota_next_check_ms
     if not OTA_ENABLED:
         return last_check_ms
 
+    if hints is not None and not _hints_need_update(hints):
+        return last_check_ms
+
     now = time.ticks_ms()
-    if last_check_ms and time.ticks_diff(now, last_check_ms) < OTA_CHECK_INTERVAL_MS:
+    if ota_next_check_ms is None and hints and hints.get("check_in_ms"):
+        # The backend spreads fetches of a new build with a jittered delay.
+        ota_next_check_ms = time.ticks_add(now, int(hints["check_in_ms"]))
+    if ota_next_check_ms is not None:
+        if time.ticks_diff(ota_next_check_ms, now) > 0:
+            return last_check_ms
+        ota_next_check_ms = None
+    elif last_check_ms and time.ticks_diff(now, last_check_ms) < ota_check_interval_ms:
         return last_check_ms
 
-    payload = fetch_ota_payload()
+    payload, etag = fetch_ota_payload()
+    if payload and payload.get("deferred"):
+        retry_after_ms = int(payload.get("retry_after_ms") or ota_check_interval_ms)
+        ota_next_check_ms = time.ticks_add(now, retry_after_ms)
+        return now
     if not payload:
+        if etag:
+            ota_etag = etag
         return now
 
     firmware_content = payload.get("content")
+    firmware_url = payload.get("content_url")
     firmware_version = payload.get("version", "unknown")
     firmware_checksum = payload.get("checksum")
     config_content = payload.get("config")
     config_version = payload.get("config_version") or ""
     config_checksum = payload.get("config_checksum")
 
-    if firmware_content:
+    if firmware_content or firmware_url:
         if firmware_version == installed_version:
             print("[OTA] Already running version {}, skipping".format(firmware_version))
         else:
@@ -711,7 +1302,25 @@ def maybe_check_ota(last_check_ms):
                 event_type="ota",
                 metadata={"version": firmware_version},
             )
-            apply_ota_update(firmware_content, firmware_version, firmware_checksum)
+            if firmware_content:
+                applied = apply_ota_update(
+                    firmware_content, firmware_version, firmware_checksum
+                )
+            else:
+                delta_url = payload.get("delta_url")
+                applied = bool(delta_url) and apply_delta_update(
+                    delta_url, firmware_version, firmware_checksum
+                )
+                if not applied:
+                    applied = apply_streamed_update(
+                        firmware_url,
+                        firmware_version,
+                        firmware_checksum,
+                        payload.get("content_size") or 0,
+                    )
+            if not applied:
+                # Retry with a full response next time instead of a 304.
+                return now
 
     if config_content:
         if config_version and config_version == installed_config_version:
@@ -722,8 +1331,11 @@ def maybe_check_ota(last_check_ms):
             )
         else:
             print("[OTA] Applying configuration version {}".format(config_version))
-            apply_config_update(config_content, config_version, config_checksum)
+            if not apply_config_update(config_content, config_version, config_checksum):
+                # Retry with a full response next time instead of a 304.
+                return now
 
+    ota_etag = etag
     return now
 
 
@@ -739,6 +1351,254 @@ def trigger_relay(duration_ms):
     print("[Relay] Deactivated")
 
 
+def handle_command(command, ack):
+    """Run an ``open`` command and acknowledge it with ``ack(command_id)``."""
+    if not command or not command.get("open"):
+        print("[Command] No action")
+        return False
+    duration = int(command.get("pulse_ms", RELAY_DEFAULT_PULSE_MS))
+    cmd_id = command.get("command_id")
+    if cmd_id is not None and cmd_id in executed_command_ids:
+        print("[Command] Already executed {}, acknowledging again".format(cmd_id))
+        ack(cmd_id)
+        return True
+    print("[Command] Open requested: {} ms, id={}".format(duration, cmd_id))
+    trigger_relay(duration)
+    queue_log(
+        "Relay triggered for {} ms (command {})".format(
+            duration, cmd_id if cmd_id is not None else "unknown"
+        ),
+        event_type="command",
+        metadata={"duration_ms": duration, "command_id": cmd_id},
+    )
+    if cmd_id is not None:
+        executed_command_ids.append(cmd_id)
+        if len(executed_command_ids) > 8:
+            del executed_command_ids[0]
+        ack(cmd_id)
+    return True
+
+
+def _queue_ack(cmd_id):
+    if sync_supported:
+        pending_acks.append(cmd_id)
+    else:
+        send_ack(cmd_id)
+
+
+def run_periodic_tasks(hints=None):
+    """OTA checks and the version heartbeat log, shared by both transports."""
+    global last_ota_check_ms
+    global last_version_log_ms
+    last_ota_check_ms = maybe_check_ota(last_ota_check_ms, hints)
+    now_ms = time.ticks_ms()
+    if (
+        not last_version_log_ms
+        or time.ticks_diff(now_ms, last_version_log_ms) >= VERSION_LOG_INTERVAL_MS
+    ):
+        queue_log(
+            "Running firmware {} (config {})".format(
+                installed_version, installed_config_version
+            ),
+            event_type="heartbeat",
+        )
+        last_version_log_ms = now_ms
+
+
+# ========================
+# Push channel (WebSocket)
+# ========================
+
+def _ws_address():
+    url = SERVER_BASE_URL.rstrip("/")
+    secure = url.startswith("https://")
+    host = url.split("://", 1)[-1].split("/", 1)[0]
+    port = 443 if secure else 80
+    if ":" in host:
+        host, port = host.rsplit(":", 1)
+        port = int(port)
+    return host, port, secure
+
+
+def ws_connect():
+    """Open the push channel socket and complete the WebSocket handshake."""
+    host, port, secure = _ws_address()
+    feed_watchdog()
+    address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+    sock = socket.socket()
+    try:
+        sock.settimeout(REQUEST_TIMEOUT_SEC)
+        sock.connect(address)
+        if secure:
+            sock = ssl.wrap_socket(sock, server_hostname=host)
+        key = binascii.b2a_base64(os.urandom(16)).strip().decode()
+        lines = [
+            "GET {} HTTP/1.1".format(WS_ENDPOINT),
+            "Host: {}".format(host),
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            "Sec-WebSocket-Key: {}".format(key),
+            "Sec-WebSocket-Version: 13",
+        ]
+        for name, value in _headers().items():
+            lines.append("{}: {}".format(name, value))
+        sock.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        status = sock.readline()
+        if b" 101 " not in status:
+            raise OSError("handshake refused: {}".format(status))
+        while sock.readline() not in (b"\r\n", b""):
+            feed_watchdog()
+        return sock
+    except Exception:
+        sock.close()
+        raise
+    finally:
+        feed_watchdog()
+
+
+def _ws_send_frame(sock, opcode, payload):
+    # Client frames must be masked (RFC 6455 section 5.3).
+    length = len(payload)
+    header = bytearray([0x80 | opcode])
+    if length < 126:
+        header.append(0x80 | length)
+    elif length < 65536:
+        header.append(0x80 | 126)
+        header.extend(length.to_bytes(2, "big"))
+    else:
+        header.append(0x80 | 127)
+        header.extend(length.to_bytes(8, "big"))
+    mask = os.urandom(4)
+    masked = bytearray(payload)
+    for index in range(length):
+        masked[index] ^= mask[index & 3]
+    sock.write(header + mask)
+    sock.write(masked)
+
+
+def ws_send_json(sock, payload):
+    _ws_send_frame(sock, 0x1, json.dumps(payload).encode())
+
+
+def _ws_read_exact(sock, count):
+    data = b""
+    while len(data) < count:
+        chunk = sock.read(count - len(data))
+        if not chunk:
+            raise OSError("socket closed")
+        data += chunk
+    return data
+
+
+def ws_receive(sock, poller, timeout_ms):
+    """Return the next JSON frame, or ``None`` if none arrived within ``timeout_ms``.
+
+    Raises ``OSError`` when the server closes the socket.
+    """
+    if not poller.poll(timeout_ms):
+        return None
+    head = _ws_read_exact(sock, 2)
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(_ws_read_exact(sock, 2), "big")
+    elif length == 127:
+        length = int.from_bytes(_ws_read_exact(sock, 8), "big")
+    mask = _ws_read_exact(sock, 4) if head[1] & 0x80 else None
+    payload = _ws_read_exact(sock, length) if length else b""
+    if mask:
+        payload = bytearray(payload)
+        for index in range(length):
+            payload[index] ^= mask[index & 3]
+    if opcode == 0x8:
+        raise OSError("closed by server")
+    if opcode == 0x9:
+        _ws_send_frame(sock, 0xA, payload)
+        return None
+    if opcode != 0x1:
+        return None
+    try:
+        return json.loads(payload)
+    except ValueError:
+        print("[WS] Ignoring invalid frame")
+        return None
+
+
+def run_push_channel():
+    """Serve the WebSocket push channel until it disconnects.
+
+    Returns ``True`` if the handshake succeeded.
+    """
+    try:
+        sock = ws_connect()
+    except Exception as exc:
+        print("[WS] Connect failed:", exc)
+        return False
+    print("[WS] Connected")
+    poller = select.poll()
+    poller.register(sock, select.POLLIN)
+    hints = None
+    last_ping_ms = time.ticks_ms()
+
+    def ack(cmd_id):
+        try:
+            ws_send_json(sock, {"type": "ack", "command_id": cmd_id})
+        except Exception:
+            # Deliver it over HTTP once the socket is gone.
+            pending_acks.append(cmd_id)
+            raise
+
+    try:
+        while wlan.isconnected():
+            feed_watchdog()
+            frame = ws_receive(sock, poller, WS_RECV_SLICE_MS)
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "hello":
+                apply_runtime_settings(frame.get("settings"))
+                hints = frame.get("firmware")
+            elif kind == "command":
+                handle_command(frame.get("command"), ack)
+            elif kind == "firmware":
+                hints = frame.get("firmware")
+            elif kind == "error":
+                print("[WS] Server error:", frame.get("error"))
+
+            now_ms = time.ticks_ms()
+            if time.ticks_diff(now_ms, last_ping_ms) >= ws_heartbeat_ms:
+                ws_send_json(sock, {"type": "ping"})
+                last_ping_ms = now_ms
+            if pending_acks:
+                ws_send_json(sock, {"type": "ack", "command_id": pending_acks[0]})
+                del pending_acks[0]
+            if queued_logs:
+                ws_send_json(sock, {"type": "logs", "logs": queued_logs})
+                del queued_logs[:]
+            run_periodic_tasks(hints)
+    except Exception as exc:
+        print("[WS] Disconnected:", exc)
+    finally:
+        try:
+            sock.close()
+        except Exception:
+            pass
+        feed_watchdog()
+    return True
+
+
+def schedule_ws_reconnect(stable):
+    """Back off exponentially (with jitter) before the next connect attempt."""
+    global ws_backoff_ms
+    global ws_retry_at_ms
+    if stable:
+        ws_backoff_ms = WS_RECONNECT_MIN_MS
+    delay = ws_backoff_ms + int.from_bytes(os.urandom(2), "big") % (
+        ws_backoff_ms // 2 + 1
+    )
+    ws_retry_at_ms = time.ticks_add(time.ticks_ms(), delay)
+    ws_backoff_ms = min(ws_backoff_ms * 2, WS_RECONNECT_MAX_MS)
+    print("[WS] Polling over HTTP, reconnecting in {} ms".format(delay))
+
+
 # ========================
 # Main loop
 # ========================
@@ -747,8 +1607,8 @@ def main():
     global last_ota_check_ms
     global installed_version
     global installed_config_version
-    global last_version_log_ms
     global boot_log_sent
+    global poll_after_hint_ms
 
     init_watchdog()
     setup_wifi()
@@ -765,13 +1625,18 @@ def main():
 
         if not ensure_wifi():
             print("[WiFi] Not connected, retrying after delay...")
-            safe_sleep_ms(POLL_INTERVAL_MS)
+            safe_sleep_ms(poll_interval_ms)
             continue
 
         maybe_start_webrepl()
 
+        backoff_ms = backoff_remaining_ms()
+        if backoff_ms:
+            safe_sleep_ms(backoff_ms)
+            continue
+
         if not boot_log_sent:
-            if send_log(
+            if queue_log(
                 "Firmware {} (config {}) started with IP {}".format(
                     installed_version, installed_config_version, wlan.ifconfig()[0]
                 ),
@@ -780,39 +1645,45 @@ def main():
             ):
                 boot_log_sent = True
 
-        command = send_get_command()
-        if command and command.get("open"):
-            duration = int(command.get("pulse_ms", RELAY_DEFAULT_PULSE_MS))
-            cmd_id = command.get("command_id")
-            print("[Command] Open requested: {} ms, id={}".format(duration, cmd_id))
-            trigger_relay(duration)
-            send_log(
-                "Relay triggered for {} ms (command {})".format(
-                    duration, cmd_id if cmd_id is not None else "unknown"
-                ),
-                event_type="command",
-                metadata={"duration_ms": duration, "command_id": cmd_id},
-            )
-            if cmd_id is not None:
-                send_ack(cmd_id)
-        else:
-            print("[Command] No action")
+        if WS_ENABLED and time.ticks_diff(time.ticks_ms(), ws_retry_at_ms) >= 0:
+            session_started_ms = time.ticks_ms()
+            connected = run_push_channel()
+            session_ms = time.ticks_diff(time.ticks_ms(), session_started_ms)
+            schedule_ws_reconnect(connected and session_ms >= WS_STABLE_SESSION_MS)
+            continue
 
-        last_ota_check_ms = maybe_check_ota(last_ota_check_ms)
-        now_ms = time.ticks_ms()
-        if (
-            not last_version_log_ms
-            or time.ticks_diff(now_ms, last_version_log_ms) >= VERSION_LOG_INTERVAL_MS
-        ):
-            send_log(
-                "Running firmware {} (config {})".format(
-                    installed_version, installed_config_version
-                ),
-                event_type="heartbeat",
-            )
-            last_version_log_ms = now_ms
+        # HTTP polling fallback while the push channel is down.
+        poll_started_ms = time.ticks_ms()
+        wait_sec = long_poll_wait_sec()
+        hints = None
+        if sync_supported:
+            data = send_sync(wait_sec)
+            command = data.get("command") if data else None
+            if data:
+                hints = data.get("firmware")
+            if not sync_supported:
+                _flush_queue_without_sync()
+        else:
+            _flush_queue_without_sync()
+            command = send_get_command(wait_sec)
+        handle_command(command, _queue_ack)
+        run_periodic_tasks(hints)
         feed_watchdog()
-        safe_sleep_ms(POLL_INTERVAL_MS)
+        # Deliver a fresh ack right away with the next (long-polling) sync.
+        if command and command.get("open") and pending_acks:
+            continue
+        held_ms = time.ticks_diff(time.ticks_ms(), poll_started_ms)
+        if poll_after_hint_ms:
+            # The server is under load and asked for a longer gap.
+            safe_sleep_ms(poll_after_hint_ms - held_ms)
+            poll_after_hint_ms = None
+        # A long poll that was held by the server already spaced out requests
+        # (a quiet door's schedule stretches the wait itself, see
+        # long_poll_wait_sec()); only sleep in short-poll mode or when the
+        # server answered early (command, error, or a backend without
+        # long-poll support).
+        elif not wait_sec or held_ms < wait_sec * 500:
+            safe_sleep_ms(poll_interval_ms)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class LogWriteQueue:
+    """Write-behind queue for ``DeviceLog`` rows.
+
+    With ``DEVICE_LOG_QUEUE_ENABLED`` the ingest endpoints validate records in
+    the request and hand the unsaved rows to :meth:`offer` instead of
+    inserting them. A background thread writes them with ``bulk_create`` in
+    batches of up to ``DEVICE_LOG_QUEUE_BATCH_SIZE``, as soon as a batch is
+    full or the oldest queued row has waited ``DEVICE_LOG_QUEUE_FLUSH_INTERVAL``
+    seconds, so log traffic turns into a few large inserts instead of one per
+    request. At most ``DEVICE_LOG_QUEUE_MAX_SIZE`` rows wait at a time; a
+    request that does not fit is refused whole and the device retries later.
+    A batch that fails with a transient database error (``OperationalError``,
+    e.g. a locked database) goes back to the front of the queue and is retried
+    after a doubling ``DEVICE_LOG_QUEUE_RETRY_BACKOFF``; it is dropped after
+    ``DEVICE_LOG_QUEUE_MAX_RETRIES`` failures in a row, on any other error, or
+    when the queue has filled up meanwhile. :meth:`shutdown` (registered with
+    ``atexit``) drains what is left.
+    """
+
+    def __init__(self, autostart=True):
+        self.autostart = autostart
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._write_lock = threading.RLock()
+        self._queue = deque()
+        self._oldest = None
+        self._writer = None
+        self._stopping = False
+        self._counters = dict.fromkeys(
+            ("enqueued", "written", "rejected", "retried", "failed", "batches"), 0
+        )
+        self._failures = 0
+        self._last_batch = 0
+        self._max_batch = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.DEVICE_LOG_QUEUE_ENABLED
+
+    def offer(self, logs) -> bool:
+        """Queue ``logs`` for writing; return False if they do not all fit."""
+
+        if not logs:
+            return True
+        with self._lock:
+            if len(self._queue) + len(logs) > settings.DEVICE_LOG_QUEUE_MAX_SIZE:
+                self._counters["rejected"] += len(logs)
+                return False
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.extend(logs)
+            self._counters["enqueued"] += len(logs)
+            if len(self._queue) >= settings.DEVICE_LOG_QUEUE_BATCH_SIZE:
+                self._ready.notify()
+        if self.autostart:
+            self._ensure_writer()
+        return True
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._stopping or (self._writer and self._writer.is_alive()):
+                return
+            self._writer = threading.Thread(
+                target=self._run, name="device-log-writer", daemon=True
+            )
+            self._writer.start()
+
+    def _take_batch(self):
+        # Callers hold ``self._lock``.
+        size = settings.DEVICE_LOG_QUEUE_BATCH_SIZE
+        batch = [self._queue.popleft() for _ in range(min(size, len(self._queue)))]
+        self._oldest = time.monotonic() if self._queue else None
+        return batch
+
+    def _wait_for_batch(self):
+        with self._lock:
+            while not self._stopping:
+                if len(self._queue) >= settings.DEVICE_LOG_QUEUE_BATCH_SIZE:
+                    break
+                if self._queue:
+                    waited = time.monotonic() - self._oldest
+                    remaining = settings.DEVICE_LOG_QUEUE_FLUSH_INTERVAL - waited
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+                else:
+                    self._ready.wait()
+            return self._take_batch()
+
+    def _run(self):
+        while True:
+            batch = self._wait_for_batch()
+            if batch:
+                if not self._write(batch):
+                    self._back_off()
+            elif self._stopping:
+                return
+
+    def _back_off(self):
+        with self._lock:
+            delay = settings.DEVICE_LOG_QUEUE_RETRY_BACKOFF * 2 ** (self._failures - 1)
+            self._ready.wait_for(lambda: self._stopping, delay)
+
+    def _write(self, batch) -> bool:
+        """Insert ``batch``; return False if it was requeued for a retry."""
+
+        from .rollups import insert_logs
+
+        with self._write_lock:
+            try:
+                close_old_connections()
+                insert_logs(batch)
+            except Exception as exc:
+                return self._failed(batch, exc)
+            with self._lock:
+                self._failures = 0
+                self._counters["written"] += len(batch)
+                self._counters["batches"] += 1
+                self._last_batch = len(batch)
+                self._max_batch = max(self._max_batch, len(batch))
+            return True
+
+    def _failed(self, batch, exc) -> bool:
+        with self._lock:
+            self._failures += 1
+            if (
+                isinstance(exc, OperationalError)
+                and self._failures <= settings.DEVICE_LOG_QUEUE_MAX_RETRIES
+                and len(self._queue) + len(batch) <= settings.DEVICE_LOG_QUEUE_MAX_SIZE
+            ):
+                self._queue.extendleft(reversed(batch))
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                self._counters["retried"] += len(batch)
+                requeued = True
+            else:
+                self._failures = 0
+                self._counters["failed"] += len(batch)
+                requeued = False
+        if requeued:
+            logger.warning(
+                "Could not write %d queued device logs, retrying: %s", len(batch), exc
+            )
+            return False
+        logger.error("Could not write %d queued device logs", len(batch), exc_info=exc)
+        return True
+
+    def flush(self) -> int:
+        """Write everything queued from the calling thread; return the count.
+
+        Stops early, leaving the rest queued, when a batch has to be retried.
+        """
+
+        written = 0
+        # Holding the write lock also waits out a batch the writer has taken.
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    batch = self._take_batch()
+                if not batch or not self._write(batch):
+                    return written
+                written += len(batch)
+
+    def shutdown(self, timeout=5.0) -> int:
+        """Stop the writer and drain the queue; returns rows written here."""
+
+        with self._lock:
+            self._stopping = True
+            self._ready.notify_all()
+            writer = self._writer
+        if writer is not None:
+            writer.join(timeout)
+        return self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            batches = stats["batches"]
+            stats.update(
+                depth=len(self._queue),
+                max_size=settings.DEVICE_LOG_QUEUE_MAX_SIZE,
+                oldest_age=(
+                    round(time.monotonic() - self._oldest, 3) if self._queue else 0.0
+                ),
+                last_batch=self._last_batch,
+                max_batch=self._max_batch,
+                avg_batch=round(stats["written"] / batches, 1) if batches else 0.0,
+                writer_alive=bool(self._writer and self._writer.is_alive()),
+            )
+            return stats
+
+
+log_write_queue = LogWriteQueue()
+
+
+@atexit.register
+def _drain_on_shutdown():
+    try:
+        log_write_queue.shutdown()
+    except Exception:
+        logger.exception("Could not drain queued device logs on shutdown")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from devices.models import FirmwareRollout
+from devices.rollouts import advance_rollout
+
+
+class Command(BaseCommand):
+    help = (
+        "Admit devices to active firmware rollouts and pause rollouts whose "
+        "upgraded devices stopped sending heartbeats."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and advance every N seconds instead of once.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            rollouts = FirmwareRollout.objects.filter(
+                status=FirmwareRollout.Status.ACTIVE
+            ).select_related("release")
+            for rollout in rollouts:
+                admitted = advance_rollout(rollout)
+                if admitted or rollout.status != FirmwareRollout.Status.ACTIVE:
+                    self.stdout.write(
+                        f"{rollout}: admitted {admitted} device(s)"
+                        + (
+                            f" ({rollout.status_reason})"
+                            if rollout.status_reason
+                            else ""
+                        )
+                    )
+                elif options["verbosity"] > 1:
+                    self.stdout.write(f"{rollout}: nothing to do.")
+            if interval <= 0:
+                break
+            time.sleep(interval)
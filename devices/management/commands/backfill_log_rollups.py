@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.models import DeviceLog
+from devices.rollups import rebuild_rollups, rollup_mismatches
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the hourly DeviceLogRollup counts from the raw DeviceLog table, "
+        "or with --check compare the two without writing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report buckets whose rollup count differs from the raw logs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            mismatches = rollup_mismatches()
+            for (device_id, hour, level, event_type), raw, rolled in mismatches:
+                self.stdout.write(
+                    f"device {device_id} {hour.isoformat()} "
+                    f"{level or '-'}/{event_type or '-'}: "
+                    f"raw {raw}, rollup {rolled}"
+                )
+            if mismatches:
+                raise CommandError(
+                    f"{len(mismatches)} rollup bucket(s) out of sync; "
+                    "run backfill_log_rollups to rebuild them."
+                )
+            self.stdout.write("Log rollups match the raw table.")
+            return
+
+        buckets = rebuild_rollups()
+        self.stdout.write(
+            f"Rebuilt {buckets} rollup bucket(s) from "
+            f"{DeviceLog.objects.count()} log(s)."
+        )
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from access.models import AccessLog
+from devices.export import (
+    ACCESS_LOG_COLUMNS,
+    DEVICE_LOG_COLUMNS,
+    FORMATS,
+    access_log_row,
+    device_log_row,
+    export_chunks,
+)
+from devices.models import DeviceLog
+from devices.pagination import parse_time_filter
+
+
+class Command(BaseCommand):
+    help = (
+        "Dump access or device logs as CSV or NDJSON, streaming rows so memory "
+        "stays flat for any number of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=("access", "device"))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument(
+            "--gzip", action="store_true", help="Compress the output (needs --output)."
+        )
+        parser.add_argument("--since", help="ISO date or datetime (inclusive).")
+        parser.add_argument(
+            "--until", help="ISO date or datetime (a date includes that day)."
+        )
+        parser.add_argument(
+            "--building", type=int, help="Only logs of this building id."
+        )
+        parser.add_argument(
+            "--output", default="-", help="File to write, '-' for stdout."
+        )
+
+    def handle(self, *args, **options):
+        if options["gzip"] and options["output"] == "-":
+            raise CommandError("--gzip needs --output.")
+        since = parse_time_filter(options["since"])
+        until = parse_time_filter(options["until"], end=True)
+        if (options["since"] and since is None) or (options["until"] and until is None):
+            raise CommandError("--since/--until must be ISO dates or datetimes.")
+
+        if options["kind"] == "access":
+            queryset = AccessLog.objects.select_related("user")
+            field, building = "timestamp", "household__building"
+            serialize, columns = access_log_row, ACCESS_LOG_COLUMNS
+        else:
+            queryset = DeviceLog.objects.all()
+            field, building = "created_at", "device__building"
+            serialize, columns = device_log_row, DEVICE_LOG_COLUMNS
+        if options["building"] is not None:
+            queryset = queryset.filter(**{building: options["building"]})
+        if since:
+            queryset = queryset.filter(**{f"{field}__gte": since})
+        if until:
+            queryset = queryset.filter(**{f"{field}__lt": until})
+
+        chunks = export_chunks(
+            queryset.order_by(field, "id"),
+            serialize,
+            columns,
+            options["format"],
+            options["gzip"],
+        )
+        if options["output"] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
+            return
+        written = 0
+        with open(options["output"], "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        self.stdout.write(f"Wrote {written} byte(s) to {options['output']}.")
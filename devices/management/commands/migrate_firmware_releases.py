@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from devices.models import DeviceFirmware, FirmwareRelease
+
+
+class Command(BaseCommand):
+    help = (
+        "Move per-device firmware/config text into the deduplicated "
+        "FirmwareRelease store and point each DeviceFirmware at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rows still hold inline text.",
+        )
+
+    def handle(self, *args, **options):
+        pending = DeviceFirmware.objects.filter(~Q(content="") | ~Q(config=""))
+        if options["dry_run"]:
+            self.stdout.write(f"{pending.count()} device firmware row(s) to migrate.")
+            return
+
+        migrated = 0
+        for firmware in pending.iterator():
+            with transaction.atomic():
+                # save() moves the text into the store and blanks the columns.
+                firmware.save()
+            migrated += 1
+        self.stdout.write(
+            f"Migrated {migrated} device firmware row(s); "
+            f"{FirmwareRelease.objects.count()} release(s) stored."
+        )
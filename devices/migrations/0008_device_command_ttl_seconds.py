@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-16 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0007_alter_device_api_token_alter_device_building_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="device",
+            name="command_ttl_seconds",
+            field=models.PositiveIntegerField(
+                default=15, verbose_name="مدت اعتبار فرمان (ثانیه)"
+            ),
+        ),
+    ]
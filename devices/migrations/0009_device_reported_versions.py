@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-16 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0008_device_command_ttl_seconds"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="device",
+            name="config_version",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=50,
+                verbose_name="نسخه پیکربندی گزارش\u200cشده",
+            ),
+        ),
+        migrations.AddField(
+            model_name="device",
+            name="firmware_version",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=50,
+                verbose_name="نسخه میان\u200cافزار گزارش\u200cشده",
+            ),
+        ),
+        migrations.AddField(
+            model_name="device",
+            name="versions_reported_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="زمان گزارش نسخه"
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.7 on 2026-10-16 21:06
+
+from django.db import migrations, models
+
+
+def archive_current_firmware(apps, schema_editor):
+    DeviceFirmware = apps.get_model("devices", "DeviceFirmware")
+    FirmwareRelease = apps.get_model("devices", "FirmwareRelease")
+    for firmware in DeviceFirmware.objects.exclude(checksum="").iterator():
+        FirmwareRelease.objects.get_or_create(
+            checksum=firmware.checksum,
+            defaults={"version": firmware.version, "content": firmware.content},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0009_device_reported_versions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FirmwareRelease",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "checksum",
+                    models.CharField(
+                        max_length=64, unique=True, verbose_name="چک\u200cسام"
+                    ),
+                ),
+                ("version", models.CharField(max_length=50, verbose_name="نسخه")),
+                ("content", models.TextField(verbose_name="محتوا")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="زمان ایجاد"),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.RunPython(archive_current_firmware, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.7 on 2026-10-16 21:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_release_sizes(apps, schema_editor):
+    FirmwareRelease = apps.get_model("devices", "FirmwareRelease")
+    for release in FirmwareRelease.objects.filter(size=0).iterator():
+        release.size = len(release.content.encode("utf-8"))
+        release.save(update_fields=["size"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0010_firmwarerelease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="devicefirmware",
+            name="config_release",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="devices.firmwarerelease",
+                verbose_name="فایل پیکربندی",
+            ),
+        ),
+        migrations.AddField(
+            model_name="devicefirmware",
+            name="release",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="devices.firmwarerelease",
+                verbose_name="فایل میان\u200cافزار",
+            ),
+        ),
+        migrations.AddField(
+            model_name="firmwarerelease",
+            name="size",
+            field=models.PositiveIntegerField(default=0, verbose_name="حجم (بایت)"),
+        ),
+        migrations.AlterField(
+            model_name="devicefirmware",
+            name="content",
+            field=models.TextField(blank=True, verbose_name="محتوا"),
+        ),
+        migrations.RunPython(fill_release_sizes, migrations.RunPython.noop),
+    ]
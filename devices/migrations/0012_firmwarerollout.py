@@ -0,0 +1,118 @@
+# Generated by Django 5.0.7 on 2026-10-16 21:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0011_firmware_release_pointers"),
+        ("households", "0003_alter_building_address_alter_building_title_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FirmwareRollout",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "percentage",
+                    models.PositiveSmallIntegerField(
+                        default=10,
+                        validators=[django.core.validators.MaxValueValidator(100)],
+                        verbose_name="درصد دستگاه\u200cها",
+                    ),
+                ),
+                (
+                    "max_concurrent_downloads",
+                    models.PositiveIntegerField(
+                        default=10, verbose_name="حداکثر دانلود همزمان"
+                    ),
+                ),
+                (
+                    "heartbeat_timeout_seconds",
+                    models.PositiveIntegerField(
+                        default=600, verbose_name="مهلت ضربان (ثانیه)"
+                    ),
+                ),
+                (
+                    "max_silent_devices",
+                    models.PositiveIntegerField(
+                        default=1, verbose_name="حداکثر دستگاه بی\u200cپاسخ"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("paused", "Paused"),
+                            ("completed", "Completed"),
+                        ],
+                        default="active",
+                        max_length=20,
+                        verbose_name="وضعیت",
+                    ),
+                ),
+                (
+                    "status_reason",
+                    models.CharField(
+                        blank=True, default="", max_length=255, verbose_name="علت وضعیت"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="زمان ایجاد"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="زمان به\u200cروزرسانی"
+                    ),
+                ),
+                (
+                    "buildings",
+                    models.ManyToManyField(
+                        blank=True,
+                        related_name="firmware_rollouts",
+                        to="households.building",
+                        verbose_name="ساختمان\u200cها",
+                    ),
+                ),
+                (
+                    "release",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="rollouts",
+                        to="devices.firmwarerelease",
+                        verbose_name="نسخه میان\u200cافزار",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="devicefirmware",
+            name="rollout",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="device_firmware",
+                to="devices.firmwarerollout",
+                verbose_name="انتشار مرحله\u200cای",
+            ),
+        ),
+    ]
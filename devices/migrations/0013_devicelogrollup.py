@@ -0,0 +1,59 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0012_firmwarerollout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeviceLogRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.DateTimeField(verbose_name="ساعت")),
+                (
+                    "level",
+                    models.CharField(blank=True, max_length=20, verbose_name="سطح"),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        blank=True, default="", max_length=50, verbose_name="نوع رویداد"
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="تعداد")),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="log_rollups",
+                        to="devices.device",
+                        verbose_name="دستگاه",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-hour"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="devicelogrollup",
+            constraint=models.UniqueConstraint(
+                fields=("device", "hour", "level", "event_type"),
+                name="devicelogrollup_unique_bucket",
+            ),
+        ),
+    ]
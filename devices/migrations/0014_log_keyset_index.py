@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0013_devicelogrollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="devicelog",
+            index=models.Index(
+                fields=["device", "-created_at", "-id"],
+                name="devices_log_device_time_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# Text indexed for a log: its message plus every scalar value in metadata.
+FLATTENED = (
+    "(SELECT group_concat(value, ' ') FROM json_tree({row}.metadata) "
+    "WHERE type NOT IN ('object', 'array'))"
+)
+
+CREATE = [
+    "CREATE VIRTUAL TABLE devices_devicelog_fts USING fts5("
+    "message, metadata, tokenize = 'unicode61 remove_diacritics 2', "
+    "prefix = '2 3')",
+    "CREATE TRIGGER devices_devicelog_fts_insert AFTER INSERT ON devices_devicelog "
+    "BEGIN INSERT INTO devices_devicelog_fts (rowid, message, metadata) "
+    f"VALUES (new.id, new.message, {FLATTENED.format(row='new')}); END",
+    "CREATE TRIGGER devices_devicelog_fts_delete AFTER DELETE ON devices_devicelog "
+    "BEGIN DELETE FROM devices_devicelog_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER devices_devicelog_fts_update "
+    "AFTER UPDATE OF message, metadata ON devices_devicelog "
+    "BEGIN DELETE FROM devices_devicelog_fts WHERE rowid = old.id; "
+    "INSERT INTO devices_devicelog_fts (rowid, message, metadata) "
+    f"VALUES (new.id, new.message, {FLATTENED.format(row='new')}); END",
+    "INSERT INTO devices_devicelog_fts (rowid, message, metadata) "
+    f"SELECT id, message, {FLATTENED.format(row='devices_devicelog')} "
+    "FROM devices_devicelog",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS devices_devicelog_fts_update",
+    "DROP TRIGGER IF EXISTS devices_devicelog_fts_delete",
+    "DROP TRIGGER IF EXISTS devices_devicelog_fts_insert",
+    "DROP TABLE IF EXISTS devices_devicelog_fts",
+]
+
+
+def _run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is SQLite only; other databases fall back to LIKE search.
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0014_log_keyset_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE), _run(DROP)),
+    ]
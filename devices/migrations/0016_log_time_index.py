@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("devices", "0015_devicelog_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="devicelog",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="devices_log_time_idx"
+            ),
+        ),
+    ]
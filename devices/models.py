@@ -1,7 +1,8 @@
 import hashlib
 import secrets
 
-from django.db import models
+from django.core.validators import MaxValueValidator
+from django.db import models, transaction
 from django.utils import timezone
 
 from households.models import Building
@@ -26,17 +27,152 @@ class Device(models.Model):
         verbose_name="توکن API",
     )
     last_seen = models.DateTimeField(null=True, blank=True, verbose_name="آخرین مشاهده")
+    command_ttl_seconds = models.PositiveIntegerField(
+        default=15, verbose_name="مدت اعتبار فرمان (ثانیه)"
+    )
+    firmware_version = models.CharField(
+        max_length=50, blank=True, default="", verbose_name="نسخه میان‌افزار گزارش‌شده"
+    )
+    config_version = models.CharField(
+        max_length=50, blank=True, default="", verbose_name="نسخه پیکربندی گزارش‌شده"
+    )
+    versions_reported_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="زمان گزارش نسخه"
+    )
 
     def __str__(self) -> str:
         return f"Device {self.id} for {self.building}"
 
+    @property
+    def current_last_seen(self):
+        """``last_seen`` including timestamps not yet flushed to the database."""
+
+        from .presence import last_seen_buffer
+
+        return last_seen_buffer.get(self.pk, self.last_seen)
+
+
+class FirmwareRelease(models.Model):
+    """Content-addressed store of firmware and config blobs.
+
+    Rows are keyed by the sha256 of ``content`` and shared by every
+    ``DeviceFirmware`` that points at them, so rolling a build out to many
+    devices stores and hashes it once. Old rows are kept so OTA can diff a
+    device's installed build against the target.
+    """
+
+    checksum = models.CharField(max_length=64, unique=True, verbose_name="چک‌سام")
+    version = models.CharField(max_length=50, verbose_name="نسخه")
+    content = models.TextField(verbose_name="محتوا")
+    size = models.PositiveIntegerField(default=0, verbose_name="حجم (بایت)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="زمان ایجاد")
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"Firmware {self.version} ({self.checksum[:12]})"
+
+    @classmethod
+    def store(cls, content: str, version: str = "") -> "FirmwareRelease":
+        """Return the release holding ``content``, creating it if needed."""
+
+        data = content.encode("utf-8")
+        release, _ = cls.objects.get_or_create(
+            checksum=hashlib.sha256(data).hexdigest(),
+            defaults={"version": version, "content": content, "size": len(data)},
+        )
+        return release
+
+
+class FirmwareRollout(models.Model):
+    """Staged delivery of a ``FirmwareRelease`` to part of the fleet.
+
+    Devices are admitted by building and by a stable per-device percentage
+    bucket, at most ``max_concurrent_downloads`` fetch the build at once, and
+    the rollout pauses itself when upgraded devices stop sending heartbeats.
+    See :mod:`devices.rollouts`.
+    """
+
+    class Status(models.TextChoices):
+        ACTIVE = "active", "Active"
+        PAUSED = "paused", "Paused"
+        COMPLETED = "completed", "Completed"
+
+    release = models.ForeignKey(
+        FirmwareRelease,
+        on_delete=models.PROTECT,
+        related_name="rollouts",
+        verbose_name="نسخه میان‌افزار",
+    )
+    buildings = models.ManyToManyField(
+        Building, blank=True, related_name="firmware_rollouts", verbose_name="ساختمان‌ها"
+    )
+    percentage = models.PositiveSmallIntegerField(
+        default=10,
+        validators=[MaxValueValidator(100)],
+        verbose_name="درصد دستگاه‌ها",
+    )
+    max_concurrent_downloads = models.PositiveIntegerField(
+        default=10, verbose_name="حداکثر دانلود همزمان"
+    )
+    heartbeat_timeout_seconds = models.PositiveIntegerField(
+        default=600, verbose_name="مهلت ضربان (ثانیه)"
+    )
+    max_silent_devices = models.PositiveIntegerField(
+        default=1, verbose_name="حداکثر دستگاه بی‌پاسخ"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.ACTIVE,
+        verbose_name="وضعیت",
+    )
+    status_reason = models.CharField(
+        max_length=255, blank=True, default="", verbose_name="علت وضعیت"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="زمان ایجاد")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="زمان به‌روزرسانی")
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"Rollout of {self.release} ({self.percentage}%, {self.status})"
+
 
 class DeviceFirmware(models.Model):
     device = models.OneToOneField(
         Device, on_delete=models.CASCADE, related_name="firmware", verbose_name="دستگاه"
     )
     version = models.CharField(max_length=50, verbose_name="نسخه")
-    content = models.TextField(verbose_name="محتوا")
+    release = models.ForeignKey(
+        FirmwareRelease,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="فایل میان‌افزار",
+    )
+    config_release = models.ForeignKey(
+        FirmwareRelease,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="فایل پیکربندی",
+    )
+    rollout = models.ForeignKey(
+        FirmwareRollout,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="device_firmware",
+        verbose_name="انتشار مرحله‌ای",
+    )
+    # Text assigned here is moved into ``FirmwareRelease`` on save; the
+    # columns only hold rows that predate the release store.
+    content = models.TextField(blank=True, verbose_name="محتوا")
     checksum = models.CharField(max_length=64, blank=True, verbose_name="چک‌سام")
     config = models.TextField(blank=True, default="", verbose_name="پیکربندی")
     config_version = models.CharField(
@@ -53,22 +189,62 @@ class DeviceFirmware(models.Model):
     def __str__(self) -> str:
         return f"Firmware {self.version} for {self.device}"
 
+    @property
+    def etag(self) -> str:
+        """Strong ETag covering both the firmware and config payloads."""
+
+        return f'"{self.checksum}:{self.config_checksum}"'
+
+    @property
+    def firmware_content(self) -> str:
+        return self.release.content if self.release_id else self.content
+
+    @property
+    def config_content(self) -> str:
+        return self.config_release.content if self.config_release_id else self.config
+
     def save(self, *args, **kwargs):
         if self.content:
-            self.checksum = hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+            self.release = FirmwareRelease.store(self.content, self.version)
+            self.content = ""
+        if self.config:
+            self.config_release = FirmwareRelease.store(
+                self.config, self.config_version
+            )
+            self.config = ""
+
+        if self.release_id:
+            self.checksum = self.release.checksum
+            self.version = self.version or self.release.version
         else:
             self.checksum = ""
-
-        if self.config:
-            self.config_checksum = hashlib.sha256(
-                self.config.encode("utf-8")
-            ).hexdigest()
+        if self.config_release_id:
+            self.config_checksum = self.config_release.checksum
+            self.config_version = self.config_version or self.config_release.version
         else:
             self.config_checksum = ""
 
         super().save(*args, **kwargs)
 
 
+class DeviceLogQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the logs and take them out of the hourly rollups.
+
+        A grouped count of the doomed rows and one bulk decrement keep
+        ``DeviceLogRollup`` in step, while the rows still go in a single
+        ``DELETE`` however many there are.
+        """
+
+        from .rollups import count_buckets, subtract_buckets
+
+        with transaction.atomic(savepoint=False):
+            counts = count_buckets(self)
+            deleted = super().delete()
+            subtract_buckets(counts)
+        return deleted
+
+
 class DeviceLog(models.Model):
     device = models.ForeignKey(
         Device, on_delete=models.CASCADE, related_name="logs", verbose_name="دستگاه"
@@ -86,10 +262,59 @@ class DeviceLog(models.Model):
         default=timezone.now, verbose_name="زمان ایجاد"
     )
 
+    objects = DeviceLogQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination on /devices/logs/ walks (created_at, id).
+            models.Index(
+                fields=["device", "-created_at", "-id"],
+                name="devices_log_device_time_idx",
+            ),
+            # The building-wide page (no device filter) joins through device,
+            # so it walks this one in order and checks the building per row.
+            models.Index(fields=["-created_at", "-id"], name="devices_log_time_idx"),
+        ]
 
     def __str__(self) -> str:
         level = self.level or "log"
         event = f" ({self.event_type})" if self.event_type else ""
         return f"{level.upper()}{event} for {self.device}"
+
+    def delete(self, using=None, keep_parents=False):
+        # Through the queryset so the hourly rollups follow.
+        return type(self)._default_manager.using(using).filter(pk=self.pk).delete()
+
+
+class DeviceLogRollup(models.Model):
+    """Number of ``DeviceLog`` rows per device, local hour, level and event.
+
+    Maintained by ``devices.rollups`` as logs are stored and deleted, so
+    summaries read a few rows per hour instead of counting the raw table.
+    """
+
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name="log_rollups",
+        verbose_name="دستگاه",
+    )
+    hour = models.DateTimeField(verbose_name="ساعت")
+    level = models.CharField(max_length=20, blank=True, verbose_name="سطح")
+    event_type = models.CharField(
+        max_length=50, blank=True, default="", verbose_name="نوع رویداد"
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name="تعداد")
+
+    class Meta:
+        ordering = ["-hour"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "hour", "level", "event_type"],
+                name="devicelogrollup_unique_bucket",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.count} {self.level or 'log'} log(s) for {self.device} at {self.hour}"
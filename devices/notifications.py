@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+
+class CommandNotifier:
+    """In-process bus that wakes long-polling device requests when a command is queued.
+
+    Each device has a sequence number that is bumped on every publish. Waiters
+    read the sequence before checking the database and then wait for it to
+    change, so a command queued between the check and the wait is not missed.
+    Both blocking (WSGI worker threads) and asyncio (ASGI) waiters are
+    supported. Notifications are process-local; callers must still re-check
+    the database periodically to see commands queued by other worker processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conditions = {}
+        self._sequences = {}
+        self._async_waiters = {}
+        self._thread_waiters = 0
+
+    def _condition(self, device_id):
+        condition = self._conditions.get(device_id)
+        if condition is None:
+            condition = self._conditions[device_id] = threading.Condition(self._lock)
+        return condition
+
+    def sequence(self, device_id) -> int:
+        with self._lock:
+            return self._sequences.get(device_id, 0)
+
+    def publish(self, device_id) -> None:
+        with self._lock:
+            self._sequences[device_id] = self._sequences.get(device_id, 0) + 1
+            self._condition(device_id).notify_all()
+            waiters = list(self._async_waiters.get(device_id, ()))
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def wait(self, device_id, since: int, timeout: float) -> bool:
+        """Block until the device sequence moves past ``since`` or ``timeout`` expires."""
+
+        with self._lock:
+            self._thread_waiters += 1
+            try:
+                return self._condition(device_id).wait_for(
+                    lambda: self._sequences.get(device_id, 0) != since, timeout
+                )
+            finally:
+                self._thread_waiters -= 1
+
+    async def async_wait(self, device_id, since: int, timeout: float) -> bool:
+        """Asyncio counterpart of :meth:`wait` that does not tie up a thread."""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if self._sequences.get(device_id, 0) != since:
+                return True
+            self._async_waiters.setdefault(device_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._async_waiters.get(device_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._async_waiters[device_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "thread_waiters": self._thread_waiters,
+                "async_waiters": sum(len(w) for w in self._async_waiters.values()),
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+command_notifier = CommandNotifier()
+
+
+def notify_command_queued(device_id) -> None:
+    """Flag ``device_id`` in the shared pending index and wake its long polls."""
+
+    from .pending_index import pending_index
+
+    pending_index.mark_pending(device_id)
+    command_notifier.publish(device_id)
@@ -0,0 +1,93 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .checks import PROCESS_LOCAL_CACHES
+
+
+class PendingCommandIndex:
+    """Shared index of devices that may have a pending ``DoorCommand``.
+
+    State lives in the ``DEVICE_STATE_CACHE`` cache so every worker process
+    sees the same answer. Each device has a *generation* token that is replaced
+    whenever a command is queued, and an *idle* marker holding the generation
+    at which the database was last seen without pending commands. A device is
+    idle only while the two match, so:
+
+    * a command queued during a poll's database check changes the generation
+      and the stale idle marker no longer matches;
+    * evicted or missing keys mean "unknown" and fall back to the database,
+      which rebuilds the entry. No startup scan is needed;
+    * on a shared cache an idle marker lives until the generation changes.
+      On a process-local cache (see ``devices.checks``) it expires after
+      ``DEVICE_PENDING_IDLE_TTL`` seconds, so a command queued by another
+      worker, whose generation bump this process cannot see, is still found
+      within that time instead of being hidden indefinitely.
+    """
+
+    key_prefix = "devices:pending"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"idle_hits": 0, "db_checks": 0, "marks": 0}
+
+    @property
+    def cache(self):
+        return caches[settings.DEVICE_STATE_CACHE]
+
+    def _keys(self, device_id):
+        return (
+            f"{self.key_prefix}:gen:{device_id}",
+            f"{self.key_prefix}:idle:{device_id}",
+        )
+
+    def mark_pending(self, device_id) -> None:
+        generation_key, _ = self._keys(device_id)
+        self.cache.set(generation_key, uuid.uuid4().hex, timeout=None)
+        self._count("marks")
+
+    def snapshot(self, device_id):
+        """Return ``(generation, idle)`` for ``device_id``."""
+
+        generation_key, idle_key = self._keys(device_id)
+        values = self.cache.get_many([generation_key, idle_key])
+        generation = values.get(generation_key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not self.cache.add(generation_key, generation, timeout=None):
+                generation = self.cache.get(generation_key) or generation
+            self._count("db_checks")
+            return generation, False
+        idle = values.get(idle_key) == generation
+        self._count("idle_hits" if idle else "db_checks")
+        return generation, idle
+
+    def mark_idle(self, device_id, generation) -> None:
+        _, idle_key = self._keys(device_id)
+        self.cache.set(idle_key, generation, timeout=self._idle_timeout())
+
+    def _idle_timeout(self):
+        return settings.DEVICE_PENDING_IDLE_TTL if self.process_local else None
+
+    @property
+    def process_local(self) -> bool:
+        """Whether generation bumps made by other workers are invisible here."""
+
+        backend = settings.CACHES.get(settings.DEVICE_STATE_CACHE, {}).get("BACKEND")
+        return backend in PROCESS_LOCAL_CACHES
+
+    def forget(self, device_id) -> None:
+        self.cache.delete_many(self._keys(device_id))
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+pending_index = PendingCommandIndex()
@@ -0,0 +1,164 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Case, DateTimeField, Value, When
+
+logger = logging.getLogger(__name__)
+
+
+class LastSeenBuffer:
+    """Write-behind buffer for ``Device.last_seen``.
+
+    Device requests record their timestamp in memory; dirty devices are written
+    in one bulk ``UPDATE`` once ``DEVICE_LAST_SEEN_FLUSH_INTERVAL`` seconds have
+    passed since the previous flush, and at interpreter shutdown. The check runs
+    on each touch, and a background thread flushes values left behind when
+    every device has gone quiet. An interval of ``0`` writes through on every
+    touch. Readers should use :meth:`get` so unflushed values take precedence
+    over the database.
+    """
+
+    # Keep the generated CASE expression well under SQLite's variable limit.
+    batch_size = 500
+
+    def __init__(self, autostart=True):
+        self.autostart = autostart
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._dirty = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+        self._stopping = False
+
+    def touch(self, device_id, when) -> None:
+        with self._lock:
+            current = self._dirty.get(device_id)
+            if current is None or when > current:
+                self._dirty[device_id] = when
+            due = (
+                time.monotonic() - self._last_flush
+                >= settings.DEVICE_LAST_SEEN_FLUSH_INTERVAL
+            )
+            self._wake.notify()
+        if due:
+            self.flush()
+        elif self.autostart:
+            self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._stopping or (self._flusher and self._flusher.is_alive()):
+                return
+            self._flusher = threading.Thread(
+                target=self._run, name="device-last-seen-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _wait_until_due(self) -> bool:
+        """Block until dirty values are due for a flush; False when stopping."""
+
+        with self._lock:
+            while not self._stopping:
+                if self._dirty:
+                    waited = time.monotonic() - self._last_flush
+                    remaining = settings.DEVICE_LAST_SEEN_FLUSH_INTERVAL - waited
+                    if remaining <= 0:
+                        return True
+                    self._wake.wait(remaining)
+                else:
+                    self._wake.wait()
+            return False
+
+    def _run(self):
+        while self._wait_until_due():
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush device last_seen")
+
+    def get(self, device_id, default=None):
+        with self._lock:
+            value = self._dirty.get(device_id)
+        if value is None or (default is not None and default > value):
+            return default
+        return value
+
+    def flush(self) -> int:
+        """Write all dirty timestamps to the database and return how many."""
+
+        from .models import Device
+
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # another thread is already flushing
+        try:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                self._last_flush = time.monotonic()
+            items = list(dirty.items())
+            try:
+                for start in range(0, len(items), self.batch_size):
+                    batch = items[start : start + self.batch_size]
+                    Device.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                        last_seen=Case(
+                            *[When(pk=pk, then=Value(seen)) for pk, seen in batch],
+                            output_field=DateTimeField(),
+                        )
+                    )
+            except Exception:
+                # Put the timestamps back so the next flush retries them.
+                with self._lock:
+                    for pk, seen in items:
+                        current = self._dirty.get(pk)
+                        if current is None or seen > current:
+                            self._dirty[pk] = seen
+                raise
+            return len(items)
+        finally:
+            self._flush_lock.release()
+
+    def clear(self) -> int:
+        """Drop unflushed timestamps without writing them; returns how many."""
+
+        with self._lock:
+            dropped, self._dirty = len(self._dirty), {}
+            return dropped
+
+    def shutdown(self, timeout=5.0) -> int:
+        """Stop the background flusher and write what is left."""
+
+        with self._lock:
+            self._stopping = True
+            self._wake.notify_all()
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join(timeout)
+        return self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "dirty": len(self._dirty),
+                "seconds_since_flush": round(time.monotonic() - self._last_flush, 3),
+                "flusher_alive": bool(self._flusher and self._flusher.is_alive()),
+            }
+
+
+last_seen_buffer = LastSeenBuffer()
+
+
+@atexit.register
+def _flush_on_shutdown():
+    try:
+        last_seen_buffer.shutdown()
+    except DatabaseError as exc:
+        # e.g. the database (or its tables) is already gone: a throwaway test
+        # or benchmark database, or a process that never migrated.
+        logger.warning("Could not flush device last_seen on shutdown: %s", exc)
+    except Exception:
+        logger.exception("Could not flush device last_seen on shutdown")
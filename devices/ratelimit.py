@@ -0,0 +1,147 @@
+import asyncio
+import functools
+import hashlib
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from .token_cache import device_token_cache
+
+
+class RateLimiter:
+    """Per-client request counters kept in the ``DEVICE_STATE_CACHE`` cache.
+
+    ``RATE_LIMITS`` maps a scope (one endpoint or group of endpoints) to
+    ``(requests_per_minute, burst)``. Each client may make ``burst`` requests
+    per window of ``burst / requests_per_minute`` minutes, which averages out
+    to the configured rate; a request over the allowance is refused with the
+    seconds until the next window. Counters live in the shared cache and are
+    bumped with ``cache.add``/``cache.incr``, which are atomic on Redis and
+    Memcached, so every worker process counts against the same allowance.
+    Scopes missing from ``RATE_LIMITS`` are not limited.
+    """
+
+    key_prefix = "ratelimit"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"allowed": 0, "limited": 0}
+
+    @property
+    def cache(self):
+        return caches[settings.DEVICE_STATE_CACHE]
+
+    def _key(self, scope, client, window):
+        digest = hashlib.sha256(str(client).encode()).hexdigest()[:32]
+        return f"{self.key_prefix}:{scope}:{digest}:{window}"
+
+    def hit(self, scope, client) -> float:
+        """Count a request; return ``0`` if allowed, else seconds until retry."""
+
+        limit = settings.RATE_LIMITS.get(scope)
+        if not limit or client is None:
+            return 0.0
+        per_minute, burst = limit
+        length = burst * 60 / per_minute
+        now = time.time()
+        window = int(now // length)
+        key = self._key(scope, client, window)
+        timeout = math.ceil(length) + 1
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(); this request opens the window.
+            self.cache.add(key, 1, timeout=timeout)
+            count = 1
+        allowed = count <= burst
+        with self._lock:
+            self._counters["allowed" if allowed else "limited"] += 1
+        return 0.0 if allowed else (window + 1) * length - now
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+rate_limiter = RateLimiter()
+
+
+def device_client(request):
+    """Limit known devices by token and everything else by client address.
+
+    Unknown tokens would otherwise each get a fresh allowance (and cache key).
+    """
+
+    token = request.headers.get("X-DEVICE-TOKEN")
+    if token and device_token_cache.get(token) is not None:
+        return token
+    address = request.META.get("REMOTE_ADDR")
+    return f"ip:{address}" if address else None
+
+
+def user_client(request):
+    user = getattr(request, "user", None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def too_many_requests(request, retry_after):
+    """JSON ``429`` for API clients; ``retry_after`` is in whole seconds."""
+
+    response = JsonResponse(
+        {"error": "Rate limit exceeded", "retry_after": retry_after}, status=429
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, client=device_client, methods=None, respond=too_many_requests):
+    """Refuse requests over the ``scope`` limit with ``429`` and ``Retry-After``.
+
+    ``client`` maps a request to the counter owner (see ``device_client``);
+    ``methods`` restricts limiting to those HTTP methods. ``respond(request,
+    retry_after_seconds)`` builds the refusal, e.g. a redirect with a message
+    for browser forms. Works on sync and async views.
+    """
+
+    def applies(request):
+        return methods is None or request.method in methods
+
+    def refuse(request, retry_after):
+        return respond(request, max(1, math.ceil(retry_after)))
+
+    def hit(request):
+        return rate_limiter.hit(scope, client(request))
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+
+            @functools.wraps(view_func)
+            async def _async_wrapped(request, *args, **kwargs):
+                if applies(request):
+                    # ``client`` may look the token up in the database.
+                    retry_after = await sync_to_async(hit, thread_sensitive=False)(
+                        request
+                    )
+                    if retry_after:
+                        return refuse(request, retry_after)
+                return await view_func(request, *args, **kwargs)
+
+            return _async_wrapped
+
+        @functools.wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if applies(request):
+                retry_after = hit(request)
+                if retry_after:
+                    return refuse(request, retry_after)
+            return view_func(request, *args, **kwargs)
+
+        return _wrapped
+
+    return decorator
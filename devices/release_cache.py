@@ -0,0 +1,77 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ReleaseBodyCache:
+    """Per-process LRU of encoded firmware bodies keyed by release checksum.
+
+    Releases are content-addressed and never change, so entries cannot go
+    stale; ``max_bytes`` only bounds memory. Each entry holds the UTF-8 body
+    and, once a client asks for it, the gzip encoding, so serving a release
+    to many devices neither reloads nor re-encodes the text.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counters = dict.fromkeys(("hits", "misses", "evictions"), 0)
+
+    def _get(self, checksum, encoding):
+        with self._lock:
+            entry = self._entries.get(checksum)
+            if entry is not None and encoding in entry:
+                self._entries.move_to_end(checksum)
+                self._counters["hits"] += 1
+                return entry[encoding]
+            self._counters["misses"] += 1
+            return None
+
+    def _put(self, checksum, encoding, body):
+        with self._lock:
+            entry = self._entries.setdefault(checksum, {})
+            if encoding not in entry:
+                entry[encoding] = body
+                self._bytes += len(body)
+            self._entries.move_to_end(checksum)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(len(value) for value in evicted.values())
+                self._counters["evictions"] += 1
+
+    def body(self, checksum, load) -> bytes:
+        """Return the UTF-8 body; ``load()`` supplies the text on a miss."""
+
+        body = self._get(checksum, "identity")
+        if body is None:
+            body = load().encode("utf-8")
+            self._put(checksum, "identity", body)
+        return body
+
+    def gzipped(self, checksum, load) -> bytes:
+        body = self._get(checksum, "gzip")
+        if body is None:
+            body = gzip.compress(self.body(checksum, load), mtime=0)
+            self._put(checksum, "gzip", body)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["releases"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            return stats
+
+
+release_body_cache = ReleaseBodyCache(
+    max_bytes=settings.DEVICE_RELEASE_BODY_CACHE_BYTES
+)
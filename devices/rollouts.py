@@ -0,0 +1,148 @@
+import hashlib
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Device, DeviceFirmware, FirmwareRollout
+
+SLOT_KEY_PREFIX = "devices:rollout"
+
+
+def rollout_bucket(rollout_id, device_id) -> int:
+    """Stable 0-99 bucket so raising ``percentage`` only ever adds devices."""
+
+    digest = hashlib.sha256(f"{rollout_id}:{device_id}".encode()).digest()
+    return int.from_bytes(digest[:4], "big") % 100
+
+
+def ota_jitter_ms() -> int:
+    """Random delay that spreads devices' next OTA check over the jitter window."""
+
+    return random.randint(0, settings.DEVICE_OTA_JITTER_MS)
+
+
+def _slot_keys(rollout):
+    return [
+        f"{SLOT_KEY_PREFIX}:{rollout.pk}:slot:{index}"
+        for index in range(rollout.max_concurrent_downloads)
+    ]
+
+
+def acquire_download_slot(rollout, device_id) -> bool:
+    """Lease one of the rollout's download slots for ``device_id``.
+
+    Slots are ``max_concurrent_downloads`` cache keys claimed with
+    ``cache.add`` so the cap holds across worker processes. A lease expires
+    after ``DEVICE_OTA_DOWNLOAD_SLOT_TTL`` seconds, so a device that dies
+    mid-download does not hold its slot forever.
+    """
+
+    cache = caches[settings.DEVICE_STATE_CACHE]
+    keys = _slot_keys(rollout)
+    holders = cache.get_many(keys)
+    if device_id in holders.values():
+        return True
+    timeout = settings.DEVICE_OTA_DOWNLOAD_SLOT_TTL
+    return any(
+        cache.add(key, device_id, timeout=timeout) for key in keys if key not in holders
+    )
+
+
+def release_download_slot(rollout, device_id) -> None:
+    cache = caches[settings.DEVICE_STATE_CACHE]
+    holders = cache.get_many(_slot_keys(rollout))
+    cache.delete_many([key for key, value in holders.items() if value == device_id])
+
+
+def active_downloads(rollout) -> int:
+    return len(caches[settings.DEVICE_STATE_CACHE].get_many(_slot_keys(rollout)))
+
+
+def _scope(rollout):
+    devices = Device.objects.all()
+    building_ids = list(rollout.buildings.values_list("pk", flat=True))
+    if building_ids:
+        devices = devices.filter(building_id__in=building_ids)
+    return devices
+
+
+def silent_devices(rollout, now=None):
+    """Devices running the rollout's build that stopped sending heartbeats."""
+
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=rollout.heartbeat_timeout_seconds)
+    return Device.objects.filter(
+        firmware__rollout=rollout, firmware_version=rollout.release.version
+    ).filter(Q(last_seen__lt=cutoff) | Q(last_seen__isnull=True))
+
+
+def advance_rollout(rollout, now=None) -> int:
+    """Check health, then point newly admitted devices at the release.
+
+    Returns how many devices were added to the rollout. A rollout pauses
+    itself once ``max_silent_devices`` upgraded devices miss their heartbeat
+    window, and completes once every device in scope reports the new build.
+    """
+
+    if rollout.status != FirmwareRollout.Status.ACTIVE:
+        return 0
+
+    silent = silent_devices(rollout, now).count()
+    if rollout.max_silent_devices and silent >= rollout.max_silent_devices:
+        rollout.status = FirmwareRollout.Status.PAUSED
+        rollout.status_reason = (
+            f"{silent} upgraded device(s) stopped sending heartbeats"
+        )
+        rollout.save(update_fields=["status", "status_reason", "updated_at"])
+        return 0
+
+    release = rollout.release
+    admitted = 0
+    candidates = (
+        _scope(rollout).exclude(firmware__release=release).values_list("pk", flat=True)
+    )
+    for device_id in candidates.iterator():
+        if rollout_bucket(rollout.pk, device_id) >= rollout.percentage:
+            continue
+        DeviceFirmware.objects.update_or_create(
+            device_id=device_id,
+            defaults={
+                "release": release,
+                "version": release.version,
+                "rollout": rollout,
+            },
+        )
+        admitted += 1
+
+    if (
+        rollout.percentage >= 100
+        and not _scope(rollout).exclude(firmware_version=release.version).exists()
+    ):
+        rollout.status = FirmwareRollout.Status.COMPLETED
+        rollout.status_reason = ""
+        rollout.save(update_fields=["status", "status_reason", "updated_at"])
+    return admitted
+
+
+def download_allowed(firmware, device_id):
+    """Return ``(allowed, retry_after_ms)`` for a device about to fetch firmware.
+
+    Devices outside a rollout are never throttled. Inside one they need an
+    active rollout and a free download slot; otherwise they get a jittered
+    delay before their next check.
+    """
+
+    if not firmware.rollout_id:
+        return True, None
+    rollout = firmware.rollout
+    if rollout.status == FirmwareRollout.Status.PAUSED:
+        return False, settings.DEVICE_OTA_CHECK_INTERVAL_MS + ota_jitter_ms()
+    if rollout.status == FirmwareRollout.Status.COMPLETED:
+        return True, None
+    if acquire_download_slot(rollout, device_id):
+        return True, None
+    return False, ota_jitter_ms()
@@ -0,0 +1,146 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import DeviceLog, DeviceLogRollup
+
+
+def log_hour(when):
+    """Start of the local hour ``when`` falls in, matching ``TruncHour``."""
+
+    return timezone.localtime(when).replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket(log):
+    return (log.device_id, log_hour(log.created_at), log.level, log.event_type)
+
+
+def _add(counts):
+    """Add positive ``counts`` to their buckets with a single upsert."""
+
+    table = connection.ops.quote_name(DeviceLogRollup._meta.db_table)
+    hour_field = DeviceLogRollup._meta.get_field("hour")
+    # ``INSERT .. ON CONFLICT`` (SQLite 3.24+, PostgreSQL) increments in one
+    # statement; the ORM's update_conflicts can only overwrite the count.
+    sql = (
+        f"INSERT INTO {table} (device_id, hour, level, event_type, count) "
+        "VALUES (%s, %s, %s, %s, %s) "
+        "ON CONFLICT (device_id, hour, level, event_type) "
+        f"DO UPDATE SET count = {table}.count + excluded.count"
+    )
+    params = [
+        (
+            device_id,
+            hour_field.get_db_prep_value(hour, connection),
+            level,
+            event_type,
+            count,
+        )
+        for (device_id, hour, level, event_type), count in counts.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def insert_logs(logs) -> None:
+    """``bulk_create`` ``logs`` and add them to the hourly rollups atomically."""
+
+    if not logs:
+        return
+    with transaction.atomic(savepoint=False):
+        DeviceLog.objects.bulk_create(logs)
+        _add(Counter(map(_bucket, logs)))
+
+
+def subtract_buckets(counts):
+    """Take ``counts`` (from :func:`count_buckets`) back out of the rollups.
+
+    One bulk decrement plus a delete of the buckets it emptied.
+    """
+
+    if not counts:
+        return
+    table = connection.ops.quote_name(DeviceLogRollup._meta.db_table)
+    hour_field = DeviceLogRollup._meta.get_field("hour")
+    sql = (
+        f"UPDATE {table} SET count = CASE WHEN count > %s THEN count - %s ELSE 0 END "
+        "WHERE device_id = %s AND hour = %s AND level = %s AND event_type = %s"
+    )
+    params = [
+        (
+            count,
+            count,
+            device_id,
+            hour_field.get_db_prep_value(hour, connection),
+            level,
+            event_type,
+        )
+        for (device_id, hour, level, event_type), count in counts.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    DeviceLogRollup.objects.filter(
+        device_id__in={device_id for device_id, *_ in counts}, count=0
+    ).delete()
+
+
+def count_buckets(queryset):
+    """Count the logs in ``queryset`` per rollup bucket with one grouped query."""
+
+    rows = (
+        queryset.annotate(hour=TruncHour("created_at"))
+        .values("device_id", "hour", "level", "event_type")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    return {
+        (row["device_id"], row["hour"], row["level"], row["event_type"]): row["count"]
+        for row in rows
+    }
+
+
+def rebuild_rollups(batch_size=500) -> int:
+    """Recount every rollup from the raw log table; returns the bucket count."""
+
+    with transaction.atomic():
+        buckets = count_buckets(DeviceLog.objects.all())
+        DeviceLogRollup.objects.all().delete()
+        DeviceLogRollup.objects.bulk_create(
+            [
+                DeviceLogRollup(
+                    device_id=device_id,
+                    hour=hour,
+                    level=level,
+                    event_type=event_type,
+                    count=count,
+                )
+                for (device_id, hour, level, event_type), count in buckets.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(buckets)
+
+
+def rollup_mismatches():
+    """Compare the rollups with the raw log table.
+
+    Returns ``(bucket, raw_count, rollup_count)`` for every bucket whose
+    counts differ, where ``bucket`` is ``(device_id, hour, level,
+    event_type)``.
+    """
+
+    raw = count_buckets(DeviceLog.objects.all())
+    rolled = {
+        (row["device_id"], row["hour"], row["level"], row["event_type"]): row["count"]
+        for row in DeviceLogRollup.objects.values(
+            "device_id", "hour", "level", "event_type", "count"
+        )
+    }
+    return [
+        (bucket, raw.get(bucket, 0), rolled.get(bucket, 0))
+        for bucket in sorted(raw.keys() | rolled.keys(), key=str)
+        if raw.get(bucket, 0) != rolled.get(bucket, 0)
+    ]
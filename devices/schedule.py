@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from access.models import AccessLog, DoorCommand
+from households.models import MemberProfile
+
+KEY_PREFIX = "devices:poll-interval"
+
+
+def _key(device_id):
+    return f"{KEY_PREFIX}:{device_id}"
+
+
+def _compute_interval_ms(device, now):
+    # Someone was at the door recently: stay fast for the follow-up presses.
+    recent = now - timedelta(seconds=settings.DEVICE_ACTIVITY_WINDOW)
+    if (
+        DoorCommand.objects.filter(device=device, created_at__gte=recent).exists()
+        or AccessLog.objects.filter(
+            household__building_id=device.building_id, timestamp__gte=recent
+        ).exists()
+    ):
+        return settings.DEVICE_POLL_INTERVAL_MS
+
+    # The door is usually used at this hour of the day.
+    history = now - timedelta(days=settings.DEVICE_ACTIVITY_HISTORY_DAYS)
+    local_hour = timezone.localtime(now).hour
+    busy = DoorCommand.objects.filter(
+        device=device, created_at__gte=history, created_at__hour=local_hour
+    ).count()
+    if busy >= settings.DEVICE_ACTIVITY_BUSY_HOUR_COMMANDS:
+        return settings.DEVICE_POLL_INTERVAL_MS
+
+    # Members may open the door now, even if they rarely do.
+    local_time = timezone.localtime(now).time()
+    if MemberProfile.objects.filter(
+        household__building_id=device.building_id,
+        active=True,
+        allowed_from_time__lte=local_time,
+        allowed_to_time__gte=local_time,
+    ).exists():
+        return settings.DEVICE_WINDOW_POLL_INTERVAL_MS
+
+    return settings.DEVICE_IDLE_POLL_INTERVAL_MS
+
+
+def recommended_poll_interval_ms(device, now=None) -> int:
+    """Poll interval for ``device`` from recent and typical door activity.
+
+    Recent commands or access attempts in the building, or an hour of the day
+    with regular commands over the last ``DEVICE_ACTIVITY_HISTORY_DAYS``, give
+    the normal ``DEVICE_POLL_INTERVAL_MS``. Otherwise the device polls at
+    ``DEVICE_WINDOW_POLL_INTERVAL_MS`` while an active member's allowed window
+    is open and at ``DEVICE_IDLE_POLL_INTERVAL_MS`` outside of them. Results
+    are kept in ``DEVICE_STATE_CACHE`` for ``DEVICE_POLL_SCHEDULE_TTL``
+    seconds, so idle polls stay query-free; queueing a command clears them.
+    """
+
+    cache = caches[settings.DEVICE_STATE_CACHE]
+    key = _key(device.pk)
+    interval = cache.get(key)
+    if interval is None:
+        interval = _compute_interval_ms(device, now or timezone.now())
+        cache.set(key, interval, timeout=settings.DEVICE_POLL_SCHEDULE_TTL)
+    return interval
+
+
+def reset_poll_schedule(device_id) -> None:
+    caches[settings.DEVICE_STATE_CACHE].delete(_key(device_id))
@@ -0,0 +1,40 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# FTS5 table over ``DeviceLog.message`` and the scalar values of ``metadata``,
+# kept in sync by triggers (devices/migrations/0015_devicelog_search.py).
+FTS_TABLE = "devices_devicelog_fts"
+
+
+def fts_available() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def fts_query(text) -> str:
+    """Turn free text into an FTS5 query: every word, as a prefix, must match.
+
+    Words are quoted so FTS5 operators and punctuation in user input are taken
+    literally instead of raising syntax errors.
+    """
+
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search_logs(queryset, text):
+    """Narrow a ``DeviceLog`` queryset to rows whose message or metadata match.
+
+    Uses the FTS5 index on SQLite and ``icontains`` elsewhere.
+    """
+
+    text = (text or "").strip()
+    if not text:
+        return queryset
+    if not fts_available():
+        return queryset.filter(Q(message__icontains=text) | Q(metadata__icontains=text))
+    return queryset.filter(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [fts_query(text)],
+        )
+    )
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from access.models import DoorCommand
+from .models import Device, DeviceFirmware
+from .notifications import command_notifier, notify_command_queued
+from .pending_index import pending_index
+from .schedule import reset_poll_schedule
+from .token_cache import device_token_cache
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device_token(sender, instance, **kwargs):
+    device_token_cache.invalidate(instance)
+
+
+@receiver(post_delete, sender=Device)
+def forget_pending_commands(sender, instance, **kwargs):
+    pending_index.forget(instance.pk)
+
+
+@receiver(post_save, sender=DoorCommand)
+def announce_door_command(sender, instance, **kwargs):
+    # Mark right away so polls in this transaction see it, and again after
+    # commit: a poll that checked the database before the row was visible may
+    # have marked the device idle in between.
+    device_id = instance.device_id
+    pending_index.mark_pending(device_id)
+    if kwargs.get("created"):
+        # Activity at the door: poll at the normal rate again.
+        reset_poll_schedule(device_id)
+    transaction.on_commit(lambda: notify_command_queued(device_id))
+
+
+@receiver(post_save, sender=DeviceFirmware)
+def announce_firmware_change(sender, instance, **kwargs):
+    # Wakes the device's push channel so it sends fresh firmware/config hints.
+    device_id = instance.device_id
+    transaction.on_commit(lambda: command_notifier.publish(device_id))
+
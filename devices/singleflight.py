@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent identical computations and keep their results.
+
+    The first caller for a key runs ``compute``; callers arriving while it is
+    in flight wait for that result instead of repeating the work. Finished
+    ``bytes`` results are kept in an LRU bounded by ``max_bytes``, so keys must
+    identify the content exactly (e.g. include checksums). Pass
+    ``store=False`` to coalesce without keeping the result, for values that
+    already live in another cache.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = OrderedDict()
+        self._bytes = 0
+        self._counters = dict.fromkeys(
+            ("hits", "executions", "coalesced", "evictions", "errors"), 0
+        )
+
+    def do(self, key, compute, store=True):
+        with self._lock:
+            if store and key in self._results:
+                self._results.move_to_end(key)
+                self._counters["hits"] += 1
+                return self._results[key]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self._counters["executions"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+        except Exception as exc:
+            call.error = exc
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if store and call.error is None:
+                    self._remember(key, call.result)
+            call.event.set()
+        return call.result
+
+    def _remember(self, key, result):
+        size = len(result)
+        if size > self.max_bytes:
+            return
+        self._results[key] = result
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._results.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._inflight)
+            stats["entries"] = len(self._results)
+            stats["bytes"] = self._bytes
+            return stats
+
+
+# Shared by the device views for firmware payload bodies and delta patches.
+response_flight = SingleFlight(max_bytes=settings.DEVICE_RESPONSE_CACHE_BYTES)
@@ -1,10 +1,56 @@
+import asyncio
+import csv
+import gzip
+import io
 import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import PropertyMock, patch
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from devices import views
-from devices.models import Device, DeviceLog
-from households.models import Building
+from access.models import DoorCommand
+from devices import views, websocket
+from devices.admission import AdmissionController, admission, shed_under_load
+from devices.checks import check_device_state_cache
+from devices.models import (
+    Device,
+    DeviceFirmware,
+    DeviceLog,
+    DeviceLogRollup,
+    FirmwareRelease,
+    FirmwareRollout,
+)
+from devices.log_queue import LogWriteQueue, log_write_queue
+from devices.notifications import CommandNotifier
+from devices.pending_index import pending_index
+from devices.presence import LastSeenBuffer, _flush_on_shutdown, last_seen_buffer
+from devices.ratelimit import rate_limiter
+from devices.release_cache import ReleaseBodyCache, release_body_cache
+from devices.rollouts import advance_rollout, rollout_bucket
+from devices.rollups import insert_logs, rollup_mismatches
+from devices.schedule import recommended_poll_interval_ms
+from devices.search import search_logs
+from devices.singleflight import SingleFlight, response_flight
+from devices.token_cache import DeviceTokenCache
+from devices.websocket import device_websocket
+from accounts.models import User
+from households.models import Building, Household, MemberProfile
 
 
 class IngestLogTests(TestCase):
@@ -33,6 +79,87 @@ class IngestLogTests(TestCase):
         self.assertIn("remote_addr", log.metadata)
         self.assertIn("user_agent", log.metadata)
 
+    def _post_logs(self, payload):
+        return self.client.post(
+            "/api/device/logs/",
+            data=json.dumps(payload),
+            content_type="application/json",
+            **self._headers(),
+        )
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=60)
+    def test_ingest_batch_uses_single_insert(self):
+        views.device_token_cache.get(self.device.api_token)
+        self.addCleanup(last_seen_buffer.flush)
+        device_time = timezone.now() - timedelta(minutes=10)
+        records = [
+            {"message": "boot", "event_type": "boot"},
+            {"message": "late", "timestamp": device_time.isoformat()},
+            {"message": "epoch clock", "timestamp": 5},
+        ]
+
+        # One insert for the logs and one upsert for their hourly rollups.
+        with self.assertNumQueries(2):
+            response = self._post_logs(records)
+
+        self.assertEqual(response.json(), {"status": "ok", "accepted": 3, "errors": []})
+        late = DeviceLog.objects.get(message="late")
+        self.assertEqual(late.created_at, device_time)
+        epoch = DeviceLog.objects.get(message="epoch clock")
+        self.assertEqual(epoch.metadata["device_timestamp"], 5)
+        self.assertGreater(epoch.created_at, device_time)
+
+    def test_ingest_batch_reports_per_record_errors(self):
+        response = self._post_logs(
+            {"logs": [{"message": "ok"}, {"level": "error"}, {"message": "x", "timestamp": "soon"}]}
+        )
+
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["status"], "partial")
+        self.assertEqual(
+            data["errors"],
+            [
+                {"index": 1, "error": "Missing log message"},
+                {"index": 2, "error": "Invalid timestamp"},
+            ],
+        )
+        self.assertEqual(DeviceLog.objects.count(), 1)
+
+    def test_ingest_rejects_non_string_fields_per_record(self):
+        response = self._post_logs(
+            [
+                {"message": "ok", "level": "WARNING"},
+                {"message": "numeric level", "level": 3},
+                {"message": ["not", "text"]},
+                {"message": "long type", "event_type": "x" * 51},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["errors"],
+            [
+                {"index": 1, "error": "Invalid level"},
+                {"index": 2, "error": "Invalid message"},
+                {"index": 3, "error": "Invalid event_type"},
+            ],
+        )
+        self.assertEqual(DeviceLog.objects.get().level, "warning")
+
+    def test_ingest_batch_with_only_invalid_records_fails(self):
+        response = self._post_logs([{"level": "info"}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["status"], "error")
+
+    @override_settings(DEVICE_LOG_BATCH_MAX=2)
+    def test_ingest_batch_size_is_limited(self):
+        response = self._post_logs([{"message": str(i)} for i in range(3)])
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(DeviceLog.objects.exists())
+
     def test_sanitize_metadata_handles_non_serializable(self):
         class CustomDetail:
             def __str__(self):
@@ -49,3 +176,1909 @@ class IngestLogTests(TestCase):
         self.assertEqual(sanitized["detail"], "custom-detail")
         self.assertEqual(sanitized["nested"], {"items": [1, 2]})
         self.assertEqual(sanitized["list"], ["a", "b"])
+
+
+class PollCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="poll-device-token"
+        )
+
+    def _poll(self, query=""):
+        return self.client.get(
+            f"/api/device/command/{query}", HTTP_X_DEVICE_TOKEN=self.device.api_token
+        )
+
+    def test_poll_returns_pending_command(self):
+        command = DoorCommand.objects.create(device=self.device)
+
+        response = self._poll()
+
+        self.assertEqual(
+            response.json(),
+            {
+                "open": True,
+                "command_id": command.id,
+                "pulse_ms": 1000,
+                "poll_interval_ms": 2000,
+            },
+        )
+
+    def test_long_poll_returns_immediately_when_command_pending(self):
+        DoorCommand.objects.create(device=self.device)
+
+        started = time.monotonic()
+        response = self._poll("?wait=5")
+
+        self.assertTrue(response.json()["open"])
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(DEVICE_LONG_POLL_RECHECK_INTERVAL=0.05)
+    def test_long_poll_times_out_without_command(self):
+        started = time.monotonic()
+        response = self._poll("?wait=0.2")
+
+        self.assertEqual(response.json(), {"open": False, "poll_interval_ms": 30000})
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    @override_settings(DEVICE_LONG_POLL_MAX_WAIT=0)
+    def test_long_poll_wait_is_clamped(self):
+        started = time.monotonic()
+        response = self._poll("?wait=30")
+
+        self.assertEqual(response.json(), {"open": False, "poll_interval_ms": 30000})
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=60)
+    def test_idle_poll_is_answered_from_pending_index(self):
+        self._poll()
+        self.addCleanup(last_seen_buffer.flush)
+
+        with self.assertNumQueries(0):
+            response = self._poll()
+
+        self.assertEqual(response.json(), {"open": False, "poll_interval_ms": 30000})
+
+    def test_new_command_clears_idle_state(self):
+        self._poll()
+
+        command = DoorCommand.objects.create(device=self.device)
+
+        self.assertEqual(self._poll().json()["command_id"], command.id)
+
+    def test_invalid_wait_is_ignored(self):
+        response = self._poll("?wait=soon")
+
+        self.assertEqual(response.json(), {"open": False, "poll_interval_ms": 30000})
+
+    def test_ack_rejects_non_object_body(self):
+        command = DoorCommand.objects.create(device=self.device)
+
+        response = self.client.post(
+            "/api/device/command/ack/",
+            data=json.dumps([command.id]),
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+        )
+
+        self.assertEqual(response.status_code, 400)
+        command.refresh_from_db()
+        self.assertFalse(command.executed)
+
+
+class PollScheduleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.building = Building.objects.create(title="Schedule Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="schedule-device-token"
+        )
+        # 03:00 Tehran time, outside the member window below.
+        self.night = timezone.now().replace(
+            hour=23, minute=30, second=0, microsecond=0
+        ) - timedelta(days=1)
+
+    def _add_member(self, allowed_from, allowed_to):
+        head = User.objects.create_user(username="schedule-head")
+        household = Household.objects.create(
+            title="Schedule Home", head=head, building=self.building
+        )
+        MemberProfile.objects.create(
+            user=User.objects.create_user(username="schedule-member"),
+            household=household,
+            allowed_from_time=allowed_from,
+            allowed_to_time=allowed_to,
+        )
+
+    def test_idle_device_polls_slowly(self):
+        self.assertEqual(recommended_poll_interval_ms(self.device, self.night), 30000)
+
+    def test_recent_command_restores_fast_polling(self):
+        DoorCommand.objects.create(device=self.device)
+
+        self.assertEqual(recommended_poll_interval_ms(self.device), 2000)
+
+    def test_open_member_window_uses_window_interval(self):
+        self._add_member("00:00", "23:59")
+
+        self.assertEqual(recommended_poll_interval_ms(self.device), 5000)
+
+    def test_member_window_outside_now_is_idle(self):
+        self._add_member("08:00", "09:00")
+
+        self.assertEqual(recommended_poll_interval_ms(self.device, self.night), 30000)
+
+    def test_busy_hour_keeps_fast_polling(self):
+        for days in (1, 2, 3):
+            command = DoorCommand.objects.create(device=self.device)
+            DoorCommand.objects.filter(pk=command.pk).update(
+                created_at=self.night - timedelta(days=days)
+            )
+
+        self.assertEqual(recommended_poll_interval_ms(self.device, self.night), 2000)
+
+    def test_interval_is_cached_until_a_command_is_queued(self):
+        self.assertEqual(recommended_poll_interval_ms(self.device, self.night), 30000)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(recommended_poll_interval_ms(self.device), 30000)
+
+        DoorCommand.objects.create(device=self.device)
+
+        self.assertEqual(recommended_poll_interval_ms(self.device), 2000)
+
+    def test_sync_reports_recommended_interval(self):
+        response = self.client.post(
+            "/api/device/sync/",
+            data="{}",
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+        )
+
+        self.assertEqual(response.json()["settings"]["poll_interval_ms"], 30000)
+
+
+class CommandNotifierTests(TestCase):
+    def test_wait_wakes_on_publish(self):
+        notifier = CommandNotifier()
+        sequence = notifier.sequence(1)
+        timer = threading.Timer(0.05, notifier.publish, args=(1,))
+        timer.start()
+
+        self.assertTrue(notifier.wait(1, sequence, timeout=5))
+        timer.join()
+
+    def test_wait_returns_immediately_for_missed_publish(self):
+        notifier = CommandNotifier()
+        sequence = notifier.sequence(1)
+        notifier.publish(1)
+
+        self.assertTrue(notifier.wait(1, sequence, timeout=0))
+        self.assertFalse(notifier.wait(2, notifier.sequence(2), timeout=0))
+
+    def test_async_wait_wakes_on_publish_from_thread(self):
+        notifier = CommandNotifier()
+
+        async def wait():
+            sequence = notifier.sequence(1)
+            timer = threading.Timer(0.05, notifier.publish, args=(1,))
+            timer.start()
+            woke = await notifier.async_wait(1, sequence, timeout=5)
+            timer.join()
+            return woke
+
+        self.assertTrue(asyncio.run(wait()))
+        self.assertEqual(notifier.stats()["async_waiters"], 0)
+
+    def test_async_wait_times_out(self):
+        notifier = CommandNotifier()
+
+        self.assertFalse(asyncio.run(notifier.async_wait(1, 0, timeout=0.01)))
+
+
+class AsyncDeviceViewTests(TransactionTestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="async-device-token"
+        )
+        self.factory = AsyncRequestFactory()
+
+    def _get(self, path):
+        return self.factory.get(path, headers={"X-Device-Token": self.device.api_token})
+
+    def _post(self, path, payload):
+        return self.factory.post(
+            path,
+            data=json.dumps(payload),
+            content_type="application/json",
+            headers={"X-Device-Token": self.device.api_token},
+        )
+
+    async def test_async_poll_returns_pending_command(self):
+        command = await DoorCommand.objects.acreate(device=self.device)
+
+        response = await views.apoll_command(self._get("/api/device/command/?wait=5"))
+
+        self.assertEqual(json.loads(response.content)["command_id"], command.id)
+
+    @override_settings(DEVICE_LONG_POLL_RECHECK_INTERVAL=30)
+    async def test_async_long_poll_wakes_on_publish(self):
+        request = self._get("/api/device/command/?wait=10")
+        task = asyncio.ensure_future(views.apoll_command(request))
+        await asyncio.sleep(0.1)
+        await DoorCommand.objects.acreate(device=self.device)
+        views.command_notifier.publish(self.device.id)
+
+        response = await asyncio.wait_for(task, timeout=5)
+
+        self.assertTrue(json.loads(response.content)["open"])
+
+    async def test_async_ack_and_ingest(self):
+        command = await DoorCommand.objects.acreate(device=self.device)
+
+        ack = await views.aack_command(
+            self._post("/api/device/command/ack/", {"command_id": command.id})
+        )
+        log = await views.aingest_log(
+            self._post("/api/device/logs/", {"message": "async hello"})
+        )
+
+        self.assertEqual(ack.status_code, 200)
+        self.assertEqual(log.status_code, 200)
+        await command.arefresh_from_db()
+        self.assertTrue(command.executed)
+        self.assertTrue(
+            await DeviceLog.objects.filter(message="async hello").aexists()
+        )
+
+    async def test_async_sync(self):
+        command = await DoorCommand.objects.acreate(device=self.device)
+
+        response = await views.adevice_sync(
+            self._post("/api/device/sync/", {"logs": [{"message": "async sync"}]})
+        )
+
+        data = json.loads(response.content)
+        self.assertEqual(data["command"]["command_id"], command.id)
+        self.assertEqual(data["logs"]["accepted"], 1)
+
+    async def test_async_views_reject_unknown_token(self):
+        request = self.factory.get(
+            "/api/device/command/", headers={"X-Device-Token": "nope"}
+        )
+
+        response = await views.apoll_command(request)
+
+        self.assertEqual(response.status_code, 401)
+
+
+class DeviceTokenCacheTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="cached-device-token"
+        )
+        self.cache = DeviceTokenCache(max_size=2, ttl=60, negative_ttl=60)
+
+    def test_repeated_lookups_hit_cache(self):
+        self.assertEqual(self.cache.get("cached-device-token"), self.device)
+
+        with self.assertNumQueries(0):
+            device = self.cache.get("cached-device-token")
+
+        self.assertEqual(device.pk, self.device.pk)
+        self.assertEqual(device.building_id, self.building.pk)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_unknown_tokens_are_negatively_cached(self):
+        self.assertIsNone(self.cache.get("unknown"))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.cache.get("unknown"))
+
+        self.assertEqual(self.cache.stats()["negative_hits"], 1)
+
+    def test_invalidate_drops_entry(self):
+        self.cache.get("cached-device-token")
+
+        self.cache.invalidate(self.device)
+
+        with self.assertNumQueries(1):
+            self.cache.get("cached-device-token")
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.get("cached-device-token")
+        self.cache.get("a")
+        self.cache.get("cached-device-token")
+        self.cache.get("b")
+
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        with self.assertNumQueries(0):
+            self.cache.get("cached-device-token")
+
+    def test_device_save_and_delete_invalidate_shared_cache(self):
+        headers = {"HTTP_X_DEVICE_TOKEN": "late-device-token"}
+        response = self.client.get("/api/device/command/", **headers)
+        self.assertEqual(response.status_code, 401)
+
+        device = Device.objects.create(building=self.building, api_token="late-device-token")
+        response = self.client.get("/api/device/command/", **headers)
+        self.assertEqual(response.status_code, 200)
+
+        device.delete()
+        response = self.client.get("/api/device/command/", **headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_metrics_require_staff(self):
+        response = self.client.get("/api/device/metrics/")
+        self.assertEqual(response.status_code, 302)
+
+        staff = User.objects.create_user("ops", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get("/api/device/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hits", response.json()["token_cache"])
+
+
+class LastSeenBufferTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.devices = [
+            Device.objects.create(building=self.building, api_token=f"seen-{i}")
+            for i in range(2)
+        ]
+        self.buffer = LastSeenBuffer()
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=60)
+    def test_touch_is_buffered_until_flush(self):
+        first = timezone.now()
+        second = first + timedelta(seconds=3)
+
+        with self.assertNumQueries(0):
+            self.buffer.touch(self.devices[0].pk, first)
+            self.buffer.touch(self.devices[1].pk, second)
+            self.buffer.touch(self.devices[0].pk, first - timedelta(seconds=1))
+
+        self.assertEqual(self.buffer.get(self.devices[0].pk), first)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.devices[0].refresh_from_db()
+        self.devices[1].refresh_from_db()
+        self.assertEqual(self.devices[0].last_seen, first)
+        self.assertEqual(self.devices[1].last_seen, second)
+        self.assertEqual(self.buffer.stats()["dirty"], 0)
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_through(self):
+        now = timezone.now()
+
+        self.buffer.touch(self.devices[0].pk, now)
+
+        self.devices[0].refresh_from_db()
+        self.assertEqual(self.devices[0].last_seen, now)
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=60)
+    def test_reads_prefer_buffered_value(self):
+        device = self.devices[0]
+        device.last_seen = timezone.now() - timedelta(hours=1)
+        device.save()
+        newer = timezone.now()
+
+        last_seen_buffer.touch(device.pk, newer)
+        self.addCleanup(last_seen_buffer.flush)
+
+        self.assertEqual(device.current_last_seen, newer)
+        self.assertEqual(Device.objects.get(pk=device.pk).current_last_seen, newer)
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=60)
+    def test_poll_does_not_write_last_seen(self):
+        self.client.get("/api/device/command/", HTTP_X_DEVICE_TOKEN="seen-0")
+        self.addCleanup(last_seen_buffer.flush)
+
+        self.devices[0].refresh_from_db()
+        self.assertIsNone(self.devices[0].last_seen)
+        self.assertIsNotNone(self.devices[0].current_last_seen)
+
+
+class LastSeenFlusherTests(TransactionTestCase):
+    def setUp(self):
+        building = Building.objects.create(title="Quiet Building")
+        self.device = Device.objects.create(building=building, api_token="quiet-0")
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=0.1)
+    def test_quiet_device_is_flushed_in_background(self):
+        buffer = LastSeenBuffer()
+        self.addCleanup(buffer.shutdown)
+        now = timezone.now()
+
+        buffer.touch(self.device.pk, now)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            self.device.refresh_from_db()
+            if self.device.last_seen is not None:
+                break
+            time.sleep(0.02)
+
+        self.assertEqual(self.device.last_seen, now)
+        self.assertTrue(buffer.stats()["flusher_alive"])
+
+    @override_settings(DEVICE_LAST_SEEN_FLUSH_INTERVAL=60)
+    def test_shutdown_flush_tolerates_missing_table(self):
+        last_seen_buffer.touch(self.device.pk, timezone.now())
+        self.addCleanup(last_seen_buffer.clear)
+
+        with patch.object(
+            LastSeenBuffer, "shutdown", side_effect=OperationalError("no such table")
+        ), self.assertLogs("devices.presence", "WARNING") as logs:
+            _flush_on_shutdown()
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIsNone(logs.records[0].exc_info)
+
+
+class DeviceSyncTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="sync-device-token"
+        )
+
+    def _sync(self, payload, query=""):
+        return self.client.post(
+            f"/api/device/sync/{query}",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+        )
+
+    def test_sync_acks_stores_logs_and_returns_next_command(self):
+        done = DoorCommand.objects.create(device=self.device)
+        pending = DoorCommand.objects.create(device=self.device)
+
+        response = self._sync(
+            {
+                "acks": [done.id, 999999],
+                "logs": [
+                    {"message": "heartbeat", "event_type": "heartbeat"},
+                    {"level": "error"},
+                    "not a record",
+                ],
+            }
+        )
+
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["acks"], {str(done.id): "ok", "999999": "not_found"})
+        self.assertEqual(data["logs"]["accepted"], 1)
+        self.assertEqual([e["index"] for e in data["logs"]["errors"]], [1, 2])
+        self.assertEqual(data["command"]["command_id"], pending.id)
+        self.assertEqual(data["settings"]["poll_interval_ms"], 2000)
+        done.refresh_from_db()
+        self.assertTrue(done.executed)
+        self.assertEqual(DeviceLog.objects.get(device=self.device).message, "heartbeat")
+
+    def test_sync_returns_version_hints_without_content(self):
+        DeviceFirmware.objects.create(
+            device=self.device, version="2.0.0", content="print('hi')", config="{}"
+        )
+
+        data = self._sync({}).json()
+
+        self.assertEqual(data["firmware"]["version"], "2.0.0")
+        self.assertEqual(len(data["firmware"]["checksum"]), 64)
+        self.assertNotIn("content", data["firmware"])
+        self.assertEqual(data["command"], {"open": False})
+
+    def test_sync_rejects_non_object_payload(self):
+        response = self._sync([1, 2])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_sync_requires_token(self):
+        response = self.client.post("/api/device/sync/", data="{}", content_type="application/json")
+
+        self.assertEqual(response.status_code, 401)
+
+
+class PendingCommandIndexTests(TestCase):
+    def setUp(self):
+        pending_index.forget(42)
+        self.addCleanup(pending_index.forget, 42)
+
+    def test_unknown_device_requires_database_check(self):
+        generation, idle = pending_index.snapshot(42)
+
+        self.assertFalse(idle)
+        pending_index.mark_idle(42, generation)
+        self.assertEqual(pending_index.snapshot(42), (generation, True))
+
+    def test_command_queued_during_check_is_not_lost(self):
+        generation, _ = pending_index.snapshot(42)
+
+        pending_index.mark_pending(42)  # command committed while polling
+        pending_index.mark_idle(42, generation)  # poll saw an empty table
+
+        self.assertFalse(pending_index.snapshot(42)[1])
+
+    def test_evicted_generation_falls_back_to_database(self):
+        generation, _ = pending_index.snapshot(42)
+        pending_index.mark_idle(42, generation)
+
+        pending_index.cache.delete(f"{pending_index.key_prefix}:gen:42")
+
+        self.assertFalse(pending_index.snapshot(42)[1])
+
+    @override_settings(DEVICE_PENDING_IDLE_TTL=1)
+    def test_idle_marker_expires(self):
+        generation, _ = pending_index.snapshot(42)
+        pending_index.mark_idle(42, generation)
+
+        later = time.time() + 2
+        with patch("django.core.cache.backends.locmem.time.time", return_value=later):
+            self.assertFalse(pending_index.snapshot(42)[1])
+
+
+class SharedPendingIndexTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared = override_settings(
+            CACHES={
+                **settings.CACHES,
+                "shared": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cache_dir.name,
+                },
+            },
+            DEVICE_STATE_CACHE="shared",
+            DEVICE_PENDING_IDLE_TTL=1,
+            DEVICE_LAST_SEEN_FLUSH_INTERVAL=60,
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        self.addCleanup(last_seen_buffer.flush)
+        building = Building.objects.create(title="Shared Building")
+        self.device = Device.objects.create(building=building, api_token="shared-token")
+
+    def _poll(self):
+        return self.client.get(
+            "/api/device/command/", HTTP_X_DEVICE_TOKEN=self.device.api_token
+        )
+
+    def test_idle_marker_outlives_ttl_on_shared_cache(self):
+        self._poll()
+
+        later = time.time() + 5
+        with patch(
+            "django.core.cache.backends.filebased.time.time", return_value=later
+        ), self.assertNumQueries(0):
+            response = self._poll()
+
+        self.assertEqual(response.json(), {"open": False, "poll_interval_ms": 30000})
+
+
+class DeviceStateCacheCheckTests(TestCase):
+    @override_settings(DEBUG=False)
+    def test_process_local_cache_warns_without_debug(self):
+        messages = check_device_state_cache(None)
+
+        self.assertEqual([message.id for message in messages], ["devices.W001"])
+
+    @override_settings(DEBUG=True)
+    def test_debug_skips_check(self):
+        self.assertEqual(check_device_state_cache(None), [])
+
+    @override_settings(
+        DEBUG=False,
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://127.0.0.1:6379",
+            }
+        },
+    )
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_device_state_cache(None), [])
+
+
+class FirmwarePayloadTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="firmware-device-token"
+        )
+        self.firmware = DeviceFirmware.objects.create(
+            device=self.device,
+            version="2.0.0",
+            content="print('v2')",
+            config='{"pulse": 1}',
+            config_version="5",
+        )
+
+    def _get(self, **headers):
+        return self.client.get(
+            "/api/device/firmware/",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+            **headers,
+        )
+
+    def test_full_payload_without_version_headers(self):
+        response = self._get()
+
+        data = response.json()
+        self.assertEqual(data["content"], "print('v2')")
+        self.assertEqual(data["config"], '{"pulse": 1}')
+        self.assertEqual(response["ETag"], self.firmware.etag)
+
+    def test_matching_etag_returns_not_modified(self):
+        response = self._get(HTTP_IF_NONE_MATCH=self.firmware.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_up_to_date_device_gets_version_only_body(self):
+        response = self._get(HTTP_X_FIRMWARE_VERSION="2.0.0", HTTP_X_CONFIG_VERSION="5")
+
+        data = response.json()
+        self.assertTrue(data["unchanged"])
+        self.assertNotIn("content", data)
+        self.assertNotIn("config", data)
+
+    def test_only_changed_part_is_sent(self):
+        response = self._get(HTTP_X_FIRMWARE_VERSION="2.0.0", HTTP_X_CONFIG_VERSION="4")
+
+        data = response.json()
+        self.assertNotIn("content", data)
+        self.assertEqual(data["config"], '{"pulse": 1}')
+
+    def test_reported_versions_are_recorded_once(self):
+        self._get(HTTP_X_FIRMWARE_VERSION="1.0.0", HTTP_X_CONFIG_VERSION="4")
+
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.firmware_version, "1.0.0")
+        self.assertEqual(self.device.config_version, "4")
+        reported_at = self.device.versions_reported_at
+        self.assertIsNotNone(reported_at)
+
+        self._get(HTTP_X_FIRMWARE_VERSION="1.0.0", HTTP_X_CONFIG_VERSION="4")
+
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.versions_reported_at, reported_at)
+
+    def test_streaming_device_gets_download_reference(self):
+        response = self._get(HTTP_X_OTA_STREAM="1")
+
+        data = response.json()
+        self.assertNotIn("content", data)
+        self.assertEqual(data["content_size"], len("print('v2')"))
+        self.assertEqual(data["content_url"], "/api/device/firmware/raw/")
+
+
+class FirmwareRawTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="raw-device-token"
+        )
+        self.firmware = DeviceFirmware.objects.create(
+            device=self.device, version="3.0.0", content="0123456789"
+        )
+
+    def _get(self, **headers):
+        return self.client.get(
+            "/api/device/firmware/raw/",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+            **headers,
+        )
+
+    def test_full_body_advertises_ranges(self):
+        response = self._get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["X-Firmware-Checksum"], self.firmware.checksum)
+
+    def test_open_ended_range_resumes_download(self):
+        response = self._get(HTTP_RANGE="bytes=4-")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b"456789")
+        self.assertEqual(response["Content-Range"], "bytes 4-9/10")
+
+    def test_bounded_and_suffix_ranges(self):
+        self.assertEqual(self._get(HTTP_RANGE="bytes=2-4").content, b"234")
+        self.assertEqual(self._get(HTTP_RANGE="bytes=-3").content, b"789")
+
+    def test_range_past_end_is_unsatisfiable(self):
+        response = self._get(HTTP_RANGE="bytes=10-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_stale_if_range_returns_full_body(self):
+        response = self._get(HTTP_RANGE="bytes=4-", HTTP_IF_RANGE='"old-build"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"0123456789")
+
+    def test_matching_if_range_honours_range(self):
+        response = self._get(
+            HTTP_RANGE="bytes=8-", HTTP_IF_RANGE=f'"{self.firmware.checksum}"'
+        )
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b"89")
+
+
+def _apply_delta(base, delta):
+    """Reference implementation of the firmware's streaming delta apply."""
+
+    base_lines = base.encode().split(b"\n")
+    base_lines = [line + b"\n" for line in base_lines[:-1]] + (
+        [base_lines[-1]] if base_lines[-1] else []
+    )
+    header, _, body = delta.partition(b"\n")
+    output = []
+    while body:
+        line, _, body = body.partition(b"\n")
+        op = json.loads(line)
+        if op["op"] == "copy":
+            output.extend(base_lines[op["start"] : op["start"] + op["count"]])
+        else:
+            output.append(body[: op["size"]])
+            body = body[op["size"] :]
+    return json.loads(header), b"".join(output)
+
+
+class FirmwareDeltaTests(TestCase):
+    base = "".join(f"line {i}\n" for i in range(200))
+
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="delta-device-token"
+        )
+        self.firmware = DeviceFirmware.objects.create(
+            device=self.device, version="1.0.0", content=self.base
+        )
+        self.base_checksum = self.firmware.checksum
+        self.firmware.version = "1.1.0"
+        self.firmware.content = (
+            self.base.replace("line 10\n", "line ten\n").replace("line 150\n", "")
+            + "tail"
+        )
+        self.firmware.save()
+
+    def _get(self, path, **headers):
+        return self.client.get(
+            path, HTTP_X_DEVICE_TOKEN=self.device.api_token, **headers
+        )
+
+    def test_saving_firmware_archives_each_release(self):
+        self.assertEqual(
+            set(FirmwareRelease.objects.values_list("checksum", flat=True)),
+            {self.base_checksum, self.firmware.checksum},
+        )
+
+    def test_payload_links_delta_for_archived_base(self):
+        response = self._get(
+            "/api/device/firmware/",
+            HTTP_X_OTA_STREAM="1",
+            HTTP_X_FIRMWARE_CHECKSUM=self.base_checksum,
+        )
+
+        self.assertEqual(
+            response.json()["delta_url"],
+            f"/api/device/firmware/delta/?base={self.base_checksum}",
+        )
+
+    def test_delta_reproduces_target(self):
+        response = self._get(f"/api/device/firmware/delta/?base={self.base_checksum}")
+
+        self.assertEqual(response.status_code, 200)
+        target = self.firmware.firmware_content
+        self.assertLess(len(response.content), len(target))
+        header, content = _apply_delta(self.base, response.content)
+        self.assertEqual(header["target"], self.firmware.checksum)
+        self.assertEqual(header["size"], len(content))
+        self.assertEqual(content.decode(), target)
+
+    def test_unknown_base_falls_back(self):
+        response = self._get("/api/device/firmware/delta/?base=unknown")
+
+        self.assertEqual(response.status_code, 404)
+        payload = self._get(
+            "/api/device/firmware/",
+            HTTP_X_OTA_STREAM="1",
+            HTTP_X_FIRMWARE_CHECKSUM="unknown",
+        ).json()
+        self.assertNotIn("delta_url", payload)
+
+
+class FirmwareReleaseStoreTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Test Building")
+        self.devices = [
+            Device.objects.create(building=self.building, api_token=f"store-{i}")
+            for i in range(3)
+        ]
+        release_body_cache.clear()
+
+    def test_same_content_is_stored_once(self):
+        for device in self.devices:
+            DeviceFirmware.objects.create(
+                device=device, version="4.0.0", content="print('v4')"
+            )
+
+        self.assertEqual(FirmwareRelease.objects.count(), 1)
+        release = FirmwareRelease.objects.get()
+        self.assertEqual(release.size, len("print('v4')"))
+        self.assertEqual(
+            set(DeviceFirmware.objects.values_list("release_id", "content")),
+            {(release.pk, "")},
+        )
+
+    def test_assigning_release_pointer_fills_version_and_checksum(self):
+        release = FirmwareRelease.store("print('v5')", "5.0.0")
+
+        firmware = DeviceFirmware.objects.create(device=self.devices[0], release=release)
+
+        self.assertEqual(firmware.version, "5.0.0")
+        self.assertEqual(firmware.checksum, release.checksum)
+
+    def test_raw_body_is_served_from_release_cache(self):
+        for device in self.devices[:2]:
+            DeviceFirmware.objects.create(
+                device=device, version="4.0.0", content="print('v4')"
+            )
+        self.client.get(
+            "/api/device/firmware/raw/", HTTP_X_DEVICE_TOKEN=self.devices[0].api_token
+        )
+
+        # Token and firmware row lookups only; the release text is not re-read.
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                "/api/device/firmware/raw/",
+                HTTP_X_DEVICE_TOKEN=self.devices[1].api_token,
+            )
+        self.assertEqual(response.content, b"print('v4')")
+
+    def test_raw_body_is_gzipped_when_accepted(self):
+        DeviceFirmware.objects.create(
+            device=self.devices[0], version="4.0.0", content="print('v4')\n" * 50
+        )
+
+        response = self.client.get(
+            "/api/device/firmware/raw/",
+            HTTP_X_DEVICE_TOKEN=self.devices[0].api_token,
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), b"print('v4')\n" * 50)
+
+    def test_body_cache_evicts_to_budget(self):
+        cache = ReleaseBodyCache(max_bytes=10)
+        cache.body("a", lambda: "123456")
+        cache.body("b", lambda: "123456")
+
+        self.assertEqual(cache.stats()["releases"], 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_command_migrates_inline_rows(self):
+        for device in self.devices:
+            firmware = DeviceFirmware.objects.create(device=device, version="3.0.0")
+            DeviceFirmware.objects.filter(pk=firmware.pk).update(
+                content="print('legacy')", config='{"a": 1}'
+            )
+
+        call_command("migrate_firmware_releases", stdout=io.StringIO())
+
+        self.assertEqual(FirmwareRelease.objects.count(), 2)
+        self.assertFalse(
+            DeviceFirmware.objects.exclude(content="", config="").exists()
+        )
+        firmware = DeviceFirmware.objects.select_related("release").first()
+        self.assertEqual(firmware.firmware_content, "print('legacy')")
+        self.assertEqual(firmware.config_content, '{"a": 1}')
+
+    def test_admin_cannot_add_releases(self):
+        admin = User.objects.create_superuser(username="release-admin", password="pass")
+        self.client.force_login(admin)
+
+        response = self.client.get("/admin/devices/firmwarerelease/add/")
+
+        self.assertEqual(response.status_code, 403)
+
+
+class FirmwareRolloutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.building = Building.objects.create(title="Rollout Building")
+        self.other_building = Building.objects.create(title="Other Building")
+        self.devices = [
+            Device.objects.create(building=self.building, api_token=f"rollout-{i}")
+            for i in range(4)
+        ]
+        self.outsider = Device.objects.create(
+            building=self.other_building, api_token="rollout-outsider"
+        )
+        self.release = FirmwareRelease.store("print('v6')", "6.0.0")
+
+    def _rollout(self, **kwargs):
+        rollout = FirmwareRollout.objects.create(release=self.release, **kwargs)
+        rollout.buildings.add(self.building)
+        return rollout
+
+    def _payload(self, device, version="5.0.0"):
+        return self.client.get(
+            "/api/device/firmware/",
+            HTTP_X_DEVICE_TOKEN=device.api_token,
+            HTTP_X_FIRMWARE_VERSION=version,
+            HTTP_X_OTA_STREAM="1",
+        )
+
+    def test_admits_devices_by_building_and_percentage(self):
+        rollout = self._rollout(percentage=50)
+
+        admitted = advance_rollout(rollout)
+
+        expected = {
+            device.pk
+            for device in self.devices
+            if rollout_bucket(rollout.pk, device.pk) < 50
+        }
+        self.assertEqual(admitted, len(expected))
+        self.assertEqual(
+            set(
+                DeviceFirmware.objects.filter(rollout=rollout).values_list(
+                    "device_id", flat=True
+                )
+            ),
+            expected,
+        )
+        self.assertFalse(DeviceFirmware.objects.filter(device=self.outsider).exists())
+
+    def test_download_slots_cap_concurrent_fetches(self):
+        rollout = self._rollout(percentage=100, max_concurrent_downloads=1)
+        advance_rollout(rollout)
+        first, second = self.devices[:2]
+
+        granted = self._payload(first)
+        deferred = self._payload(second)
+
+        self.assertIn("content_url", granted.json())
+        self.assertNotIn("unchanged", granted.json())
+        data = deferred.json()
+        self.assertTrue(data["deferred"])
+        self.assertIn("retry_after_ms", data)
+        self.assertNotIn("content_url", data)
+        self.assertFalse(deferred.has_header("ETag"))
+
+        # Reporting the new build releases the slot for the next device.
+        self._payload(first, version="6.0.0")
+        self.assertIn("content_url", self._payload(second).json())
+
+    def test_pauses_when_upgraded_devices_go_silent(self):
+        rollout = self._rollout(percentage=100, heartbeat_timeout_seconds=60)
+        advance_rollout(rollout)
+        Device.objects.filter(pk=self.devices[0].pk).update(
+            firmware_version="6.0.0",
+            last_seen=timezone.now() - timedelta(minutes=5),
+        )
+
+        advance_rollout(rollout)
+
+        rollout.refresh_from_db()
+        self.assertEqual(rollout.status, FirmwareRollout.Status.PAUSED)
+        self.assertTrue(self._payload(self.devices[1]).json()["deferred"])
+
+    def test_completes_when_every_device_reports_release(self):
+        rollout = self._rollout(percentage=100)
+        advance_rollout(rollout)
+        Device.objects.filter(building=self.building).update(
+            firmware_version="6.0.0", last_seen=timezone.now()
+        )
+
+        advance_rollout(rollout)
+
+        rollout.refresh_from_db()
+        self.assertEqual(rollout.status, FirmwareRollout.Status.COMPLETED)
+
+    def test_sync_hints_carry_jittered_check_delay(self):
+        rollout = self._rollout(percentage=100)
+        advance_rollout(rollout)
+
+        with self.settings(DEVICE_OTA_JITTER_MS=1000):
+            response = self.client.post(
+                "/api/device/sync/",
+                data="{}",
+                content_type="application/json",
+                HTTP_X_DEVICE_TOKEN=self.devices[0].api_token,
+                HTTP_X_FIRMWARE_VERSION="5.0.0",
+            )
+
+        check_in_ms = response.json()["firmware"]["check_in_ms"]
+        self.assertTrue(0 <= check_in_ms <= 1000)
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_callers_share_one_computation(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return b"body"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(flight.stats()["in_flight"], 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [b"body"] * 4)
+        self.assertEqual(flight.do("k", compute), b"body")
+        self.assertEqual(flight.stats()["hits"], 1)
+
+    def test_errors_are_not_cached(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            flight.do("k", fail)
+        self.assertEqual(flight.do("k", lambda: b"ok"), b"ok")
+        self.assertEqual(flight.stats()["errors"], 1)
+
+    def test_results_stay_within_memory_budget(self):
+        flight = SingleFlight(max_bytes=10)
+        flight.do("a", lambda: b"123456")
+        flight.do("b", lambda: b"123456")
+        flight.do("big", lambda: b"x" * 11)
+
+        stats = flight.stats()
+        self.assertEqual((stats["entries"], stats["bytes"]), (1, 6))
+        self.assertEqual(stats["evictions"], 1)
+
+    def test_identical_firmware_payloads_reuse_one_body(self):
+        building = Building.objects.create(title="Flight Building")
+        devices = [
+            Device.objects.create(building=building, api_token=f"flight-{i}")
+            for i in range(2)
+        ]
+        for device in devices:
+            DeviceFirmware.objects.create(
+                device=device, version="7.0.0", content="print('v7')"
+            )
+        response_flight.clear()
+        before = response_flight.stats()
+
+        bodies = [
+            self.client.get(
+                "/api/device/firmware/", HTTP_X_DEVICE_TOKEN=device.api_token
+            ).content
+            for device in devices
+        ]
+
+        after = response_flight.stats()
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertEqual(after["executions"] - before["executions"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.building = Building.objects.create(title="Limited Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="limited-token"
+        )
+        # Freeze the clock 0.5s into a window so counts never straddle two.
+        clock = patch("devices.ratelimit.time.time", return_value=1000.5)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def _log(self, token="limited-token"):
+        return self.client.post(
+            "/api/device/logs/",
+            data=json.dumps({"message": "spam"}),
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=token,
+        )
+
+    @override_settings(RATE_LIMITS={"device_logs": (60, 2)})
+    def test_requests_over_burst_get_retry_after(self):
+        statuses = [self._log().status_code for _ in range(3)]
+        response = self._log()
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(DeviceLog.objects.count(), 2)
+
+    @override_settings(RATE_LIMITS={"device_logs": (60, 1)})
+    def test_buckets_are_per_device(self):
+        Device.objects.create(building=self.building, api_token="other-token")
+
+        self.assertEqual(self._log().status_code, 200)
+        self.assertEqual(self._log().status_code, 429)
+        self.assertEqual(self._log("other-token").status_code, 200)
+
+    @override_settings(RATE_LIMITS={"device_logs": (60, 1)})
+    def test_allowance_resets_each_window(self):
+        with patch("devices.ratelimit.time.time", return_value=1000.25):
+            self.assertEqual(rate_limiter.hit("device_logs", "refill"), 0)
+            self.assertEqual(rate_limiter.hit("device_logs", "refill"), 0.75)
+
+        with patch("devices.ratelimit.time.time", return_value=1001.0):
+            self.assertEqual(rate_limiter.hit("device_logs", "refill"), 0)
+
+    @override_settings(RATE_LIMITS={"device_logs": (60, 1)})
+    def test_unknown_tokens_share_the_client_address_limit(self):
+        self.assertEqual(self._log("unknown-1").status_code, 401)
+        self.assertEqual(self._log("unknown-2").status_code, 429)
+        self.assertEqual(self._log().status_code, 200)
+
+    @override_settings(RATE_LIMITS={})
+    def test_unconfigured_scopes_are_not_limited(self):
+        self.assertTrue(all(self._log().status_code == 200 for _ in range(5)))
+
+    @override_settings(RATE_LIMITS={"door_open": (60, 1)})
+    def test_door_presses_are_limited_per_user(self):
+        head = User.objects.create_user(
+            username="limited-head", password="pass", role=User.Roles.HEAD
+        )
+        self.client.force_login(head)
+
+        self.assertEqual(self.client.post("/door/").status_code, 302)
+        limited = self.client.post("/door/", follow=True)
+        self.assertRedirects(limited, "/door/")
+        self.assertEqual(limited.redirect_chain[0][1], 302)
+        self.assertIn("Too many door requests", limited.content.decode())
+
+        response = self.client.post("/door/")
+        self.assertEqual(response.status_code, 302)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(self.client.get("/door/").status_code, 200)
+
+
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Busy Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="busy-device"
+        )
+
+    @override_settings(
+        DEVICE_ADMISSION_MAX_IN_FLIGHT=0, DEVICE_SHED_POLL_AFTER_MS=9000
+    )
+    def test_requests_over_capacity_are_shed_with_hint(self):
+        before = admission.stats()["shed"]
+
+        response = self.client.get(
+            "/api/device/command/", HTTP_X_DEVICE_TOKEN="busy-device"
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(response.json()["poll_after_ms"], 9000)
+        self.assertGreaterEqual(int(response["Retry-After"]), 9)
+        self.assertEqual(admission.stats()["shed"], before + 1)
+
+    @override_settings(DEVICE_ADMISSION_LATENCY_TARGET=0.1)
+    def test_slow_responses_shed_until_a_probe_is_due(self):
+        controller = AdmissionController()
+        self.assertTrue(controller.try_enter())
+        controller.leave(5.0)
+
+        self.assertFalse(controller.try_enter())
+        controller._last_sample -= controller.probe_interval
+        self.assertTrue(controller.try_enter())
+        self.assertFalse(controller.try_enter())
+        self.assertEqual(controller.stats()["probes"], 1)
+        self.assertTrue(controller.stats()["shedding"])
+
+    def test_held_long_polls_do_not_count_as_working(self):
+        seen = []
+
+        @shed_under_load
+        def view(request):
+            with admission.holding():
+                seen.append(admission.stats())
+            return HttpResponse()
+
+        before = admission.stats()
+        view(RequestFactory().get("/api/device/command/", {"wait": "5"}))
+
+        self.assertEqual(seen[0]["in_flight"], before["in_flight"])
+        self.assertEqual(seen[0]["long_polls"], before["long_polls"] + 1)
+        self.assertEqual(seen[0]["held"], before["held"] + 1)
+        self.assertEqual(admission.stats()["in_flight"], before["in_flight"])
+        self.assertEqual(admission.stats()["long_polls"], before["long_polls"])
+
+    @override_settings(
+        DEVICE_ADMISSION_MAX_IN_FLIGHT=1, DEVICE_ADMISSION_MAX_LONG_POLLS=2
+    )
+    def test_long_polls_have_their_own_limit(self):
+        controller = AdmissionController()
+        self.assertTrue(controller.try_enter())
+        self.assertFalse(controller.try_enter())
+
+        self.assertTrue(controller.try_enter(long_poll=True))
+        self.assertTrue(controller.try_enter(long_poll=True))
+        self.assertFalse(controller.try_enter(long_poll=True))
+
+        controller.leave(0.01, long_poll=True)
+        self.assertTrue(controller.try_enter(long_poll=True))
+        self.assertEqual(controller.stats()["in_flight"], 1)
+
+    @override_settings(
+        DEVICE_ADMISSION_LATENCY_TARGET=1.0,
+        DEVICE_POLL_INTERVAL_MS=2000,
+        DEVICE_SHED_POLL_AFTER_MS=10000,
+    )
+    def test_poll_hint_stretches_with_load(self):
+        controller = AdmissionController()
+        self.assertEqual(controller.poll_after_ms(), 2000)
+
+        controller._latency = 0.75
+        self.assertEqual(controller.poll_after_ms(), 6000)
+        controller._latency = 2.0
+        self.assertEqual(controller.poll_after_ms(), 10000)
+
+
+class DeviceWebSocketTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.building = Building.objects.create(title="Socket Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="socket-device-token"
+        )
+
+    async def _connect(self, token="socket-device-token", path="/api/device/ws/"):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        await inbox.put({"type": "websocket.connect"})
+        scope = {
+            "type": "websocket",
+            "path": path,
+            "headers": [(b"x-device-token", token.encode())],
+            "client": ("10.0.0.5", 5000),
+        }
+        task = asyncio.ensure_future(device_websocket(scope, inbox.get, outbox.put))
+        return task, inbox, outbox
+
+    async def _send_frame(self, inbox, frame):
+        await inbox.put({"type": "websocket.receive", "text": json.dumps(frame)})
+
+    async def _next_frame(self, outbox):
+        message = await asyncio.wait_for(outbox.get(), timeout=5)
+        self.assertEqual(message["type"], "websocket.send")
+        return json.loads(message["text"])
+
+    async def _close(self, task, inbox):
+        await inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(task, timeout=5)
+
+    async def test_unknown_token_is_refused(self):
+        task, _, outbox = await self._connect(token="nope")
+
+        await asyncio.wait_for(task, timeout=5)
+
+        self.assertEqual(outbox.get_nowait(), {"type": "websocket.close"})
+
+    async def test_pending_command_is_pushed_and_acked_over_socket(self):
+        command = await DoorCommand.objects.acreate(device=self.device)
+        task, inbox, outbox = await self._connect()
+
+        self.assertEqual((await outbox.get())["type"], "websocket.accept")
+        self.assertEqual((await self._next_frame(outbox))["type"], "hello")
+        pushed = await self._next_frame(outbox)
+        self.assertEqual(pushed["command"]["command_id"], command.id)
+
+        await self._send_frame(inbox, {"type": "ack", "command_id": command.id})
+        ack = await self._next_frame(outbox)
+        await self._close(task, inbox)
+
+        self.assertEqual(ack["status"], "ok")
+        await command.arefresh_from_db()
+        self.assertTrue(command.executed)
+
+    @override_settings(DEVICE_WS_RECHECK_INTERVAL=30)
+    async def test_published_command_is_pushed_once(self):
+        task, inbox, outbox = await self._connect()
+        await outbox.get()
+        await self._next_frame(outbox)
+
+        command = await DoorCommand.objects.acreate(device=self.device)
+        views.command_notifier.publish(self.device.id)
+        pushed = await self._next_frame(outbox)
+        views.command_notifier.publish(self.device.id)
+        await self._send_frame(inbox, {"type": "ping"})
+        pong = await self._next_frame(outbox)
+        await self._close(task, inbox)
+
+        self.assertEqual(pushed["command"]["command_id"], command.id)
+        self.assertEqual(pong, {"type": "pong"})
+        self.assertTrue(outbox.empty())
+
+    @override_settings(DEVICE_WS_RECHECK_INTERVAL=30)
+    async def test_frames_do_not_recheck_commands(self):
+        with patch(
+            "devices.websocket._unsent_commands", wraps=websocket._unsent_commands
+        ) as unsent:
+            task, inbox, outbox = await self._connect()
+            await outbox.get()
+            await self._next_frame(outbox)
+            for _ in range(3):
+                await self._send_frame(inbox, {"type": "ping"})
+                await self._next_frame(outbox)
+            await self._close(task, inbox)
+
+        self.assertEqual(unsent.call_count, 1)
+
+    def test_unchanged_generation_skips_database(self):
+        command = DoorCommand.objects.create(device=self.device)
+        sent = set()
+        generation, pushed = websocket._unsent_commands(self.device, sent)
+
+        with patch.object(
+            type(pending_index), "process_local", new_callable=PropertyMock
+        ) as process_local, self.assertNumQueries(0):
+            process_local.return_value = False
+            self.assertEqual(
+                websocket._unsent_commands(self.device, sent, generation),
+                (generation, []),
+            )
+        self.assertEqual(pushed, [command])
+
+    async def test_firmware_change_sends_new_hints(self):
+        task, inbox, outbox = await self._connect()
+        await outbox.get()
+        hello = await self._next_frame(outbox)
+
+        await DeviceFirmware.objects.acreate(
+            device=self.device, version="2.0.0", content="print('v2')"
+        )
+        views.command_notifier.publish(self.device.id)
+        notice = await self._next_frame(outbox)
+        await self._close(task, inbox)
+
+        self.assertEqual(hello["firmware"], {})
+        self.assertIn("heartbeat_ms", hello["settings"])
+        self.assertEqual(notice["type"], "firmware")
+        self.assertEqual(notice["firmware"]["version"], "2.0.0")
+
+    async def test_logs_are_stored_from_socket_frames(self):
+        task, inbox, outbox = await self._connect()
+        await outbox.get()
+        await self._next_frame(outbox)
+
+        await self._send_frame(
+            inbox, {"type": "logs", "logs": [{"message": "over socket"}]}
+        )
+        reply = await self._next_frame(outbox)
+        await self._close(task, inbox)
+
+        self.assertEqual(reply["accepted"], 1)
+        log = await DeviceLog.objects.aget(message="over socket")
+        self.assertEqual(log.metadata["remote_addr"], "10.0.0.5")
+
+
+@override_settings(DEVICE_LOG_QUEUE_BATCH_SIZE=2, DEVICE_LOG_QUEUE_MAX_SIZE=4)
+class LogWriteQueueTests(TestCase):
+    def setUp(self):
+        self.building = Building.objects.create(title="Queue Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="queue-device-token"
+        )
+        self.queue = LogWriteQueue(autostart=False)
+
+    def _logs(self, count):
+        return [
+            DeviceLog(device=self.device, message=f"queued {index}")
+            for index in range(count)
+        ]
+
+    def test_flush_writes_in_batches(self):
+        self.assertTrue(self.queue.offer(self._logs(3)))
+        self.assertEqual(DeviceLog.objects.count(), 0)
+
+        self.assertEqual(self.queue.flush(), 3)
+
+        self.assertEqual(DeviceLog.objects.count(), 3)
+        stats = self.queue.stats()
+        self.assertEqual(stats["depth"], 0)
+        self.assertEqual(stats["batches"], 2)
+        self.assertEqual(stats["max_batch"], 2)
+        self.assertEqual(stats["last_batch"], 1)
+
+    def test_full_queue_refuses_whole_request(self):
+        self.assertTrue(self.queue.offer(self._logs(3)))
+
+        self.assertFalse(self.queue.offer(self._logs(2)))
+
+        stats = self.queue.stats()
+        self.assertEqual(stats["depth"], 3)
+        self.assertEqual(stats["rejected"], 2)
+
+    def test_shutdown_drains_queue(self):
+        self.queue.offer(self._logs(2))
+
+        self.assertEqual(self.queue.shutdown(), 2)
+
+        self.assertEqual(DeviceLog.objects.count(), 2)
+
+    def test_failed_batch_is_requeued_and_written(self):
+        self.queue.offer(self._logs(2))
+        failures = [OperationalError("database is locked")]
+
+        def insert_once_locked(batch):
+            if failures:
+                raise failures.pop()
+            insert_logs(batch)
+
+        with patch("devices.rollups.insert_logs", side_effect=insert_once_locked):
+            with self.assertLogs("devices.log_queue", "WARNING"):
+                self.assertEqual(self.queue.flush(), 0)
+            self.assertEqual(self.queue.stats()["depth"], 2)
+
+            self.assertEqual(self.queue.flush(), 2)
+
+        self.assertEqual(DeviceLog.objects.count(), 2)
+        stats = self.queue.stats()
+        self.assertEqual((stats["retried"], stats["failed"]), (2, 0))
+
+    def test_permanent_error_drops_batch(self):
+        self.queue.offer(self._logs(2))
+
+        with patch("devices.rollups.insert_logs", side_effect=ValueError("bad row")):
+            with self.assertLogs("devices.log_queue", "ERROR"):
+                self.queue.flush()
+
+        stats = self.queue.stats()
+        self.assertEqual((stats["depth"], stats["failed"]), (0, 2))
+
+
+@override_settings(DEVICE_LOG_QUEUE_ENABLED=True, DEVICE_LOG_QUEUE_FLUSH_INTERVAL=0.05)
+class WriteBehindIngestTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.building = Building.objects.create(title="Write-behind Building")
+        self.device = Device.objects.create(
+            building=self.building, api_token="write-behind-token"
+        )
+        self.addCleanup(log_write_queue.flush)
+
+    def _post(self, path, payload):
+        return self.client.post(
+            path,
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+        )
+
+    def test_background_writer_stores_queued_logs(self):
+        written = log_write_queue.stats()["written"]
+        response = self._post(
+            "/api/device/logs/", [{"message": "one"}, {"message": "two"}]
+        )
+
+        self.assertEqual(response.json()["accepted"], 2)
+        # Wait on the queue's counters: reading the table while the writer
+        # inserts can itself hit a table lock on the shared-cache test DB.
+        deadline = time.monotonic() + 5
+        while (
+            log_write_queue.stats()["written"] < written + 2
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.02)
+        self.assertEqual(DeviceLog.objects.count(), 2)
+        self.assertTrue(log_write_queue.stats()["writer_alive"])
+
+    @override_settings(DEVICE_LOG_QUEUE_MAX_SIZE=0)
+    def test_full_queue_answers_503_with_retry_hint(self):
+        response = self._post("/api/device/logs/", {"message": "dropped"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["poll_after_ms"], 5000)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertFalse(DeviceLog.objects.exists())
+
+    @override_settings(DEVICE_LOG_QUEUE_MAX_SIZE=0)
+    def test_sync_applies_acks_when_log_queue_is_full(self):
+        command = DoorCommand.objects.create(device=self.device)
+
+        response = self._post(
+            "/api/device/sync/", {"acks": [command.id], "logs": [{"message": "x"}]}
+        )
+
+        body = response.json()
+        self.assertEqual(body["acks"], {str(command.id): "ok"})
+        self.assertEqual(body["logs"]["accepted"], 0)
+        self.assertEqual(body["logs"]["retry_after_ms"], 5000)
+
+
+class LogRollupTests(TestCase):
+    def setUp(self):
+        self.head = User.objects.create_user(
+            username="rollup-head", password="pass", role=User.Roles.HEAD
+        )
+        self.building = Building.objects.create(title="Rollup Building")
+        Household.objects.create(
+            title="Rollup Home", head=self.head, building=self.building
+        )
+        self.device = Device.objects.create(
+            building=self.building, api_token="rollup-device-token"
+        )
+        self.addCleanup(last_seen_buffer.flush)
+
+    def _post_logs(self, payload):
+        return self.client.post(
+            "/api/device/logs/",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_X_DEVICE_TOKEN=self.device.api_token,
+        )
+
+    def _counts(self):
+        return {
+            (row.level, row.event_type): row.count
+            for row in DeviceLogRollup.objects.filter(device=self.device)
+        }
+
+    def test_ingest_keeps_hourly_counts(self):
+        self._post_logs([{"message": "a", "event_type": "heartbeat"}] * 2)
+        self._post_logs({"message": "b", "level": "ERROR", "event_type": "relay"})
+        self._post_logs({"message": "c", "event_type": "heartbeat"})
+
+        self.assertEqual(
+            self._counts(), {("info", "heartbeat"): 3, ("error", "relay"): 1}
+        )
+        self.assertEqual(rollup_mismatches(), [])
+
+    def test_deleting_logs_updates_rollups(self):
+        self._post_logs([{"message": "a"}, {"message": "b", "level": "warning"}])
+
+        DeviceLog.objects.filter(message="a").delete()
+
+        self.assertEqual(self._counts(), {("warning", ""): 1})
+
+    def test_bulk_delete_stays_a_few_queries(self):
+        self._post_logs([{"message": "bulk", "event_type": "heartbeat"}] * 50)
+        self._post_logs([{"message": "bulk", "level": "error"}] * 5)
+        self._post_logs({"message": "kept", "level": "error"})
+
+        with self.assertNumQueries(4):
+            deleted, _ = DeviceLog.objects.filter(message="bulk").delete()
+
+        self.assertEqual(deleted, 55)
+        self.assertEqual(self._counts(), {("error", ""): 1})
+        self.assertEqual(rollup_mismatches(), [])
+
+    def test_deleting_one_log_updates_rollups(self):
+        self._post_logs([{"message": "a"}, {"message": "b"}])
+
+        DeviceLog.objects.get(message="a").delete()
+
+        self.assertEqual(self._counts(), {("info", ""): 1})
+        self.assertEqual(rollup_mismatches(), [])
+
+    def test_log_page_reads_breakdowns_from_rollups(self):
+        self._post_logs([{"message": "a", "event_type": "boot"}] * 3)
+        self.client.force_login(self.head)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/devices/logs/")
+
+        self.assertFalse(
+            [q for q in queries if 'COUNT("devices_devicelog"' in q["sql"]]
+        )
+        self.assertEqual(
+            list(response.context["level_breakdown"]), [{"level": "info", "count": 3}]
+        )
+        self.assertEqual(
+            list(response.context["event_breakdown"]),
+            [{"event_type": "boot", "count": 3}],
+        )
+
+    def test_backfill_rebuilds_and_check_reports_drift(self):
+        DeviceLog.objects.bulk_create(
+            [DeviceLog(device=self.device, message="raw", level="info")] * 2
+        )
+        with self.assertRaises(CommandError):
+            call_command("backfill_log_rollups", check=True, stdout=io.StringIO())
+
+        call_command("backfill_log_rollups", stdout=io.StringIO())
+
+        self.assertEqual(self._counts(), {("info", ""): 2})
+        output = io.StringIO()
+        call_command("backfill_log_rollups", check=True, stdout=output)
+        self.assertIn("match", output.getvalue())
+
+
+@override_settings(DEVICE_LOG_PAGE_SIZE=2)
+class DeviceLogPaginationTests(TestCase):
+    def setUp(self):
+        self.head = User.objects.create_user(
+            username="pages-head", password="pass", role=User.Roles.HEAD
+        )
+        self.building = Building.objects.create(title="Pages Building")
+        Household.objects.create(
+            title="Pages Home", head=self.head, building=self.building
+        )
+        self.device = Device.objects.create(
+            building=self.building, api_token="pages-device-token"
+        )
+        self.other = Device.objects.create(
+            building=self.building, api_token="pages-other-token"
+        )
+        self.now = timezone.now()
+        # Three logs share a timestamp so pages must break ties on id.
+        self.logs = DeviceLog.objects.bulk_create(
+            [
+                DeviceLog(device=self.device, message=f"log {index}", created_at=when)
+                for index, when in enumerate(
+                    [self.now] * 3 + [self.now - timedelta(days=2)]
+                )
+            ]
+            + [
+                DeviceLog(
+                    device=self.other,
+                    level="error",
+                    message="relay stuck",
+                    created_at=self.now - timedelta(hours=1),
+                )
+            ]
+        )
+        self.client.force_login(self.head)
+
+    def _page(self, **params):
+        return self.client.get("/devices/logs/", {"format": "json", **params}).json()
+
+    def _query_plan(self, **params):
+        household = Household.objects.get(head=self.head)
+        queryset = (
+            views._filtered_device_logs(household, params)
+            .select_related("device")
+            .order_by("-created_at", "-id")[:201]
+        )
+        sql, sql_params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", sql_params)
+            return " | ".join(row[-1] for row in cursor.fetchall())
+
+    def test_pages_are_read_in_index_order(self):
+        for params in ({}, {"device": str(self.device.pk)}, {"level": "error"}):
+            with self.subTest(params=params):
+                plan = self._query_plan(**params)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_cursor_walks_every_log_once(self):
+        seen, cursor = [], None
+        while True:
+            page = self._page(**({"cursor": cursor} if cursor else {}))
+            seen.extend(row["id"] for row in page["results"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        expected = DeviceLog.objects.order_by("-created_at", "-id")
+        self.assertEqual(seen, [log.id for log in expected])
+
+    def test_filters_by_device_level_and_time(self):
+        self.assertEqual(
+            [row["message"] for row in self._page(level="ERROR")["results"]],
+            ["relay stuck"],
+        )
+        self.assertEqual(
+            [row["device"] for row in self._page(device=self.other.pk)["results"]],
+            [self.other.pk],
+        )
+        older = self._page(until=(self.now - timedelta(days=1)).isoformat())
+        self.assertEqual([row["message"] for row in older["results"]], ["log 3"])
+
+    def test_next_link_keeps_filters(self):
+        response = self.client.get("/devices/logs/", {"device": self.device.pk})
+
+        self.assertEqual(len(response.context["logs"]), 2)
+        self.assertIn(f"device={self.device.pk}", response.context["next_url"])
+        self.assertIn("cursor=", response.context["next_url"])
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        self.assertEqual(
+            self._page(cursor="not-a-cursor")["results"], self._page()["results"]
+        )
+
+
+class LogExportTests(TestCase):
+    def setUp(self):
+        self.head = User.objects.create_user(
+            username="export-head", password="pass", role=User.Roles.HEAD
+        )
+        self.building = Building.objects.create(title="Export Building")
+        Household.objects.create(
+            title="Export Home", head=self.head, building=self.building
+        )
+        self.device = Device.objects.create(
+            building=self.building, api_token="export-device-token"
+        )
+        now = timezone.now()
+        DeviceLog.objects.bulk_create(
+            [
+                DeviceLog(
+                    device=self.device,
+                    level="info",
+                    event_type="heartbeat",
+                    message="tick, tock",
+                    metadata={"rssi": -60},
+                    created_at=now - timedelta(days=3),
+                ),
+                DeviceLog(
+                    device=self.device, level="error", message="relay", created_at=now
+                ),
+            ]
+        )
+        self.client.force_login(self.head)
+
+    def _export(self, **params):
+        response = self.client.get("/devices/logs/export/", params)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_export_streams_rows_oldest_first(self):
+        response, body = self._export()
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0][:3], ["id", "device", "level"])
+        self.assertEqual([row[5] for row in rows[1:]], ["tick, tock", "relay"])
+        self.assertEqual(json.loads(rows[1][6]), {"rssi": -60})
+
+    def test_gzipped_ndjson_export_with_filters(self):
+        response, body = self._export(format="ndjson", gzip="1", level="error")
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith('.ndjson.gz"'))
+        rows = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+        self.assertEqual([row["message"] for row in rows], ["relay"])
+
+    def test_date_range_filter(self):
+        until = (timezone.now() - timedelta(days=1)).isoformat()
+
+        _, body = self._export(format="ndjson", until=until)
+
+        self.assertEqual(
+            [json.loads(line)["message"] for line in body.splitlines()], ["tick, tock"]
+        )
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get("/devices/logs/export/", {"format": "xml"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command_writes_gzip_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/logs.csv.gz"
+            call_command(
+                "export_logs",
+                "device",
+                "--gzip",
+                "--output",
+                path,
+                stdout=io.StringIO(),
+            )
+            with gzip.open(path, "rt") as handle:
+                rows = list(csv.reader(handle))
+
+        self.assertEqual(len(rows), 3)
+
+    def test_export_command_streams_ndjson_to_stdout(self):
+        output = io.StringIO()
+
+        call_command(
+            "export_logs",
+            "device",
+            "--format",
+            "ndjson",
+            "--building",
+            str(self.building.pk),
+            stdout=output,
+        )
+
+        self.assertEqual(len(output.getvalue().splitlines()), 2)
+
+
+class DeviceLogSearchTests(TestCase):
+    def setUp(self):
+        self.head = User.objects.create_user(
+            username="search-head", password="pass", role=User.Roles.HEAD
+        )
+        self.building = Building.objects.create(title="Search Building")
+        Household.objects.create(
+            title="Search Home", head=self.head, building=self.building
+        )
+        self.device = Device.objects.create(
+            building=self.building, api_token="search-device-token"
+        )
+        self.relay = DeviceLog.objects.create(
+            device=self.device,
+            message="Relay pulse finished",
+            metadata={"wifi": {"ssid": "Lobby-AP", "rssi": -71}},
+        )
+        self.boot = DeviceLog.objects.create(
+            device=self.device,
+            message="Boot completed",
+            metadata={"reason": "watchdog"},
+        )
+
+    def _search(self, text):
+        return set(
+            search_logs(DeviceLog.objects.all(), text).values_list("message", flat=True)
+        )
+
+    def _indexed_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM devices_devicelog_fts")
+            return cursor.fetchone()[0]
+
+    def test_matches_message_words_and_prefixes(self):
+        self.assertEqual(self._search("relay"), {"Relay pulse finished"})
+        self.assertEqual(self._search("puls fin"), {"Relay pulse finished"})
+        self.assertEqual(self._search("relay boot"), set())
+
+    def test_matches_nested_metadata_values(self):
+        self.assertEqual(self._search("lobby"), {"Relay pulse finished"})
+        self.assertEqual(self._search("watchdog"), {"Boot completed"})
+
+    def test_operators_in_input_are_literal(self):
+        self.assertEqual(self._search('relay" OR "boot'), set())
+        self.assertEqual(self._search("NOT -"), set())
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        DeviceLog.objects.bulk_create(
+            [DeviceLog(device=self.device, message="bulk heartbeat")]
+        )
+        self.assertEqual(self._search("heartbeat"), {"bulk heartbeat"})
+
+        DeviceLog.objects.filter(pk=self.boot.pk).update(message="Boot retried")
+        self.assertEqual(self._search("retried"), {"Boot retried"})
+        self.assertEqual(self._search("completed"), set())
+
+        DeviceLog.objects.filter(message="bulk heartbeat").delete()
+        self.assertEqual(self._search("heartbeat"), set())
+        self.assertEqual(self._indexed_rows(), 2)
+
+    def test_log_page_and_admin_search(self):
+        self.client.force_login(self.head)
+        page = self.client.get("/devices/logs/", {"q": "lobby", "format": "json"})
+        self.assertEqual([row["id"] for row in page.json()["results"]], [self.relay.id])
+
+        admin = User.objects.create_superuser(username="search-admin", password="pass")
+        self.client.force_login(admin)
+        response = self.client.get("/admin/devices/devicelog/", {"q": "watchdog"})
+        self.assertEqual(
+            [log.id for log in response.context["cl"].result_list], [self.boot.id]
+        )
+        response = self.client.get("/admin/devices/devicelog/", {"q": "Search Build"})
+        self.assertEqual(response.context["cl"].result_count, 2)
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class DeviceTokenCache:
+    """Bounded LRU cache of ``api_token`` -> device row with TTL expiry.
+
+    Unknown tokens are cached as well (for ``negative_ttl`` seconds) so that a
+    misconfigured or hostile device cannot turn every request into a query.
+    Entries hold plain field values and a fresh ``Device`` instance is built on
+    each hit, so callers may mutate what they get back. The cache is
+    per-process; ``invalidate`` is wired to ``Device`` save/delete signals and
+    the TTL bounds staleness for changes made by other processes.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, negative_ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tokens_by_id = {}
+        self._counters = dict.fromkeys(
+            ("hits", "negative_hits", "misses", "evictions", "invalidations"), 0
+        )
+
+    def get(self, token):
+        """Return the ``Device`` for ``token`` or ``None`` if it is unknown."""
+
+        from .models import Device
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(token)
+                values = entry[2]
+                if values is None:
+                    self._counters["negative_hits"] += 1
+                    return None
+                self._counters["hits"] += 1
+                return Device.from_db(values[0], values[1], values[2])
+            self._counters["misses"] += 1
+
+        try:
+            device = Device.objects.get(api_token=token)
+        except Device.DoesNotExist:
+            device = None
+        self._store(token, device, now)
+        return device
+
+    def _store(self, token, device, now):
+        if device is None:
+            expires_at, device_id, values = now + self.negative_ttl, None, None
+        else:
+            fields = [field.attname for field in device._meta.concrete_fields]
+            values = (
+                device._state.db,
+                fields,
+                [getattr(device, name) for name in fields],
+            )
+            expires_at, device_id = now + self.ttl, device.pk
+
+        with self._lock:
+            self._entries[token] = (expires_at, device_id, values)
+            self._entries.move_to_end(token)
+            if device_id is not None:
+                self._tokens_by_id[device_id] = token
+            while len(self._entries) > self.max_size:
+                evicted_token, (_, evicted_id, _) = self._entries.popitem(last=False)
+                if self._tokens_by_id.get(evicted_id) == evicted_token:
+                    del self._tokens_by_id[evicted_id]
+                self._counters["evictions"] += 1
+
+    def invalidate(self, device):
+        """Drop cached entries for ``device`` (old and current token)."""
+
+        with self._lock:
+            tokens = {device.api_token, self._tokens_by_id.pop(device.pk, None)}
+            for token in tokens:
+                if token is not None and self._entries.pop(token, None) is not None:
+                    self._counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_id.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+            lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+            stats["hit_ratio"] = (
+                round((stats["hits"] + stats["negative_hits"]) / lookups, 4)
+                if lookups
+                else 0.0
+            )
+            return stats
+
+
+device_token_cache = DeviceTokenCache(
+    max_size=settings.DEVICE_TOKEN_CACHE_SIZE,
+    ttl=settings.DEVICE_TOKEN_CACHE_TTL,
+    negative_ttl=settings.DEVICE_TOKEN_NEGATIVE_TTL,
+)
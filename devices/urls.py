@@ -1,13 +1,36 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
 app_name = "devices"
 
+# Under ASGI the hot device endpoints are served by their async variants so
+# idle long polls wait on the event loop instead of holding a worker thread.
+if settings.DEVICE_API_ASYNC:
+    poll_command, ack_command, ingest_log, device_sync = (
+        views.apoll_command,
+        views.aack_command,
+        views.aingest_log,
+        views.adevice_sync,
+    )
+else:
+    poll_command, ack_command, ingest_log, device_sync = (
+        views.poll_command,
+        views.ack_command,
+        views.ingest_log,
+        views.device_sync,
+    )
+
 urlpatterns = [
     path("devices/logs/", views.device_logs, name="device_logs"),
-    path("api/device/command/", views.poll_command, name="poll_command"),
-    path("api/device/command/ack/", views.ack_command, name="ack_command"),
+    path("devices/logs/export/", views.export_device_logs, name="export_device_logs"),
+    path("api/device/command/", poll_command, name="poll_command"),
+    path("api/device/command/ack/", ack_command, name="ack_command"),
     path("api/device/firmware/", views.firmware_payload, name="firmware"),
-    path("api/device/logs/", views.ingest_log, name="ingest_log"),
+    path("api/device/firmware/raw/", views.firmware_raw, name="firmware_raw"),
+    path("api/device/firmware/delta/", views.firmware_delta, name="firmware_delta"),
+    path("api/device/logs/", ingest_log, name="ingest_log"),
+    path("api/device/sync/", device_sync, name="sync"),
+    path("api/device/metrics/", views.device_metrics, name="metrics"),
 ]
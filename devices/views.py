@@ -1,17 +1,58 @@
 import json
-from datetime import timedelta
-
-from django.http import JsonResponse
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
-from django.db.models import Count
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef, Sum
 
+from access.events import status_events
 from access.models import DoorCommand
 from accounts.decorators import head_required
 from households.utils import get_or_create_head_household
-from .models import Device, DeviceFirmware, DeviceLog
+from .admission import admission, shed_under_load
+from .delta import cached_delta
+from .models import (
+    Device,
+    DeviceFirmware,
+    DeviceLog,
+    DeviceLogRollup,
+    FirmwareRelease,
+    FirmwareRollout,
+)
+from .notifications import command_notifier
+from .export import (
+    DEVICE_LOG_COLUMNS,
+    FORMATS as EXPORT_FORMATS,
+    device_log_row,
+    export_response,
+)
+from .log_queue import log_write_queue
+from .pagination import keyset_page, next_page_url, parse_time_filter
+from .pending_index import pending_index
+from .presence import last_seen_buffer
+from .ratelimit import rate_limit, rate_limiter
+from .release_cache import release_body_cache
+from .rollups import insert_logs
+from .schedule import recommended_poll_interval_ms
+from .search import search_logs
+from .rollouts import download_allowed, ota_jitter_ms, release_download_slot
+from .singleflight import response_flight
+from .token_cache import device_token_cache
 
 
 def _sanitize_metadata(value):
@@ -29,113 +70,552 @@ def _sanitize_metadata(value):
     return convert(value)
 
 
+# ORM work for the async device views runs on a small shared pool rather than
+# Django's default thread-sensitive executor, which would park one thread per
+# held long poll for the lifetime of the request.
+_db_executor = ThreadPoolExecutor(
+    max_workers=settings.DEVICE_ASYNC_DB_THREADS, thread_name_prefix="device-db"
+)
+
+
+def _run_db(func):
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        return func(*args, **kwargs)
+
+    return sync_to_async(wrapper, thread_sensitive=False, executor=_db_executor)
+
+
 def _get_device_from_request(request):
     token = request.headers.get("X-DEVICE-TOKEN")
     if not token:
         return None
+    return device_token_cache.get(token)
+
+
+def _get_long_poll_wait(request) -> float:
+    """Return the requested long-poll wait in seconds, clamped to the server limit."""
+
     try:
-        return Device.objects.get(api_token=token)
-    except Device.DoesNotExist:
+        wait = float(request.GET.get("wait", 0))
+    except (TypeError, ValueError):
+        return 0.0
+    if wait != wait:  # NaN
+        return 0.0
+    return max(0.0, min(wait, settings.DEVICE_LONG_POLL_MAX_WAIT))
+
+
+def _next_pending_command(device, now):
+    # Idle devices are answered from the shared pending index without a
+    # query. Otherwise expired rows are left to the ``expire_door_commands``
+    # sweeper; polls only filter on the indexed ``expires_at`` and never write.
+    generation, idle = pending_index.snapshot(device.pk)
+    if idle:
         return None
+    command = device.commands.pending(now).order_by("created_at").first()
+    if command is None:
+        pending_index.mark_idle(device.pk, generation)
+    return command
+
+
+def _load_json(request):
+    try:
+        return json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return {}
+
+
+def _touch_last_seen(device):
+    device.last_seen = timezone.now()
+    last_seen_buffer.touch(device.pk, device.last_seen)
+    status_events.device_seen(device, device.last_seen)
+
+
+def _command_payload(command):
+    """Body handed to the device; delivering a command marks it ``fetched``."""
+
+    if not command:
+        return {"open": False}
+    status_events.command_fetched(command)
+    return {"open": True, "command_id": command.id, "pulse_ms": 1000}
+
+
+def _with_poll_hint(payload):
+    """Add ``poll_after_ms`` when load stretches it past the poll interval."""
+
+    poll_after_ms = admission.poll_after_ms()
+    if poll_after_ms > settings.DEVICE_POLL_INTERVAL_MS:
+        payload["poll_after_ms"] = poll_after_ms
+    return payload
+
+
+def _poll_response(device, command):
+    """``poll_command`` body: the command plus the device's poll schedule."""
+
+    payload = _command_payload(command)
+    payload["poll_interval_ms"] = recommended_poll_interval_ms(device)
+    return _with_poll_hint(payload)
+
+
+def _wait_for_command(device, wait):
+    """Return the next pending command, holding up to ``wait`` seconds for one.
+
+    Local publishes wake the request immediately; commands queued by other
+    worker processes are picked up on the next re-check.
+    """
+
+    deadline = time.monotonic() + wait
+    while True:
+        sequence = command_notifier.sequence(device.id)
+        command = _next_pending_command(device, timezone.now())
+        remaining = deadline - time.monotonic()
+        if command or remaining <= 0:
+            return command
+        with admission.holding():
+            command_notifier.wait(
+                device.id,
+                sequence,
+                min(remaining, settings.DEVICE_LONG_POLL_RECHECK_INTERVAL),
+            )
+
+
+async def _await_command(device, wait):
+    """Async counterpart of ``_wait_for_command`` that waits on the event loop."""
+
+    deadline = time.monotonic() + wait
+    while True:
+        sequence = command_notifier.sequence(device.id)
+        command = await _run_db(_next_pending_command)(device, timezone.now())
+        remaining = deadline - time.monotonic()
+        if command or remaining <= 0:
+            return command
+        with admission.holding():
+            await command_notifier.async_wait(
+                device.id,
+                sequence,
+                min(remaining, settings.DEVICE_LONG_POLL_RECHECK_INTERVAL),
+            )
 
 
 @require_GET
 @csrf_exempt
+@shed_under_load
+@rate_limit("device_command")
 def poll_command(request):
     device = _get_device_from_request(request)
     if not device:
         return JsonResponse({"error": "Invalid token"}, status=401)
 
-    now = timezone.now()
-    device.last_seen = now
-    device.save(update_fields=["last_seen"])
-
-    expiration_cutoff = now - timedelta(seconds=15)
-    expired_commands = device.commands.filter(
-        executed=False, expired=False, created_at__lt=expiration_cutoff
-    )
-    if expired_commands.exists():
-        expired_commands.update(expired=True, executed_at=now)
-
-    command = (
-        device.commands.filter(executed=False, expired=False)
-        .order_by("created_at")
-        .first()
-    )
-    if not command:
-        return JsonResponse({"open": False})
+    _touch_last_seen(device)
 
-    return JsonResponse({"open": True, "command_id": command.id, "pulse_ms": 1000})
+    # With ``?wait=N`` the request is held until a command is queued or the
+    # wait expires.
+    command = _wait_for_command(device, _get_long_poll_wait(request))
+    return JsonResponse(_poll_response(device, command))
 
 
-@require_POST
+@require_GET
 @csrf_exempt
-def ack_command(request):
-    try:
-        payload = json.loads(request.body.decode("utf-8"))
-    except json.JSONDecodeError:
-        payload = {}
+@shed_under_load
+@rate_limit("device_command")
+async def apoll_command(request):
+    """Async ``poll_command`` for ASGI; long polls wait on the event loop."""
 
-    device = _get_device_from_request(request)
+    device = await _run_db(_get_device_from_request)(request)
     if not device:
         return JsonResponse({"error": "Invalid token"}, status=401)
 
-    command_id = payload.get("command_id")
+    await _run_db(_touch_last_seen)(device)
+
+    command = await _await_command(device, _get_long_poll_wait(request))
+    return JsonResponse(await _run_db(_poll_response)(device, command))
+
+
+def _execute_command(device, command_id) -> bool:
     try:
         command = device.commands.get(id=command_id, executed=False, expired=False)
-    except DoorCommand.DoesNotExist:
-        return JsonResponse({"error": "Command not found"}, status=404)
+    except (DoorCommand.DoesNotExist, TypeError, ValueError):
+        return False
 
     command.executed = True
     command.executed_at = timezone.now()
     command.save(update_fields=["executed", "executed_at"])
+    return True
+
 
+def _ack(device, payload):
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+    if not _execute_command(device, payload.get("command_id")):
+        return JsonResponse({"error": "Command not found"}, status=404)
     return JsonResponse({"status": "ok"})
 
 
+@require_POST
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_ack")
+def ack_command(request):
+    payload = _load_json(request)
+
+    device = _get_device_from_request(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    return _ack(device, payload)
+
+
+@require_POST
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_ack")
+async def aack_command(request):
+    """Async ``ack_command`` for ASGI."""
+
+    payload = _load_json(request)
+
+    device = await _run_db(_get_device_from_request)(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    return await _run_db(_ack)(device, payload)
+
+
+def _record_reported_versions(device, request):
+    """Store the firmware/config versions a device reports in its headers."""
+
+    firmware_version = request.headers.get("X-FIRMWARE-VERSION", "")[:50]
+    config_version = request.headers.get("X-CONFIG-VERSION", "")[:50]
+    if not (firmware_version or config_version):
+        return
+    if (firmware_version, config_version) == (
+        device.firmware_version,
+        device.config_version,
+    ):
+        return
+
+    device.firmware_version = firmware_version
+    device.config_version = config_version
+    device.versions_reported_at = timezone.now()
+    Device.objects.filter(pk=device.pk).update(
+        firmware_version=firmware_version,
+        config_version=config_version,
+        versions_reported_at=device.versions_reported_at,
+    )
+    device_token_cache.invalidate(device)
+
+    # A device reporting a new build has finished its rollout download.
+    rollout = FirmwareRollout.objects.filter(device_firmware__device=device).first()
+    if rollout is not None:
+        release_download_slot(rollout, device.pk)
+
+
 @require_GET
 @csrf_exempt
+@shed_under_load
+@rate_limit("device_firmware")
 def firmware_payload(request):
+    """Serve firmware/config updates, skipping whatever the device already runs.
+
+    Answers ``304`` when ``If-None-Match`` matches the payload ETag. Otherwise
+    ``content`` and ``config`` are only included when the ``X-FIRMWARE-VERSION``
+    / ``X-CONFIG-VERSION`` headers differ from the stored versions, so an
+    up-to-date device gets a small version-only body. Devices that send
+    ``X-OTA-STREAM: 1`` get ``content_size``/``content_url`` instead of the
+    inline ``content`` and download it from :func:`firmware_raw`; if their
+    ``X-FIRMWARE-CHECKSUM`` names an archived release, ``delta_url`` points at
+    a patch from that build.
+    """
+
     device = _get_device_from_request(request)
     if not device:
         return JsonResponse({"error": "Invalid token"}, status=401)
 
+    _record_reported_versions(device, request)
+
     try:
         firmware = device.firmware
     except DeviceFirmware.DoesNotExist:
         return JsonResponse({}, status=200)
 
+    etag = firmware.etag
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (
+        if_none_match.strip() == "*" or etag in parse_etags(if_none_match)
+    ):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    reported_firmware = request.headers.get("X-FIRMWARE-VERSION")
+    reported_config = request.headers.get("X-CONFIG-VERSION")
+    include_config = bool(firmware.config_checksum) and (
+        reported_config != firmware.config_version or not firmware.config_version
+    )
+    content_mode = None
+    if reported_firmware != firmware.version:
+        allowed, retry_after_ms = download_allowed(firmware, device.pk)
+        if not allowed:
+            # Staged rollout: no slot free or rollout paused, come back later.
+            # A deferred answer is not the payload, so it carries no ETag.
+            payload = _firmware_payload(firmware, None, "", include_config)
+            payload.pop("unchanged", None)
+            payload.update(deferred=True, retry_after_ms=retry_after_ms)
+            return JsonResponse(payload)
+        stream = request.headers.get("X-OTA-STREAM") == "1"
+        content_mode = "stream" if stream else "inline"
+    delta_base = ""
+    if content_mode == "stream":
+        delta_base = request.headers.get("X-FIRMWARE-CHECKSUM", "")[:64]
+
+    # Devices asking for the same variant at once share one body.
+    key = (
+        "firmware_payload",
+        firmware.checksum,
+        firmware.config_checksum,
+        firmware.version,
+        firmware.config_version,
+        content_mode,
+        delta_base,
+        include_config,
+    )
+    body = response_flight.do(
+        key,
+        lambda: json.dumps(
+            _firmware_payload(firmware, content_mode, delta_base, include_config)
+        ).encode(),
+    )
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+
+def _firmware_payload(firmware, content_mode, delta_base, include_config):
+    """Build the ``firmware_payload`` body for one response variant."""
+
     payload = {
         "version": firmware.version,
-        "content": firmware.content,
         "checksum": firmware.checksum,
-        "config": firmware.config,
         "config_version": firmware.config_version,
         "config_checksum": firmware.config_checksum,
     }
-    return JsonResponse(payload)
+    if content_mode == "stream":
+        # Streaming devices fetch the bytes from the raw endpoint.
+        payload["content_size"] = len(_release_body(firmware))
+        payload["content_url"] = reverse("devices:firmware_raw")
+        if (
+            delta_base
+            and delta_base != firmware.checksum
+            and FirmwareRelease.objects.filter(checksum=delta_base).exists()
+        ):
+            payload["delta_url"] = (
+                f"{reverse('devices:firmware_delta')}?base={delta_base}"
+            )
+    elif content_mode == "inline":
+        payload["content"] = _release_body(firmware).decode("utf-8")
+    if include_config:
+        payload["config"] = firmware.config_content
+    if not payload.keys() & {"content", "content_url", "config"}:
+        payload["unchanged"] = True
+    return payload
+
+
+def _release_body(firmware) -> bytes:
+    """UTF-8 firmware body, served from the per-release cache when possible."""
+
+    return release_body_cache.body(firmware.checksum, lambda: firmware.firmware_content)
+
+
+def _parse_byte_range(header, size):
+    """Parse a single ``bytes=`` range into inclusive ``(start, end)`` offsets.
+
+    Returns ``None`` when the header should be ignored (missing, malformed or a
+    multi-range request, which is answered with the full body) and ``False``
+    when the range cannot be satisfied.
+    """
+
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes=") :].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, min(end, size - 1)
 
 
-@require_POST
+@require_GET
 @csrf_exempt
-def ingest_log(request):
+@shed_under_load
+@rate_limit("device_firmware")
+def firmware_raw(request):
+    """Serve the firmware file as raw bytes with HTTP ``Range`` support.
+
+    Devices stream the body straight to flash in small chunks and resume an
+    interrupted download with ``Range: bytes=<offset>-``. ``If-Range`` guards
+    against appending bytes of a different build to a partial file.
+    """
+
     device = _get_device_from_request(request)
     if not device:
         return JsonResponse({"error": "Invalid token"}, status=401)
 
     try:
-        payload = json.loads(request.body.decode("utf-8"))
-    except json.JSONDecodeError:
-        payload = {}
+        firmware = device.firmware
+    except DeviceFirmware.DoesNotExist:
+        return JsonResponse({"error": "No firmware"}, status=404)
+    if not firmware.checksum:
+        return JsonResponse({"error": "No firmware"}, status=404)
+
+    etag = f'"{firmware.checksum}"'
+    gzip_etag = f'"{firmware.checksum}.gz"'
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        matched = {etag, gzip_etag}.intersection(parse_etags(if_none_match))
+        if matched:
+            response = HttpResponseNotModified()
+            response["ETag"] = matched.pop()
+            return response
+
+    body = _release_body(firmware)
+    size = len(body)
+    byte_range = _parse_byte_range(request.headers.get("Range"), size)
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range.strip() != etag:
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            # Ranges always refer to the identity body, so only full
+            # responses are compressed.
+            body = release_body_cache.gzipped(
+                firmware.checksum, lambda: firmware.firmware_content
+            )
+            etag = gzip_etag
+        response = HttpResponse(body, content_type="application/octet-stream")
+        if etag == gzip_etag:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept-Encoding",))
+    else:
+        start, end = byte_range
+        response = HttpResponse(
+            body[start : end + 1], content_type="application/octet-stream", status=206
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["X-Firmware-Version"] = firmware.version
+    response["X-Firmware-Checksum"] = firmware.checksum
+    return response
+
+
+@require_GET
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_firmware")
+def firmware_delta(request):
+    """Serve a line-level patch from the ``?base=`` release to the current firmware.
+
+    Answers ``404`` when the base build is not archived or a patch would not be
+    smaller than the file, so the device falls back to :func:`firmware_raw`.
+    """
+
+    device = _get_device_from_request(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    try:
+        firmware = device.firmware
+    except DeviceFirmware.DoesNotExist:
+        return JsonResponse({"error": "No firmware"}, status=404)
+
+    base = request.GET.get("base") or request.headers.get("X-FIRMWARE-CHECKSUM", "")
+    release = (
+        FirmwareRelease.objects.filter(checksum=base).first()
+        if base and firmware.checksum and base != firmware.checksum
+        else None
+    )
+    delta = cached_delta(release, firmware) if release else None
+    if delta is None:
+        return JsonResponse({"error": "No delta available"}, status=404)
+
+    response = HttpResponse(delta, content_type="application/x-ndjson")
+    response["ETag"] = f'"{base}:{firmware.checksum}"'
+    response["X-Firmware-Version"] = firmware.version
+    response["X-Firmware-Checksum"] = firmware.checksum
+    return response
+
+
+def _parse_device_timestamp(value):
+    """Parse a device-side timestamp (ISO 8601 string or Unix seconds)."""
+
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    return None
+
+
+def _build_log(device, payload, request):
+    """Validate one log record and return ``(DeviceLog, None)`` or ``(None, error)``."""
+
+    if not isinstance(payload, dict):
+        return None, "Invalid log record"
 
     message = payload.get("message") or payload.get("log")
-    level = (payload.get("level") or "info").lower()
+    level = payload.get("level") or "info"
     event_type = payload.get("event_type") or payload.get("type") or ""
     firmware_version = payload.get("firmware_version") or payload.get("version") or ""
     metadata = payload.get("metadata") or {}
+    timestamp = payload.get("timestamp")
 
     if not message:
-        return JsonResponse({"error": "Missing log message"}, status=400)
+        return None, "Missing log message"
+    for name, value in (
+        ("message", message),
+        ("level", level),
+        ("event_type", event_type),
+        ("firmware_version", firmware_version),
+    ):
+        max_length = DeviceLog._meta.get_field(name).max_length
+        if not isinstance(value, str) or (max_length and len(value) > max_length):
+            return None, f"Invalid {name}"
+    level = level.lower()
+
+    created_at = timezone.now()
+    if timestamp is not None:
+        device_time = _parse_device_timestamp(timestamp)
+        if device_time is None:
+            return None, "Invalid timestamp"
+        # Boards without a synced clock report times near the epoch; keep the
+        # server time for those and record the raw value in metadata instead.
+        skew = settings.DEVICE_LOG_MAX_CLOCK_SKEW
+        if created_at - skew <= device_time <= created_at + timedelta(minutes=5):
+            created_at = device_time
 
     if not isinstance(metadata, dict):
         metadata = {"value": metadata}
@@ -143,33 +623,317 @@ def ingest_log(request):
     # Enrich logs with server-side context
     metadata.setdefault("remote_addr", request.META.get("REMOTE_ADDR"))
     metadata.setdefault("user_agent", request.META.get("HTTP_USER_AGENT"))
+    if timestamp is not None and created_at != device_time:
+        metadata.setdefault("device_timestamp", timestamp)
     metadata = _sanitize_metadata(metadata)
 
-    DeviceLog.objects.create(
+    log = DeviceLog(
         device=device,
         level=level,
         event_type=event_type,
         firmware_version=firmware_version,
         metadata=metadata,
         message=message,
+        created_at=created_at,
     )
+    return log, None
+
+
+class LogQueueFull(Exception):
+    """The write-behind log queue has no room for a request's records."""
+
+
+def _save_logs(logs):
+    """Insert ``logs`` in one query, or queue them when write-behind is on."""
+
+    if not log_write_queue.enabled:
+        insert_logs(logs)
+    elif not log_write_queue.offer(logs):
+        raise LogQueueFull
+
+
+def _log_queue_full_response():
+    retry_after_ms = settings.DEVICE_LOG_QUEUE_RETRY_AFTER_MS
+    response = JsonResponse(
+        {"error": "Log queue full", "poll_after_ms": retry_after_ms}, status=503
+    )
+    response["Retry-After"] = str(math.ceil(retry_after_ms / 1000))
+    return response
+
+
+def _store_logs(device, records, request):
+    """Validate ``records`` together and store the valid ones in one query.
+
+    Returns ``(accepted_count, errors)`` where ``errors`` lists the index and
+    reason for every rejected record. Raises :class:`LogQueueFull` when the
+    write-behind queue cannot take them.
+    """
+
+    logs, errors = [], []
+    for index, record in enumerate(records):
+        log, error = _build_log(device, record, request)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            logs.append(log)
+    if logs:
+        _save_logs(logs)
+    return len(logs), errors
+
+
+def _ingest(device, payload, request):
+    if isinstance(payload, dict) and "logs" in payload:
+        payload = payload["logs"]
+
+    if not isinstance(payload, list):
+        log, error = _build_log(device, payload, request)
+        if error:
+            return JsonResponse({"error": error}, status=400)
+
+        try:
+            _save_logs([log])
+        except LogQueueFull:
+            return _log_queue_full_response()
+        _touch_last_seen(device)
+        return JsonResponse({"status": "ok"})
+
+    if len(payload) > settings.DEVICE_LOG_BATCH_MAX:
+        return JsonResponse(
+            {"error": f"At most {settings.DEVICE_LOG_BATCH_MAX} records per request"},
+            status=413,
+        )
+
+    try:
+        accepted, errors = _store_logs(device, payload, request)
+    except LogQueueFull:
+        return _log_queue_full_response()
+    if accepted:
+        _touch_last_seen(device)
+    return JsonResponse(
+        {
+            "status": "ok" if not errors else ("partial" if accepted else "error"),
+            "accepted": accepted,
+            "errors": errors,
+        },
+        status=200 if accepted or not payload else 400,
+    )
+
+
+@require_POST
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_logs")
+def ingest_log(request):
+    device = _get_device_from_request(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    return _ingest(device, _load_json(request), request)
+
+
+@require_POST
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_logs")
+async def aingest_log(request):
+    """Async ``ingest_log`` for ASGI."""
+
+    device = await _run_db(_get_device_from_request)(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    return await _run_db(_ingest)(device, _load_json(request), request)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
 
-    device.last_seen = timezone.now()
-    device.save(update_fields=["last_seen"])
-    return JsonResponse({"status": "ok"})
+
+def _apply_sync(device, payload, request):
+    """Store the acks and logs a device sent to /api/device/sync/."""
+
+    acks = {}
+    for command_id in _as_list(payload.get("acks")):
+        acks[str(command_id)] = (
+            "ok" if _execute_command(device, command_id) else "not_found"
+        )
+
+    records = _as_list(payload.get("logs"))[: settings.DEVICE_LOG_BATCH_MAX]
+    try:
+        accepted, errors = _store_logs(device, records, request)
+        logs = {"accepted": accepted, "errors": errors}
+    except LogQueueFull:
+        # Acks still count; the device keeps its logs and resends them.
+        logs = {
+            "accepted": 0,
+            "errors": [],
+            "retry_after_ms": settings.DEVICE_LOG_QUEUE_RETRY_AFTER_MS,
+        }
+
+    _touch_last_seen(device)
+    return {"acks": acks, "logs": logs}
+
+
+def _sync_hints(device):
+    """Version hints and runtime settings returned with every sync response."""
+
+    firmware = (
+        DeviceFirmware.objects.filter(device=device)
+        .values("version", "checksum", "config_version", "config_checksum")
+        .first()
+    )
+    if firmware and firmware["version"] != device.firmware_version:
+        # Spread the fleet's OTA fetches instead of all checking at once.
+        firmware["check_in_ms"] = ota_jitter_ms()
+    return {
+        "firmware": firmware or {},
+        "settings": {
+            "poll_interval_ms": recommended_poll_interval_ms(device),
+            "ota_check_interval_ms": settings.DEVICE_OTA_CHECK_INTERVAL_MS,
+            "max_wait_sec": settings.DEVICE_LONG_POLL_MAX_WAIT,
+        },
+    }
+
+
+@require_POST
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_sync")
+def device_sync(request):
+    """Single round trip for a firmware cycle.
+
+    Accepts ``{"acks": [...], "logs": [...]}``, optionally long-polls with
+    ``?wait=N`` like ``poll_command``, and answers with the next command plus
+    firmware/config version hints and runtime settings.
+    """
+
+    device = _get_device_from_request(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    payload = _load_json(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    _record_reported_versions(device, request)
+    result = _apply_sync(device, payload, request)
+    command = _wait_for_command(device, _get_long_poll_wait(request))
+    result["command"] = _command_payload(command)
+    result.update(_sync_hints(device))
+    return JsonResponse(_with_poll_hint(result))
+
+
+@require_POST
+@csrf_exempt
+@shed_under_load
+@rate_limit("device_sync")
+async def adevice_sync(request):
+    """Async ``device_sync`` for ASGI."""
+
+    device = await _run_db(_get_device_from_request)(request)
+    if not device:
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    payload = _load_json(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    await _run_db(_record_reported_versions)(device, request)
+    result = await _run_db(_apply_sync)(device, payload, request)
+    command = await _await_command(device, _get_long_poll_wait(request))
+    result["command"] = _command_payload(command)
+    result.update(await _run_db(_sync_hints)(device))
+    return JsonResponse(_with_poll_hint(result))
+
+
+@staff_member_required
+@require_GET
+def device_metrics(request):
+    """Expose in-process counters of the device API for monitoring."""
+
+    return JsonResponse(
+        {
+            "token_cache": device_token_cache.stats(),
+            "command_notifier": command_notifier.stats(),
+            "last_seen_buffer": last_seen_buffer.stats(),
+            "pending_index": pending_index.stats(),
+            "release_body_cache": release_body_cache.stats(),
+            "single_flight": response_flight.stats(),
+            "status_events": status_events.stats(),
+            "rate_limiter": rate_limiter.stats(),
+            "admission": admission.stats(),
+            "log_queue": log_write_queue.stats(),
+        }
+    )
+
+
+def _filtered_device_logs(household, params):
+    """The building's device logs narrowed by the log page query filters."""
+
+    # EXISTS rather than a join on device__building: SQLite then walks the
+    # (created_at, id) index in page order instead of sorting every log of
+    # the building's devices in a temporary B-tree.
+    queryset = DeviceLog.objects.filter(
+        Exists(
+            Device.objects.filter(pk=OuterRef("device_id"), building=household.building)
+        )
+    )
+    if params.get("device", "").isdigit():
+        queryset = queryset.filter(device_id=int(params["device"]))
+    if params.get("level"):
+        queryset = queryset.filter(level=params["level"].lower())
+    if params.get("event_type"):
+        queryset = queryset.filter(event_type=params["event_type"])
+    if params.get("q"):
+        queryset = search_logs(queryset, params["q"])
+    since = parse_time_filter(params.get("since"))
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    until = parse_time_filter(params.get("until"), end=True)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset
 
 
 @head_required
 def device_logs(request):
-    household = get_or_create_head_household(request.user)
-    queryset = DeviceLog.objects.filter(device__building=household.building)
-    logs = queryset.select_related("device").order_by("-created_at")[:200]
+    """Building device logs, newest first, one keyset page at a time.
+
+    Filters: ``device``, ``level``, ``event_type``, ``q`` (full-text search
+    over message and metadata), ``since`` and ``until`` (ISO date or
+    datetime); ``cursor`` continues from a previous page and
+    ``format=json`` returns the page as JSON for infinite scrolling.
+    """
 
+    household = get_or_create_head_household(request.user)
+    devices = Device.objects.filter(building=household.building)
+    params = request.GET
+    queryset = _filtered_device_logs(household, params)
+
+    logs, next_cursor = keyset_page(
+        queryset.select_related("device"),
+        "created_at",
+        params.get("cursor"),
+        settings.DEVICE_LOG_PAGE_SIZE,
+    )
+    if params.get("format") == "json":
+        return JsonResponse(
+            {
+                "results": [device_log_row(log) for log in logs],
+                "next_cursor": next_cursor,
+                "next": next_page_url(request, next_cursor),
+            }
+        )
+
+    # Counts come from the hourly rollups rather than the raw log table.
+    rollups = DeviceLogRollup.objects.filter(device__building=household.building)
     level_breakdown = (
-        queryset.values("level").annotate(count=Count("id")).order_by("level")
+        rollups.values("level").annotate(count=Sum("count")).order_by("level")
     )
     event_breakdown = (
-        queryset.values("event_type").annotate(count=Count("id")).order_by("event_type")
+        rollups.values("event_type").annotate(count=Sum("count")).order_by("event_type")
     )
     return render(
         request,
@@ -177,7 +941,32 @@ def device_logs(request):
         {
             "household": household,
             "logs": logs,
+            "devices": devices,
+            "filters": params,
+            "next_url": next_page_url(request, next_cursor),
             "level_breakdown": level_breakdown,
             "event_breakdown": event_breakdown,
         },
     )
+
+
+@head_required
+@require_GET
+def export_device_logs(request):
+    """Stream the filtered device logs as CSV or NDJSON (``?gzip=1``)."""
+
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": "Unknown export format"}, status=400)
+    household = get_or_create_head_household(request.user)
+    queryset = _filtered_device_logs(household, request.GET).order_by(
+        "created_at", "id"
+    )
+    return export_response(
+        queryset,
+        device_log_row,
+        DEVICE_LOG_COLUMNS,
+        "device-logs",
+        fmt,
+        request.GET.get("gzip") == "1",
+    )
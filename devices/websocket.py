@@ -0,0 +1,229 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.http.request import HttpHeaders
+from django.utils import timezone
+
+from . import views
+from .notifications import command_notifier
+from .pending_index import pending_index
+from .token_cache import device_token_cache
+
+DEVICE_SOCKET_PATH = "/api/device/ws/"
+
+# Close codes sent to devices (4000-4999 are reserved for applications).
+CLOSE_IDLE = 4408
+
+
+def _handshake_request(scope):
+    """Request-like view of the handshake for helpers written for HTTP views."""
+
+    meta = {"REMOTE_ADDR": (scope.get("client") or (None,))[0]}
+    for name, value in scope.get("headers", ()):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        meta[f"HTTP_{key}"] = value.decode("latin-1")
+    return SimpleNamespace(META=meta, headers=HttpHeaders(meta))
+
+
+def _unsent_commands(device, sent, checked=None):
+    """Pending commands not yet pushed on this connection, oldest first.
+
+    Returns ``(generation, commands)``. The database is only read when the
+    device is not idle and its pending-index generation moved past
+    ``checked`` (the generation of the previous check), or when the index is
+    process-local and cannot show commands queued by other workers. ``sent``
+    is trimmed to the commands that are still pending, so it stays as small as
+    the device's queue.
+    """
+
+    generation, idle = pending_index.snapshot(device.pk)
+    if idle:
+        sent.clear()
+        return generation, []
+    if generation == checked and not pending_index.process_local:
+        return generation, []
+    commands = list(device.commands.pending(timezone.now()).order_by("created_at"))
+    if not commands:
+        pending_index.mark_idle(device.pk, generation)
+    sent.intersection_update(command.id for command in commands)
+    return generation, [command for command in commands if command.id not in sent]
+
+
+def _firmware_hints(device):
+    hints = views._sync_hints(device)
+    # The jittered delay differs on every call; it is not a change by itself.
+    comparable = {
+        key: value for key, value in hints["firmware"].items() if key != "check_in_ms"
+    }
+    return hints, comparable
+
+
+class DeviceSocket:
+    """One device's push channel.
+
+    Commands are pushed as soon as ``command_notifier`` publishes for the
+    device, and re-checked every ``DEVICE_WS_RECHECK_INTERVAL`` for commands
+    queued by other worker processes. Firmware/config hints are
+    re-sent when they change. The device acks commands, uploads logs and sends
+    ``ping`` heartbeats on the same socket; a socket that stays silent for
+    ``DEVICE_WS_IDLE_TIMEOUT`` seconds is closed.
+    """
+
+    def __init__(self, device, request, send):
+        self.device = device
+        self.request = request
+        self._send = send
+        self.sent = set()
+        self.generation = None
+        self.hints = None
+        self.last_frame = time.monotonic()
+
+    async def send_json(self, payload):
+        await self._send({"type": "websocket.send", "text": json.dumps(payload)})
+
+    async def push_commands(self):
+        self.generation, commands = await views._run_db(_unsent_commands)(
+            self.device, self.sent, self.generation
+        )
+        for command in commands:
+            self.sent.add(command.id)
+            await self.send_json(
+                {"type": "command", "command": views._command_payload(command)}
+            )
+
+    async def push_hints(self, initial=False):
+        hints, comparable = await views._run_db(_firmware_hints)(self.device)
+        if initial:
+            await self.send_json(
+                {
+                    "type": "hello",
+                    "firmware": hints["firmware"],
+                    "settings": dict(
+                        hints["settings"],
+                        heartbeat_ms=settings.DEVICE_WS_HEARTBEAT_MS,
+                    ),
+                }
+            )
+        elif comparable != self.hints:
+            await self.send_json({"type": "firmware", "firmware": hints["firmware"]})
+        self.hints = comparable
+
+    async def handle_frame(self, text):
+        self.last_frame = time.monotonic()
+        try:
+            frame = json.loads(text)
+        except (TypeError, ValueError):
+            frame = None
+        if not isinstance(frame, dict):
+            await self.send_json({"type": "error", "error": "Invalid frame"})
+            return
+
+        kind = frame.get("type")
+        await views._run_db(views._touch_last_seen)(self.device)
+        if kind == "ping":
+            await self.send_json({"type": "pong"})
+        elif kind == "ack":
+            command_id = frame.get("command_id")
+            executed = await views._run_db(views._execute_command)(
+                self.device, command_id
+            )
+            await self.send_json(
+                {
+                    "type": "ack",
+                    "command_id": command_id,
+                    "status": "ok" if executed else "not_found",
+                }
+            )
+        elif kind == "logs":
+            records = views._as_list(frame.get("logs"))
+            try:
+                accepted, errors = await views._run_db(views._store_logs)(
+                    self.device, records[: settings.DEVICE_LOG_BATCH_MAX], self.request
+                )
+            except views.LogQueueFull:
+                await self.send_json(
+                    {
+                        "type": "logs",
+                        "accepted": 0,
+                        "errors": [],
+                        "retry_after_ms": settings.DEVICE_LOG_QUEUE_RETRY_AFTER_MS,
+                    }
+                )
+                return
+            await self.send_json(
+                {"type": "logs", "accepted": accepted, "errors": errors}
+            )
+        else:
+            await self.send_json({"type": "error", "error": "Unknown frame type"})
+
+    async def run(self, receive):
+        await self.push_hints(initial=True)
+        sequence = command_notifier.sequence(self.device.id)
+        await self.push_commands()
+        recheck_at = time.monotonic() + settings.DEVICE_WS_RECHECK_INTERVAL
+        receiver = asyncio.ensure_future(receive())
+        try:
+            while True:
+                idle_at = self.last_frame + settings.DEVICE_WS_IDLE_TIMEOUT
+                timeout = max(0, min(recheck_at, idle_at) - time.monotonic())
+                waiter = asyncio.ensure_future(
+                    command_notifier.async_wait(self.device.id, sequence, timeout)
+                )
+                await asyncio.wait(
+                    {receiver, waiter}, return_when=asyncio.FIRST_COMPLETED
+                )
+                published = False
+                if not waiter.done():
+                    waiter.cancel()
+                else:
+                    published = waiter.result()
+                if published or time.monotonic() >= recheck_at:
+                    sequence = command_notifier.sequence(self.device.id)
+                    await self.push_commands()
+                    recheck_at = time.monotonic() + settings.DEVICE_WS_RECHECK_INTERVAL
+                if published:
+                    # Publishes also announce firmware/config changes.
+                    await self.push_hints()
+
+                if receiver.done():
+                    message = receiver.result()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    if message.get("text") is not None:
+                        await self.handle_frame(message["text"])
+                    receiver = asyncio.ensure_future(receive())
+
+                idle = time.monotonic() - self.last_frame
+                if idle > settings.DEVICE_WS_IDLE_TIMEOUT:
+                    await self._send({"type": "websocket.close", "code": CLOSE_IDLE})
+                    return
+        finally:
+            receiver.cancel()
+
+
+async def device_websocket(scope, receive, send):
+    """ASGI application for ``DEVICE_SOCKET_PATH``, authenticated by ``X-DEVICE-TOKEN``.
+
+    Refused handshakes (unknown path or token) are answered with ``403``.
+    """
+
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    request = _handshake_request(scope)
+    token = request.headers.get("X-DEVICE-TOKEN")
+    device = None
+    if scope.get("path") == DEVICE_SOCKET_PATH and token:
+        device = await views._run_db(device_token_cache.get)(token)
+    if device is None:
+        await send({"type": "websocket.close"})
+        return
+
+    await send({"type": "websocket.accept"})
+    await views._run_db(views._record_reported_versions)(device, request)
+    await views._run_db(views._touch_last_seen)(device)
+    await DeviceSocket(device, request, send).run(receive)